@@ -2,6 +2,7 @@ from logging.config import fileConfig
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 from alembic import context
+from app.core.config import settings
 from app.db.base import Base
 from app.models.dataset import Dataset, Image, Upload, APIUsage
 
@@ -10,6 +11,9 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# migrate whatever database the app itself is configured for
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+
 target_metadata = Base.metadata
 
 def run_migrations_offline() -> None:
@@ -33,7 +37,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite cannot ALTER most things in place, so let alembic rebuild tables there
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
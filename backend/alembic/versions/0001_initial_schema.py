@@ -0,0 +1,75 @@
+"""initial schema
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'datasets',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('source_type', sa.String(length=50), nullable=False),
+        sa.Column('source_url', sa.Text(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('statistics', sa.JSON(), nullable=True),
+        sa.Column('statistics_state', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'images',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('dataset_id', sa.Uuid(), nullable=True),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('file_path', sa.Text(), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.Column('mime_type', sa.String(length=100), nullable=True),
+        sa.Column('width', sa.Integer(), nullable=True),
+        sa.Column('height', sa.Integer(), nullable=True),
+        sa.Column('metadata', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'uploads',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('user_id', sa.Uuid(), nullable=True),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('original_filename', sa.String(length=255), nullable=True),
+        sa.Column('stored_filename', sa.String(length=255), nullable=True),
+        sa.Column('file_path', sa.Text(), nullable=True),
+        sa.Column('file_size', sa.BigInteger(), nullable=True),
+        sa.Column('processing_status', sa.String(length=50), nullable=True),
+        sa.Column('analysis_results', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'api_usage',
+        sa.Column('id', sa.Uuid(), nullable=False),
+        sa.Column('endpoint', sa.String(length=255), nullable=True),
+        sa.Column('user_id', sa.Uuid(), nullable=True),
+        sa.Column('request_count', sa.Integer(), nullable=True),
+        sa.Column('date', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_DATE)'), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('api_usage')
+    op.drop_table('uploads')
+    op.drop_table('images')
+    op.drop_table('datasets')
@@ -0,0 +1,29 @@
+"""image catalog indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_images_dataset_created', 'images', ['dataset_id', 'created_at', 'id'], unique=False)
+    op.create_index('ux_images_dataset_path', 'images', ['dataset_id', 'file_path'], unique=True)
+    op.create_index('ix_uploads_file_path', 'uploads', ['file_path'], unique=False)
+    op.create_index('ix_uploads_stored_category', 'uploads', ['stored_filename', 'category'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_uploads_stored_category', table_name='uploads')
+    op.drop_index('ix_uploads_file_path', table_name='uploads')
+    op.drop_index('ux_images_dataset_path', table_name='images')
+    op.drop_index('ix_images_dataset_created', table_name='images')
@@ -0,0 +1,23 @@
+"""api usage upsert key
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ux_api_usage_endpoint_user_date', 'api_usage', ['endpoint', 'user_id', 'date'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ux_api_usage_endpoint_user_date', table_name='api_usage')
@@ -1,7 +1,75 @@
-from fastapi import APIRouter
-from app.api.api_v1.endpoints import datasets, uploads, images
+from importlib import import_module
+from typing import List, Tuple
+from fastapi import APIRouter, FastAPI
+from starlette.routing import BaseRoute, Match, NoMatchFound
 
-api_router = APIRouter()
-api_router.include_router(datasets.router, prefix="/datasets", tags=["datasets"])
-api_router.include_router(uploads.router, prefix="/upload", tags=["uploads"])
-api_router.include_router(images.router, prefix="/images", tags=["images"])
+# (endpoint module, prefix, tags)
+ENDPOINTS: Tuple[Tuple[str, str, List[str]], ...] = (
+    ("datasets", "/datasets", ["datasets"]),
+    ("uploads", "/upload", ["uploads"]),
+    ("images", "/images", ["images"]),
+)
+
+def endpoint_router(module: str) -> APIRouter:
+    return import_module(f"app.api.api_v1.endpoints.{module}").router
+
+def build_api_router() -> APIRouter:
+    api_router = APIRouter()
+    for module, prefix, tags in ENDPOINTS:
+        api_router.include_router(endpoint_router(module), prefix=prefix, tags=tags)
+    return api_router
+
+class LazyEndpoints(BaseRoute):
+    # stands in for an endpoint module until the first request under its prefix; the module's
+    # routes are then included into the app as usual and the request is dispatched again, so
+    # route templates (metrics, usage) and the OpenAPI schema are the same as with eager loading
+    def __init__(self, app: FastAPI, module: str, prefix: str, tags: List[str]):
+        self.app = app
+        self.module = module
+        self.path = prefix
+        self.tags = tags
+        self.loaded = False
+
+    def matches(self, scope) -> Tuple[Match, dict]:
+        if scope["type"] in ("http", "websocket"):
+            path = scope["path"]
+            if path == self.path or path.startswith(self.path + "/"):
+                # no child scope, so no "route" either: the real route sets it when handle()
+                # dispatches this same scope again, and the middlewares read it after the call
+                return Match.FULL, {}
+        return Match.NONE, {}
+
+    def url_path_for(self, name: str, **path_params):
+        raise NoMatchFound(name, path_params)
+
+    def load(self) -> None:
+        if self.loaded:
+            return
+        self.loaded = True
+        self.app.include_router(endpoint_router(self.module), prefix=self.path, tags=self.tags)
+        self.app.router.routes.remove(self)
+        self.app.openapi_schema = None
+
+    async def handle(self, scope, receive, send) -> None:
+        self.load()
+        await self.app.router(scope, receive, send)
+
+def lazy_endpoints(app: FastAPI) -> List[LazyEndpoints]:
+    return [route for route in app.router.routes if isinstance(route, LazyEndpoints)]
+
+def include_api(app: FastAPI, prefix: str, lazy: bool) -> None:
+    if not lazy:
+        app.include_router(build_api_router(), prefix=prefix)
+        return
+    for module, path, tags in ENDPOINTS:
+        app.router.routes.append(LazyEndpoints(app, module, prefix + path, tags))
+
+    build_openapi = app.openapi
+
+    def openapi():
+        # the schema lists every route, so generating it loads whatever is still deferred
+        for route in lazy_endpoints(app):
+            route.load()
+        return build_openapi()
+
+    app.openapi = openapi
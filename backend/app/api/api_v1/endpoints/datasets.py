@@ -1,8 +1,98 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Callable, NamedTuple, Optional, Tuple
 import asyncio
+import numpy as np
+from app.core.config import settings
+from app.db.base import get_async_db
+from app.models.dataset import Image
+from app.services.catalog import DATASETS, dataset_uuid
+from app.services.chest_xray_index import ensure_chest_xray_index
+from app.services.facets import FacetIndex, UnknownFacet, get_chest_xray_facets, get_image_table_facets
+from app.services.image_statistics import cached_statistics
+from app.services.pagination import NDJSON_MEDIA_TYPE, InvalidCursor, Window, keyset_window, ndjson_chunk
+from app.services.kitti_service import KittiService
+from app.services.kitti_timeline import DEFAULT_REFERENCE
+from app.services.tiny_imagenet_archive import get_tiny_imagenet_archive
+from app.services.tiny_imagenet_tensors import SPLITS, get_tensor_store, npy_header
 
 router = APIRouter()
+kitti_service = KittiService()
+MAX_BATCH_SIZE = 4096
+BATCH_FIELDS = ("images", "labels", "splits")
+STREAM_CHUNK_SIZE = 1024 * 1024
+NDJSON_BATCH = 500
+
+class Page(NamedTuple):
+    limit: Optional[int]
+    offset: int
+    cursor: Optional[str]
+    stream: bool
+
+class PageParams:
+    # shared by every listing: an opaque cursor from the previous page takes precedence over offset
+    def __init__(self, default_limit: int):
+        self.default_limit = default_limit
+
+    def __call__(
+        self,
+        limit: Optional[int] = Query(None, ge=0),
+        offset: int = Query(0, ge=0),
+        cursor: Optional[str] = None,
+        format: str = Query("json", regex="^(json|ndjson)$")
+    ) -> Page:
+        if format == "ndjson":
+            # streams are generated batch by batch, so they may run to the end of the listing
+            return Page(limit, offset, cursor, True)
+        return Page(min(self.default_limit if limit is None else limit, settings.MAX_PAGE_SIZE), offset, cursor, False)
+
+def page_window(keys: np.ndarray, scope: str, page: Page) -> Window:
+    try:
+        return keyset_window(keys, scope, page.cursor, page.offset, page.limit)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def facet_query(index: FacetIndex, filters: "FacetFilters") -> Tuple[np.ndarray, Dict[str, Dict[str, int]]]:
+    try:
+        return index.query(filters.selections, filters.ranges)
+    except UnknownFacet as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def listing_response(
+    page: Page,
+    window: Window,
+    total: int,
+    field: str,
+    rows_between: Callable[[int, int], Any],
+    **extra: Any
+):
+    # rows_between(start, stop) returns the rows at those key positions; it may be a coroutine function
+    is_async = asyncio.iscoroutinefunction(rows_between)
+    if page.stream:
+        headers = {"X-Total-Count": str(total)}
+        if window.next_cursor:
+            headers["X-Next-Cursor"] = window.next_cursor
+        starts = range(window.start, window.stop, NDJSON_BATCH)
+        if is_async:
+            async def chunks():
+                for start in starts:
+                    yield ndjson_chunk(await rows_between(start, min(start + NDJSON_BATCH, window.stop)))
+            body = chunks()
+        else:
+            body = (ndjson_chunk(rows_between(start, min(start + NDJSON_BATCH, window.stop))) for start in starts)
+        return StreamingResponse(body, media_type=NDJSON_MEDIA_TYPE, headers=headers)
+    rows = rows_between(window.start, window.stop)
+    return {
+        field: await rows if is_async else rows,
+        **extra,
+        "total": total,
+        "limit": page.limit,
+        "offset": window.start,
+        "next_cursor": window.next_cursor
+    }
 
 @router.get("/")
 async def list_datasets():
@@ -35,29 +125,72 @@ async def list_datasets():
         ]
     }
 
+class FacetFilters:
+    def __init__(
+        self,
+        category: Optional[List[str]] = Query(None),
+        split: Optional[List[str]] = Query(None),
+        mime_type: Optional[List[str]] = Query(None),
+        min_width: Optional[int] = None,
+        max_width: Optional[int] = None,
+        min_height: Optional[int] = None,
+        max_height: Optional[int] = None,
+        min_file_size: Optional[int] = None,
+        max_file_size: Optional[int] = None
+    ):
+        self.selections = {
+            facet: values
+            for facet, values in (("category", category), ("split", split), ("mime_type", mime_type))
+            if values
+        }
+        self.ranges = {
+            name: bounds
+            for name, bounds in (
+                ("width", (min_width, max_width)),
+                ("height", (min_height, max_height)),
+                ("file_size", (min_file_size, max_file_size))
+            )
+            if bounds != (None, None)
+        }
+
 @router.get("/chest-xray/samples")
-async def get_chest_xray_samples(limit: int = 20, offset: int = 0):
-    samples = []
-    for i in range(limit):
-        samples.append({
-            "id": f"chest_xray_{offset + i + 1}",
-            "filename": f"chest_xray_{offset + i + 1}.jpeg",
-            "category": "Normal" if (offset + i) % 3 == 0 else "Pneumonia",
-            "file_size": 45000 + (i * 1000),
-            "width": 1024,
-            "height": 1024,
-            "url": f"/api/v1/images/chest-xray/chest_xray_{offset + i + 1}"
-        })
-    
-    return {
-        "samples": samples,
-        "total": 5856,
-        "limit": limit,
-        "offset": offset
-    }
+async def get_chest_xray_samples(
+    page: Page = Depends(PageParams(20)),
+    filters: FacetFilters = Depends()
+):
+    index = await ensure_chest_xray_index()
+    if index is not None:
+        rows, facets = facet_query(get_chest_xray_facets(), filters)
+        window = page_window(rows, "chest-xray/samples", page)
+        return await listing_response(
+            page, window, int(len(rows)), "samples",
+            lambda start, stop: index.samples(rows[start:stop]),
+            facets=facets
+        )
+
+    def mock_samples(start: int, stop: int) -> List[Dict[str, Any]]:
+        samples = []
+        for i in range(start, stop):
+            samples.append({
+                "id": f"chest_xray_{i + 1}",
+                "filename": f"chest_xray_{i + 1}.jpeg",
+                "category": "Normal" if i % 3 == 0 else "Pneumonia",
+                "file_size": 45000 + ((i - start) * 1000),
+                "width": 1024,
+                "height": 1024,
+                "url": f"/api/v1/images/chest-xray/chest_xray_{i + 1}"
+            })
+        return samples
+
+    window = page_window(np.arange(5856), "chest-xray/samples", page)
+    return await listing_response(page, window, 5856, "samples", mock_samples)
 
 @router.get("/chest-xray/categories")
 async def get_chest_xray_categories():
+    index = await ensure_chest_xray_index()
+    if index is not None:
+        return {"categories": index.categories()}
+
     return {
         "categories": [
             {
@@ -75,6 +208,17 @@ async def get_chest_xray_categories():
 
 @router.get("/chest-xray/statistics")
 async def get_chest_xray_statistics():
+    image_statistics = await cached_statistics("chest-xray")
+    index = await ensure_chest_xray_index()
+    if index is not None:
+        return {
+            **index.statistics(),
+            "image_format": "JPEG",
+            "source": "Pediatric patients",
+            "quality_control": "Expert physician graded",
+            "image_statistics": image_statistics
+        }
+
     return {
         "total_images": 5856,
         "normal_cases": 1583,
@@ -85,12 +229,20 @@ async def get_chest_xray_statistics():
         "distribution": [
             {"name": "Normal", "value": 1583, "color": "#10b981"},
             {"name": "Pneumonia", "value": 4273, "color": "#ef4444"}
-        ]
+        ],
+        "image_statistics": image_statistics
     }
 
 @router.get("/tiny-imagenet/classes")
-async def get_tiny_imagenet_classes(limit: int = 50, offset: int = 0):
-    classes = []
+async def get_tiny_imagenet_classes(page: Page = Depends(PageParams(50))):
+    archive = get_tiny_imagenet_archive()
+    if archive is not None:
+        all_classes = archive.classes()
+        window = page_window(np.arange(len(all_classes)), "tiny-imagenet/classes", page)
+        return await listing_response(
+            page, window, len(all_classes), "classes", lambda start, stop: all_classes[start:stop]
+        )
+
     class_names = [
         "Egyptian cat", "Persian cat", "tabby cat", "tiger cat", "Siamese cat",
         "golden retriever", "Labrador retriever", "beagle", "basset hound", "bloodhound",
@@ -98,46 +250,120 @@ async def get_tiny_imagenet_classes(limit: int = 50, offset: int = 0):
         "airliner", "warplane", "space shuttle", "hot air balloon", "airship",
         "acoustic guitar", "electric guitar", "banjo", "cello", "violin"
     ]
-    
-    for i in range(min(limit, len(class_names) - offset)):
-        idx = offset + i
-        if idx < len(class_names):
-            classes.append({
+
+    def mock_classes(start: int, stop: int) -> List[Dict[str, Any]]:
+        return [
+            {
                 "id": f"n{idx:08d}",
                 "name": class_names[idx],
                 "wordnet_id": f"n{idx:08d}",
                 "sample_count": 500
-            })
-    
-    return {
-        "classes": classes,
-        "total": 200,
-        "limit": limit,
-        "offset": offset
-    }
+            }
+            for idx in range(start, stop)
+        ]
+
+    window = page_window(np.arange(len(class_names)), "tiny-imagenet/classes", page)
+    return await listing_response(page, window, 200, "classes", mock_classes)
 
 @router.get("/tiny-imagenet/samples/{class_id}")
-async def get_tiny_imagenet_samples(class_id: str, limit: int = 20):
-    samples = []
-    for i in range(limit):
-        samples.append({
-            "id": f"{class_id}_{i + 1}",
-            "filename": f"{class_id}_{i + 1}.JPEG",
-            "class_id": class_id,
-            "width": 64,
-            "height": 64,
-            "url": f"/api/v1/images/tiny-imagenet/{class_id}/{class_id}_{i + 1}"
-        })
-    
-    return {
-        "samples": samples,
-        "class_id": class_id,
-        "total_per_class": 500,
-        "limit": limit
-    }
+async def get_tiny_imagenet_samples(class_id: str, page: Page = Depends(PageParams(20))):
+    scope = f"tiny-imagenet/samples/{class_id}"
+    archive = get_tiny_imagenet_archive()
+    if archive is not None:
+        total = archive.class_size(class_id)
+
+        def class_samples(start: int, stop: int) -> List[Dict[str, Any]]:
+            samples = []
+            for filename in archive.class_samples(class_id, stop - start, start)[0]:
+                image_id = filename.rsplit(".", 1)[0]
+                samples.append({
+                    "id": image_id,
+                    "filename": filename,
+                    "class_id": class_id,
+                    "width": 64,
+                    "height": 64,
+                    "url": f"/api/v1/images/tiny-imagenet/{class_id}/{image_id}"
+                })
+            return samples
+
+        window = page_window(np.arange(total), scope, page)
+        return await listing_response(page, window, total, "samples", class_samples, class_id=class_id, total_per_class=total)
+
+    def mock_samples(start: int, stop: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": f"{class_id}_{i + 1}",
+                "filename": f"{class_id}_{i + 1}.JPEG",
+                "class_id": class_id,
+                "width": 64,
+                "height": 64,
+                "url": f"/api/v1/images/tiny-imagenet/{class_id}/{class_id}_{i + 1}"
+            }
+            for i in range(start, stop)
+        ]
+
+    window = page_window(np.arange(500), scope, page)
+    return await listing_response(page, window, 500, "samples", mock_samples, class_id=class_id, total_per_class=500)
+
+def stream_npy(array: np.ndarray):
+    yield npy_header(array)
+    data = np.ascontiguousarray(array).reshape(-1).view(np.uint8)
+    for start in range(0, len(data), STREAM_CHUNK_SIZE):
+        yield data[start:start + STREAM_CHUNK_SIZE].tobytes()
+
+@router.get("/tiny-imagenet/batch")
+async def get_tiny_imagenet_batch(
+    indices: Optional[str] = None,
+    start: int = Query(0, ge=0),
+    stop: Optional[int] = Query(None, ge=0),
+    split: Optional[str] = None,
+    field: str = "images"
+):
+    store = get_tensor_store()
+    if store is None:
+        raise HTTPException(
+            status_code=404,
+            detail="Tiny-ImageNet tensor store not exported; run python -m app.services.tiny_imagenet_tensors"
+        )
+    if split is not None and split not in SPLITS:
+        raise HTTPException(status_code=400, detail=f"split must be one of {', '.join(SPLITS)}")
+    if field not in BATCH_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of {', '.join(BATCH_FIELDS)}")
+    base, end = store.split_range(split)
+    source = getattr(store, field)
+
+    if indices is not None:
+        try:
+            positions = np.array([int(i) for i in indices.split(",")], dtype=np.int64)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="indices must be comma-separated integers")
+        if len(positions) > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} indices per batch")
+        if len(positions) and (positions.min() < 0 or positions.max() >= end - base):
+            raise HTTPException(status_code=416, detail=f"indices must be in [0, {end - base})")
+        batch = source[base + positions]
+    else:
+        stop = end - base if stop is None else stop
+        lo, hi = base + start, min(base + stop, end)
+        if hi - lo > MAX_BATCH_SIZE:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} rows per batch")
+        # a contiguous range is a view into the memmap; nothing is copied until it is written out
+        batch = source[lo:max(lo, hi)]
+
+    return StreamingResponse(
+        stream_npy(batch),
+        media_type="application/octet-stream",
+        headers={
+            "Content-Length": str(len(npy_header(batch)) + batch.nbytes),
+            "Content-Disposition": f'attachment; filename="tiny_imagenet_{field}.npy"',
+            "X-Batch-Count": str(len(batch)),
+            "X-Batch-Shape": ",".join(str(n) for n in batch.shape)
+        }
+    )
 
 @router.get("/tiny-imagenet/statistics")
 async def get_tiny_imagenet_statistics():
+    image_statistics = await cached_statistics("tiny-imagenet")
     return {
         "total_images": 120000,
         "total_classes": 200,
@@ -151,7 +377,8 @@ async def get_tiny_imagenet_statistics():
             {"name": "Training", "value": 100000, "color": "#3b82f6"},
             {"name": "Validation", "value": 10000, "color": "#8b5cf6"},
             {"name": "Test", "value": 10000, "color": "#f59e0b"}
-        ]
+        ],
+        "image_statistics": image_statistics
     }
 
 @router.get("/kitti/sequences")
@@ -191,23 +418,140 @@ async def get_kitti_sequence(sequence_id: str):
     }
 
 @router.get("/kitti/frames/{sequence_id}")
-async def get_kitti_frames(sequence_id: str, limit: int = 20, offset: int = 0):
-    frames = []
-    for i in range(limit):
-        frame_id = offset + i
-        frames.append({
-            "id": f"{sequence_id}_frame_{frame_id:06d}",
-            "sequence_id": sequence_id,
-            "frame_number": frame_id,
-            "timestamp": frame_id * 0.1,
-            "camera_url": f"/api/v1/images/kitti/{sequence_id}/camera_{frame_id:06d}",
-            "lidar_url": f"/api/v1/images/kitti/{sequence_id}/lidar_{frame_id:06d}"
-        })
-    
-    return {
-        "frames": frames,
+async def get_kitti_frames(sequence_id: str, page: Page = Depends(PageParams(20))):
+    scope = f"kitti/frames/{sequence_id}"
+    timeline = kitti_service.timeline(sequence_id)
+    if timeline is not None and timeline.stream(DEFAULT_REFERENCE) is not None:
+        total = len(timeline.stream(DEFAULT_REFERENCE))
+        window = page_window(np.arange(total), scope, page)
+        return await listing_response(
+            page, window, total, "frames",
+            lambda start, stop: kitti_service.timeline_frames(sequence_id, timeline, stop - start, start),
+            sequence_id=sequence_id
+        )
+
+    def mock_frames(start: int, stop: int) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": f"{sequence_id}_frame_{frame_id:06d}",
+                "sequence_id": sequence_id,
+                "frame_number": frame_id,
+                "timestamp": frame_id * 0.1,
+                "camera_url": f"/api/v1/images/kitti/{sequence_id}/camera_{frame_id:06d}",
+                "lidar_url": f"/api/v1/images/kitti/{sequence_id}/lidar_{frame_id:06d}"
+            }
+            for frame_id in range(start, stop)
+        ]
+
+    window = page_window(np.arange(465), scope, page)
+    return await listing_response(page, window, 465, "frames", mock_frames, sequence_id=sequence_id)
+
+@router.get("/kitti/trajectory/{sequence_id}")
+async def get_kitti_trajectory(
+    sequence_id: str,
+    zoom: Optional[float] = Query(None, ge=0, le=24),
+    max_points: Optional[int] = Query(None, ge=2)
+):
+    # the first request parses every OXTS file, so keep it off the event loop
+    trajectory = await run_in_threadpool(kitti_service.trajectory, sequence_id)
+    if trajectory is None:
+        raise HTTPException(status_code=404, detail=f"No GPS/IMU data for sequence {sequence_id}")
+
+    level = trajectory.level_for(zoom, max_points)
+    # the payload is plain lists of floats, so skip jsonable_encoder walking thousands of values
+    return JSONResponse({
         "sequence_id": sequence_id,
-        "total": 465,
-        "limit": limit,
-        "offset": offset
-    }
+        "level": level,
+        "source_count": len(trajectory),
+        "levels": trajectory.levels_summary(),
+        **trajectory.payload(level)
+    })
+
+@router.get("/kitti/align/{sequence_id}")
+async def get_kitti_alignment(
+    sequence_id: str,
+    reference: str = DEFAULT_REFERENCE,
+    t0: Optional[float] = None,
+    t1: Optional[float] = None,
+    max_delta_ms: Optional[float] = Query(None, gt=0),
+    page: Page = Depends(PageParams(100))
+):
+    timeline = kitti_service.timeline(sequence_id)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail=f"No sensor timestamps for sequence {sequence_id}")
+    if timeline.stream(reference) is None:
+        raise HTTPException(status_code=400, detail=f"reference must be one of {', '.join(timeline.sensors)}")
+
+    if t0 is not None or t1 is not None:
+        # the cursor is a frame number, so the window is walked in frame order
+        frame_numbers = np.sort(timeline.window(reference, t0, t1))
+    else:
+        frame_numbers = np.arange(len(timeline.stream(reference)))
+    max_delta_ns = int(max_delta_ms * 1_000_000) if max_delta_ms is not None else None
+
+    def aligned_frames(start: int, stop: int) -> List[Dict[str, Any]]:
+        frames_slice = frame_numbers[start:stop]
+        aligned = timeline.align(reference, frames_slice, max_delta_ns)
+        columns = {
+            sensor: (nearest.tolist(), timeline.timestamps(sensor, np.maximum(nearest, 0)).tolist(), (delta / 1_000_000).tolist())
+            for sensor, (nearest, delta) in aligned.items()
+        }
+        frames = []
+        for i, (frame_number, timestamp) in enumerate(
+            zip(frames_slice.tolist(), timeline.timestamps(reference, frames_slice).tolist())
+        ):
+            frames.append({
+                "frame_number": frame_number,
+                "timestamp": timestamp,
+                "aligned": {
+                    sensor: {
+                        "frame_number": nearest[i],
+                        "timestamp": timestamps[i],
+                        "delta_ms": round(deltas[i], 3)
+                    } if nearest[i] >= 0 else None
+                    for sensor, (nearest, timestamps, deltas) in columns.items()
+                }
+            })
+        return frames
+
+    window = page_window(frame_numbers, f"kitti/align/{sequence_id}/{reference}", page)
+    return await listing_response(
+        page, window, len(frame_numbers), "frames", aligned_frames,
+        sequence_id=sequence_id, reference=reference, sensors=timeline.summary()
+    )
+
+async def image_rows(db: AsyncSession, ids: List[Any]) -> List[Dict[str, Any]]:
+    # only the rows on the page are read back, by primary key
+    images = {image.id: image for image in (await db.scalars(select(Image).where(Image.id.in_(ids)))).all()} if ids else {}
+    return [
+        {
+            "id": str(image.id),
+            "filename": image.filename,
+            "mime_type": image.mime_type,
+            "file_size": image.file_size,
+            "width": image.width,
+            "height": image.height,
+            "metadata": image.image_metadata or {},
+            "created_at": image.created_at.isoformat() if image.created_at else None
+        }
+        for image in (images.get(image_id) for image_id in ids) if image is not None
+    ]
+
+@router.get("/{dataset_id}/images")
+async def get_dataset_images(
+    dataset_id: str,
+    page: Page = Depends(PageParams(20)),
+    filters: FacetFilters = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    if dataset_id not in DATASETS:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    table = await get_image_table_facets(db, dataset_uuid(dataset_id))
+    rows, facets = await run_in_threadpool(facet_query, table.index, filters)
+    # positions in the facet index follow (created_at, id), so they double as the keyset
+    window = page_window(rows, f"{dataset_id}/images", page)
+
+    async def page_rows(start: int, stop: int) -> List[Dict[str, Any]]:
+        return await image_rows(db, [table.ids[row] for row in rows[start:stop].tolist()])
+
+    return await listing_response(page, window, int(len(rows)), "images", page_rows, facets=facets)
@@ -1,8 +1,32 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Union
+import asyncio
 import base64
+import hashlib
+import math
+import mimetypes
+from app.core.config import settings
+from app.db.base import get_async_db
+from app.services.bev_render import BEV_CHANNELS, DEFAULT_RESOLUTION, DEFAULT_SIZE, render_scan
+from app.services.chest_xray_index import ensure_chest_xray_index
+from app.services.derivative_cache import CacheEntry, derivative_key, file_digest, get_derivative_cache
+from app.services.frame_container import ContainerError, frame_containers
+from app.services.kitti_service import KittiService, parse_frame_number
+from app.services.point_cloud import ENCODINGS, prepare_scan
+from app.services.sprite_sheet import (
+    DEFAULT_COLUMNS, MAX_SPRITE_IMAGES, SPRITE_TILE, class_rows, pack_sprite, sprite_digest, sprite_map
+)
+from app.services.tile_pyramid import TILE_OVERLAP, TILE_SIZE, TilePyramid, get_tile_pyramid
+from app.services.tiny_imagenet_archive import get_tiny_imagenet_archive
+from app.services.transcoder import DEFAULT_QUALITY, OUTPUT_FORMATS, TranscoderBusy, get_transcoder
+from app.services.upload_store import find_upload, parse_upload_id
 
 router = APIRouter()
+kitti_service = KittiService()
+_inflight: Dict[str, "asyncio.Future[CacheEntry]"] = {}
 
 def generate_placeholder_image(width: int = 400, height: int = 300, text: str = "Sample Image"):
     svg_content = f'''<svg width="{width}" height="{height}" xmlns="http://www.w3.org/2000/svg">
@@ -11,28 +35,398 @@ def generate_placeholder_image(width: int = 400, height: int = 300, text: str =
     </svg>'''
     return svg_content.encode('utf-8')
 
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def image_transform(
+    w: Optional[int] = Query(None, ge=1, le=4096),
+    h: Optional[int] = Query(None, ge=1, le=4096),
+    q: Optional[int] = Query(None, ge=1, le=100),
+    format: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    if format is not None:
+        format = format.lower().replace("jpg", "jpeg")
+        if format not in OUTPUT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+    if w is None and h is None and format is None:
+        return None
+    return {"width": w, "height": h, "quality": q, "fmt": format}
+
+def sniff_media_type(content: bytes) -> str:
+    if content.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if content.startswith(b"\x89PNG"):
+        return "image/png"
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+async def render_once(key: str, render: Callable[[], Awaitable[CacheEntry]], store: bool) -> CacheEntry:
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        entry = await render()
+        if store:
+            await run_in_threadpool(get_derivative_cache().put, key, entry)
+        future.set_result(entry)
+        return entry
+    except BaseException as exc:
+        future.set_exception(exc)
+        # consumed here so a failure with no concurrent waiters is not reported as unretrieved
+        future.exception()
+        raise
+    finally:
+        del _inflight[key]
+
+async def cached_response(
+    request: Request,
+    source_hash: str,
+    params: Dict[str, Any],
+    render: Callable[[], Awaitable[CacheEntry]],
+    store: bool = True
+) -> Response:
+    key = derivative_key(source_hash, params)
+    headers = {"ETag": f'"{key}"', "Cache-Control": settings.IMAGE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    entry = await run_in_threadpool(get_derivative_cache().get, key) if store else None
+    if entry is None:
+        entry = await render_once(key, render, store)
+    return Response(content=entry.content, media_type=entry.media_type, headers={**entry.headers, **headers})
+
+async def placeholder_response(request: Request, width: int, height: int, text: str) -> Response:
+    content = generate_placeholder_image(width, height, text)
+
+    async def render() -> CacheEntry:
+        return CacheEntry(content, "image/svg+xml", {})
+
+    return await cached_response(request, hashlib.sha256(content).hexdigest(), {}, render, store=False)
+
+async def original_response(
+    request: Request,
+    source_hash: str,
+    load: Callable[[], Union[bytes, str]],
+    media_type: str
+) -> Response:
+    # originals already live on disk or in an archive, so they are served from there and only
+    # derivatives take up room in the cache
+    headers = {
+        "ETag": f'"{derivative_key(source_hash, {"variant": "original"})}"',
+        "Cache-Control": settings.IMAGE_CACHE_CONTROL
+    }
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    source = await run_in_threadpool(load)
+    if isinstance(source, str):
+        return FileResponse(source, media_type=media_type, headers=headers)
+    return Response(content=source, media_type=media_type, headers=headers)
+
+async def image_response(
+    request: Request,
+    source_hash: str,
+    load: Callable[[], Union[bytes, str]],
+    media_type: str,
+    transform: Optional[Dict[str, Any]]
+) -> Response:
+    if transform is None:
+        return await original_response(request, source_hash, load, media_type)
+
+    async def render() -> CacheEntry:
+        source = await run_in_threadpool(load)
+        try:
+            content, output_type = await get_transcoder().transcode(source, **transform)
+        except TranscoderBusy:
+            raise HTTPException(status_code=503, detail="Image transcoder is overloaded", headers={"Retry-After": "1"})
+        return CacheEntry(content, output_type, {})
+
+    return await cached_response(request, source_hash, {"variant": "transcode", **transform}, render)
+
+async def file_response(request: Request, path: str, transform: Optional[Dict[str, Any]]) -> Response:
+    source_hash = await run_in_threadpool(file_digest, path)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    return await image_response(request, source_hash, lambda: path, media_type, transform)
+
+async def bev_response(
+    request: Request,
+    path: str,
+    transform: Optional[Dict[str, Any]],
+    channel: str,
+    resolution: float
+) -> Response:
+    if channel not in BEV_CHANNELS:
+        raise HTTPException(status_code=400, detail=f"channel must be one of {', '.join(BEV_CHANNELS)}")
+    # for a raster w/h set the grid size directly, so resolution stays metres per pixel
+    transform = transform or {}
+    params = {
+        "variant": "bev",
+        "width": transform.get("width") or DEFAULT_SIZE[0],
+        "height": transform.get("height") or DEFAULT_SIZE[1],
+        "resolution": resolution,
+        "channel": channel,
+        "fmt": transform.get("fmt") or "png",
+        "quality": transform.get("quality")
+    }
+
+    async def render() -> CacheEntry:
+        content, media_type, headers = await run_in_threadpool(
+            render_scan, path, params["width"], params["height"], resolution, channel, params["fmt"], params["quality"]
+        )
+        return CacheEntry(content, media_type, headers)
+
+    source_hash = await run_in_threadpool(file_digest, path)
+    return await cached_response(request, source_hash, params, render)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    return get_derivative_cache().stats()
+
 @router.get("/chest-xray/{image_id}")
-async def get_chest_xray_image(image_id: str):
-    svg_content = generate_placeholder_image(512, 512, f"Chest X-ray\n{image_id}")
-    return Response(content=svg_content, media_type="image/svg+xml")
+async def get_chest_xray_image(
+    image_id: str,
+    request: Request,
+    transform: Optional[Dict[str, Any]] = Depends(image_transform)
+):
+    index = await ensure_chest_xray_index()
+    if index is not None:
+        row = index.row_for_id(image_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
+        return await file_response(request, index.path(row), transform)
+
+    return await placeholder_response(request, 512, 512, f"Chest X-ray\n{image_id}")
+
+async def chest_xray_pyramid(image_id: str) -> Tuple[TilePyramid, str]:
+    index = await ensure_chest_xray_index()
+    row = index.row_for_id(image_id) if index is not None else None
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
+    path = index.path(row)
+    source_hash = await run_in_threadpool(file_digest, path)
+    return await run_in_threadpool(get_tile_pyramid, path, source_hash), source_hash
+
+@router.get("/chest-xray/{image_id}/tiles")
+async def get_chest_xray_tile_info(image_id: str):
+    pyramid, _ = await chest_xray_pyramid(image_id)
+    return {
+        "image_id": image_id,
+        **pyramid.info(),
+        "tile_url": f"/api/v1/images/chest-xray/{image_id}/tiles/{{z}}/{{x}}/{{y}}"
+    }
+
+@router.get("/chest-xray/{image_id}/tiles/{z}/{x}/{y}")
+async def get_chest_xray_tile(image_id: str, z: int, x: int, y: int, request: Request):
+    pyramid, source_hash = await chest_xray_pyramid(image_id)
+    if not pyramid.has_tile(z, x, y):
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} is outside the image")
+
+    async def render() -> CacheEntry:
+        content = await run_in_threadpool(pyramid.tile, z, x, y)
+        return CacheEntry(content, OUTPUT_FORMATS[pyramid.fmt][1], {})
+
+    # tiles are persisted by the pyramid itself, so they skip the derivative cache
+    params = {"variant": "tile", "z": z, "x": x, "y": y, "size": TILE_SIZE, "overlap": TILE_OVERLAP, "fmt": pyramid.fmt}
+    return await cached_response(request, source_hash, params, render, store=False)
+
+def sprite_params(
+    offset: int = Query(0, ge=0),
+    count: int = Query(20, ge=1, le=MAX_SPRITE_IMAGES),
+    columns: int = Query(DEFAULT_COLUMNS, ge=1, le=64),
+    q: Optional[int] = Query(None, ge=1, le=100),
+    format: str = "jpeg"
+) -> Dict[str, Any]:
+    format = format.lower().replace("jpg", "jpeg")
+    if format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(OUTPUT_FORMATS)}")
+    return {"offset": offset, "count": count, "columns": columns, "quality": q or DEFAULT_QUALITY, "fmt": format}
+
+def sprite_rows(class_id: str, params: Dict[str, Any]):
+    archive = get_tiny_imagenet_archive()
+    if archive is None:
+        raise HTTPException(status_code=404, detail="Tiny-ImageNet archive is not available")
+    rows, total = class_rows(archive, class_id, params["offset"], params["count"])
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No images for class {class_id} at offset {params['offset']}")
+    return archive, rows, total
+
+# declared before /tiny-imagenet/{class_id}/{image_id}, which would otherwise match "sprite" as an image id
+@router.get("/tiny-imagenet/{class_id}/sprite/map")
+async def get_tiny_imagenet_sprite_map(class_id: str, params: Dict[str, Any] = Depends(sprite_params)):
+    archive, rows, total = sprite_rows(class_id, params)
+    columns = min(params["columns"], len(rows))
+    query = f"offset={params['offset']}&count={params['count']}&columns={params['columns']}&format={params['fmt']}"
+    return {
+        "class_id": class_id,
+        "sprite_url": f"/api/v1/images/tiny-imagenet/{class_id}/sprite?{query}",
+        "tile_size": SPRITE_TILE,
+        "columns": columns,
+        "rows": math.ceil(len(rows) / columns),
+        "offset": params["offset"],
+        "total_per_class": total,
+        "images": sprite_map(archive, rows, columns)
+    }
+
+@router.get("/tiny-imagenet/{class_id}/sprite")
+async def get_tiny_imagenet_sprite(
+    class_id: str,
+    request: Request,
+    params: Dict[str, Any] = Depends(sprite_params)
+):
+    archive, rows, total = sprite_rows(class_id, params)
+    columns = min(params["columns"], len(rows))
+    headers = {
+        "X-Sprite-Tile-Size": str(SPRITE_TILE),
+        "X-Sprite-Columns": str(columns),
+        "X-Sprite-Count": str(len(rows)),
+        "X-Sprite-Total": str(total)
+    }
+
+    async def render() -> CacheEntry:
+        content, media_type = await run_in_threadpool(
+            pack_sprite, archive, rows, columns, params["fmt"], params["quality"]
+        )
+        return CacheEntry(content, media_type, headers)
+
+    source_hash = await run_in_threadpool(sprite_digest, archive, rows)
+    cache_params = {"variant": "sprite", "columns": columns, "fmt": params["fmt"], "quality": params["quality"]}
+    return await cached_response(request, source_hash, cache_params, render)
 
 @router.get("/tiny-imagenet/{class_id}/{image_id}")
-async def get_tiny_imagenet_image(class_id: str, image_id: str):
-    svg_content = generate_placeholder_image(64, 64, f"TinyImageNet\n{class_id}")
-    return Response(content=svg_content, media_type="image/svg+xml")
+async def get_tiny_imagenet_image(
+    class_id: str,
+    image_id: str,
+    request: Request,
+    transform: Optional[Dict[str, Any]] = Depends(image_transform)
+):
+    archive = get_tiny_imagenet_archive()
+    if archive is not None:
+        row = archive.find(archive.image_key(class_id, image_id))
+        if row is None:
+            raise HTTPException(status_code=404, detail=f"Image {class_id}/{image_id} not found")
+        return await image_response(
+            request, archive.entry_digest(row), lambda: archive.read_row(row), "image/jpeg", transform
+        )
+
+    return await placeholder_response(request, 64, 64, f"TinyImageNet\n{class_id}")
 
 @router.get("/kitti/{sequence_id}/{frame_id}")
-async def get_kitti_image(sequence_id: str, frame_id: str):
+async def get_kitti_image(
+    sequence_id: str,
+    frame_id: str,
+    request: Request,
+    transform: Optional[Dict[str, Any]] = Depends(image_transform),
+    channel: str = "height",
+    resolution: float = Query(DEFAULT_RESOLUTION, gt=0, le=10)
+):
     if "camera" in frame_id:
-        svg_content = generate_placeholder_image(1242, 375, f"KITTI Camera\n{sequence_id}\n{frame_id}")
+        frame_number = parse_frame_number(frame_id)
+        path = kitti_service.camera_path(sequence_id, frame_number) if frame_number is not None else None
+        if path is not None:
+            return await file_response(request, path, transform)
+        return await placeholder_response(request, 1242, 375, f"KITTI Camera\n{sequence_id}\n{frame_id}")
     elif "lidar" in frame_id:
-        svg_content = generate_placeholder_image(600, 400, f"KITTI LIDAR\n{sequence_id}\n{frame_id}")
+        frame_number = parse_frame_number(frame_id)
+        path = kitti_service.velodyne_path(sequence_id, frame_number) if frame_number is not None else None
+        if path is not None:
+            return await bev_response(request, path, transform, channel, resolution)
+        return await placeholder_response(request, 600, 400, f"KITTI LIDAR\n{sequence_id}\n{frame_id}")
     else:
-        svg_content = generate_placeholder_image(600, 400, f"KITTI Data\n{sequence_id}\n{frame_id}")
-    
-    return Response(content=svg_content, media_type="image/svg+xml")
+        return await placeholder_response(request, 600, 400, f"KITTI Data\n{sequence_id}\n{frame_id}")
+
+@router.get("/kitti/{sequence_id}/{frame_id}/points")
+async def get_kitti_points(
+    sequence_id: str,
+    frame_id: str,
+    request: Request,
+    max_range: Optional[float] = None,
+    min_range: Optional[float] = None,
+    voxel_size: Optional[float] = None,
+    max_points: Optional[int] = None,
+    encoding: str = "float16"
+):
+    if encoding not in ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"encoding must be one of {', '.join(ENCODINGS)}")
+    if voxel_size is not None and voxel_size <= 0:
+        raise HTTPException(status_code=400, detail="voxel_size must be positive")
+    if max_points is not None and max_points <= 0:
+        raise HTTPException(status_code=400, detail="max_points must be positive")
+    if (min_range is not None and min_range < 0) or (max_range is not None and max_range <= 0):
+        raise HTTPException(status_code=400, detail="min_range must not be negative and max_range must be positive")
+    if min_range is not None and max_range is not None and min_range >= max_range:
+        raise HTTPException(status_code=400, detail="min_range must be less than max_range")
+
+    frame_number = parse_frame_number(frame_id)
+    path = kitti_service.velodyne_path(sequence_id, frame_number) if frame_number is not None else None
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"LIDAR scan {sequence_id}/{frame_id} not found")
+
+    async def render() -> CacheEntry:
+        payload, headers = await run_in_threadpool(
+            prepare_scan, path, max_range, min_range, voxel_size, max_points, encoding, frame_number
+        )
+        return CacheEntry(payload, "application/octet-stream", headers)
+
+    params = {
+        "variant": "points",
+        "max_range": max_range,
+        "min_range": min_range,
+        "voxel_size": voxel_size,
+        "max_points": max_points,
+        "encoding": encoding,
+        "seed": frame_number
+    }
+    source_hash = await run_in_threadpool(file_digest, path)
+    return await cached_response(request, source_hash, params, render)
+
+@router.get("/traffic-sequence/{sequence_id}/{frame_number}")
+async def get_traffic_sequence_frame(
+    sequence_id: str,
+    frame_number: int,
+    request: Request,
+    transform: Optional[Dict[str, Any]] = Depends(image_transform)
+):
+    try:
+        container = frame_containers.get(sequence_id) if parse_upload_id(sequence_id) is not None else None
+    except ContainerError:
+        raise HTTPException(
+            status_code=503, detail=f"Sequence {sequence_id} is being written", headers={"Retry-After": "1"}
+        )
+    if container is None or not 0 <= frame_number < container.frame_count:
+        raise HTTPException(status_code=404, detail=f"Frame {sequence_id}/{frame_number} not found")
+
+    record = container.index[frame_number]
+    # frames are never rewritten in place, so their byte range identifies the content
+    source_hash = f"frames-{sequence_id}-{frame_number}-{int(record['offset'])}-{int(record['length'])}"
+    if transform is None:
+        async def render() -> CacheEntry:
+            content = await run_in_threadpool(container.read_frame, frame_number)
+            return CacheEntry(content, sniff_media_type(content), {})
+
+        return await cached_response(request, source_hash, {"variant": "original"}, render, store=False)
+    return await image_response(
+        request, source_hash, lambda: container.read_frame(frame_number), "application/octet-stream", transform
+    )
 
 @router.get("/upload/{category}/{upload_id}")
-async def get_uploaded_image(category: str, upload_id: str):
-    svg_content = generate_placeholder_image(400, 400, f"Uploaded {category.title()}\n{upload_id}")
-    return Response(content=svg_content, media_type="image/svg+xml")
+async def get_uploaded_image(
+    category: str,
+    upload_id: str,
+    request: Request,
+    transform: Optional[Dict[str, Any]] = Depends(image_transform),
+    db: AsyncSession = Depends(get_async_db)
+):
+    upload = await find_upload(db, category, upload_id)
+    if upload is not None and upload.file_path:
+        # blobs are named by their sha256, which is already the content hash
+        media_type = mimetypes.guess_type(upload.original_filename or "")[0] or "application/octet-stream"
+        path = upload.file_path
+        return await image_response(request, upload.stored_filename, lambda: path, media_type, transform)
+
+    return await placeholder_response(request, 400, 400, f"Uploaded {category.title()}\n{upload_id}")
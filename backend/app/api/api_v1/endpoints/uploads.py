@@ -1,105 +1,155 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Form, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import uuid
 import os
-from PIL import Image
 import shutil
+from app.core.config import settings
+from app.db.base import get_async_db
+from app.models.dataset import Upload
+from app.services.frame_container import (
+    ContainerError, FrameContainerWriter, append_lock, container_path, frame_containers
+)
+from app.services.inference import get_inference_engine
+from app.services.jobs import get_job_manager
+from app.services.upload_store import (
+    FileTooLarge, StoredBlob, delete_upload as delete_upload_record, discard_blobs, find_upload, parse_upload_id,
+    release_blobs, save_uploads, store_upload, upload_to_dict
+)
 
 router = APIRouter()
+MAX_RANGE_FRAMES = 256
 
-@router.post("/medical")
-async def upload_medical_images(files: List[UploadFile] = File(...)):
-    if len(files) > 100:
-        raise HTTPException(status_code=400, detail="Maximum 100 files allowed per batch")
-    
-    uploaded_files = []
+def ensure_images(files: List[UploadFile]) -> None:
     for file in files:
-        if file.size > 50 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail=f"File {file.filename} too large")
-        
-        if not file.content_type.startswith('image/'):
+        if not (file.content_type or "").startswith('image/'):
             raise HTTPException(status_code=400, detail=f"File {file.filename} is not an image")
-        
-        upload_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(file.filename)[1]
-        stored_filename = f"{upload_id}{file_extension}"
-        
+
+async def store_files(files: List[UploadFile], db: AsyncSession) -> List[StoredBlob]:
+    blobs = []
+    for file in files:
+        try:
+            blobs.append(await store_upload(file))
+        except FileTooLarge:
+            await discard_blobs(db, blobs)
+            raise HTTPException(status_code=413, detail=f"File {file.filename} too large")
+        except BaseException:
+            await discard_blobs(db, blobs)
+            raise
+    return blobs
+
+async def save_blob_uploads(db: AsyncSession, uploads: List[Upload], blobs: List[StoredBlob]) -> None:
+    # the blobs stay locked until their rows are committed, so a concurrent delete cannot unlink them
+    try:
+        await save_uploads(db, uploads)
+    except BaseException:
+        await db.rollback()
+        await discard_blobs(db, blobs)
+        raise
+    release_blobs(blobs)
+
+async def ingest_files(files: List[UploadFile], category: str, db: AsyncSession) -> Tuple[List[Dict[str, Any]], str]:
+    ensure_images(files)
+    uploads = []
+    uploaded_files = []
+    blobs = await store_files(files, db)
+    for file, blob in zip(files, blobs):
+        upload = Upload(
+            id=uuid.uuid4(),
+            category=category,
+            original_filename=file.filename,
+            stored_filename=blob.sha256,
+            file_path=blob.path,
+            file_size=blob.size,
+            processing_status="pending"
+        )
+        uploads.append(upload)
         uploaded_files.append({
-            "upload_id": upload_id,
-            "original_filename": file.filename,
-            "stored_filename": stored_filename,
-            "category": "medical",
-            "file_size": file.size,
-            "processing_status": "completed",
-            "analysis_results": {
-                "image_type": "medical",
-                "format": file.content_type,
-                "anonymized": True
-            }
+            "upload_id": str(upload.id),
+            "original_filename": upload.original_filename,
+            "stored_filename": upload.stored_filename,
+            "category": category,
+            "file_size": upload.file_size,
+            "sha256": blob.sha256,
+            "deduplicated": blob.deduplicated,
+            "processing_status": upload.processing_status,
+            "analysis_results": upload.analysis_results
         })
+
+    await save_blob_uploads(db, uploads, blobs)
+    job = get_job_manager().submit(
+        category, [(upload.id, upload.file_path, upload.stored_filename) for upload in uploads]
+    )
+    for uploaded_file in uploaded_files:
+        uploaded_file["job_id"] = job.id
+    return uploaded_files, job.id
+
+@router.post("/medical")
+async def upload_medical_images(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    if len(files) > 100:
+        raise HTTPException(status_code=400, detail="Maximum 100 files allowed per batch")
+    
+    uploaded_files, job_id = await ingest_files(files, "medical", db)
     
     return {
         "message": f"Successfully uploaded {len(uploaded_files)} medical images",
+        "job_id": job_id,
         "uploads": uploaded_files
     }
 
 @router.post("/medical/batch")
-async def upload_medical_batch(files: List[UploadFile] = File(...)):
-    return await upload_medical_images(files)
+async def upload_medical_batch(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    return await upload_medical_images(files, db)
 
 @router.post("/xray")
-async def upload_xray_images(files: List[UploadFile] = File(...)):
-    uploaded_files = []
-    for file in files:
-        if file.size > 50 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail=f"File {file.filename} too large")
-        
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail=f"File {file.filename} is not an image")
-        
-        upload_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(file.filename)[1]
-        stored_filename = f"{upload_id}{file_extension}"
-        
-        uploaded_files.append({
-            "upload_id": upload_id,
-            "original_filename": file.filename,
-            "stored_filename": stored_filename,
-            "category": "xray",
-            "file_size": file.size,
-            "processing_status": "completed",
-            "analysis_results": {
-                "image_type": "chest_xray",
-                "orientation": "corrected",
-                "pneumonia_detection": {
-                    "confidence": 0.85,
-                    "prediction": "normal",
-                    "model_version": "v1.0"
-                }
-            }
-        })
+async def upload_xray_images(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    uploaded_files, job_id = await ingest_files(files, "xray", db)
     
     return {
         "message": f"Successfully uploaded {len(uploaded_files)} X-ray images",
+        "job_id": job_id,
         "uploads": uploaded_files
     }
 
 @router.post("/xray/analyze")
-async def analyze_xray(files: List[UploadFile] = File(...)):
+async def analyze_xray(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    ensure_images(files)
+    engine = get_inference_engine()
+    blobs = await store_files(files, db)
+
+    # analyze concurrently so the engine can fold the whole request into one micro-batch
+    try:
+        analyses = await asyncio.gather(*(engine.analyze(blob.path, blob.sha256) for blob in blobs))
+    except OSError:
+        await discard_blobs(db, blobs)
+        raise HTTPException(status_code=400, detail="One or more files could not be decoded as images")
+    except BaseException:
+        await discard_blobs(db, blobs)
+        raise
+
+    uploads = []
     results = []
-    for file in files:
-        upload_id = str(uuid.uuid4())
+    for file, blob, analysis in zip(files, blobs, analyses):
+        upload = Upload(
+            id=uuid.uuid4(),
+            category="xray",
+            original_filename=file.filename,
+            stored_filename=blob.sha256,
+            file_path=blob.path,
+            file_size=blob.size,
+            processing_status="completed",
+            analysis_results={"image_type": "chest_xray", "pneumonia_detection": analysis}
+        )
+        uploads.append(upload)
         results.append({
-            "upload_id": upload_id,
+            "upload_id": str(upload.id),
             "filename": file.filename,
-            "analysis": {
-                "pneumonia_probability": 0.15,
-                "normal_probability": 0.85,
-                "confidence_score": 0.92,
-                "model_prediction": "Normal",
-                "processing_time_ms": 1250
-            }
+            "analysis": analysis
         })
+    await save_blob_uploads(db, uploads, blobs)
     
     return {
         "message": "X-ray analysis completed",
@@ -107,62 +157,103 @@ async def analyze_xray(files: List[UploadFile] = File(...)):
     }
 
 @router.post("/traffic")
-async def upload_traffic_images(files: List[UploadFile] = File(...)):
-    uploaded_files = []
-    for file in files:
-        if file.size > 50 * 1024 * 1024:
-            raise HTTPException(status_code=413, detail=f"File {file.filename} too large")
-        
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail=f"File {file.filename} is not an image")
-        
-        upload_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(file.filename)[1]
-        stored_filename = f"{upload_id}{file_extension}"
-        
-        uploaded_files.append({
-            "upload_id": upload_id,
-            "original_filename": file.filename,
-            "stored_filename": stored_filename,
-            "category": "traffic",
-            "file_size": file.size,
-            "processing_status": "completed",
-            "analysis_results": {
-                "image_type": "traffic_scene",
-                "detected_objects": [
-                    {"type": "vehicle", "count": 3, "confidence": 0.92},
-                    {"type": "traffic_sign", "count": 1, "confidence": 0.88},
-                    {"type": "pedestrian", "count": 0, "confidence": 0.0}
-                ],
-                "gps_coordinates": None
-            }
-        })
+async def upload_traffic_images(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_async_db)):
+    uploaded_files, job_id = await ingest_files(files, "traffic", db)
     
     return {
         "message": f"Successfully uploaded {len(uploaded_files)} traffic images",
+        "job_id": job_id,
         "uploads": uploaded_files
     }
 
+def parse_timestamps(timestamps: Optional[str], count: int, start: float, frame_interval: float) -> List[float]:
+    if not timestamps:
+        return [start + i * frame_interval for i in range(count)]
+    try:
+        values = [float(value) for value in timestamps.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="timestamps must be comma-separated numbers")
+    if len(values) != count:
+        raise HTTPException(status_code=400, detail=f"Expected {count} timestamps, got {len(values)}")
+    return values
+
+async def append_sequence_frames(
+    sequence_id: str,
+    files: List[UploadFile],
+    timestamps: Optional[str],
+    frame_interval: float
+) -> List[Dict[str, Any]]:
+    ensure_images(files)
+    async with append_lock(sequence_id):
+        writer = await run_in_threadpool(FrameContainerWriter, container_path(sequence_id))
+        first_frame = len(writer.records)
+        start = writer.records[-1][2] + frame_interval if writer.records else 0.0
+        frames = []
+        try:
+            frame_timestamps = parse_timestamps(timestamps, len(files), start, frame_interval)
+            for i, (file, timestamp) in enumerate(zip(files, frame_timestamps)):
+                offset, length = await writer.write_upload(file, timestamp, settings.MAX_FILE_SIZE)
+                frames.append({
+                    "upload_id": sequence_id,
+                    "sequence_id": sequence_id,
+                    "frame_number": first_frame + i,
+                    "original_filename": file.filename,
+                    "stored_filename": os.path.basename(writer.path),
+                    "category": "traffic_sequence",
+                    "file_size": length,
+                    "offset": offset,
+                    "timestamp": timestamp,
+                    "processing_status": "completed"
+                })
+            await run_in_threadpool(writer.close)
+        except FileTooLarge as exc:
+            await run_in_threadpool(writer.abort)
+            raise HTTPException(status_code=413, detail=str(exc))
+        except BaseException:
+            await run_in_threadpool(writer.abort)
+            raise
+    return frames
+
+async def record_sequence(db: AsyncSession, sequence_id: str, frame_count: int, size: int) -> None:
+    upload = await db.get(Upload, uuid.UUID(sequence_id))
+    if upload is None:
+        upload = Upload(
+            id=uuid.UUID(sequence_id),
+            category="traffic_sequence",
+            stored_filename=f"{sequence_id}.frames",
+            file_path=container_path(sequence_id),
+            processing_status="completed"
+        )
+        db.add(upload)
+    upload.file_size = size
+    upload.analysis_results = {"frame_count": frame_count}
+    await db.commit()
+
+def get_sequence_container(sequence_id: str):
+    if parse_upload_id(sequence_id) is None:
+        raise HTTPException(status_code=404, detail=f"Sequence {sequence_id} not found")
+    try:
+        container = frame_containers.get(sequence_id)
+    except ContainerError:
+        # only seen while a first write or an append is still missing its trailer
+        raise HTTPException(
+            status_code=503, detail=f"Sequence {sequence_id} is being written", headers={"Retry-After": "1"}
+        )
+    if container is None:
+        raise HTTPException(status_code=404, detail=f"Sequence {sequence_id} not found")
+    return container
+
 @router.post("/traffic/sequence")
-async def upload_traffic_sequence(files: List[UploadFile] = File(...)):
+async def upload_traffic_sequence(
+    files: List[UploadFile] = File(...),
+    timestamps: Optional[str] = Form(None),
+    frame_interval: float = Form(0.1),
+    db: AsyncSession = Depends(get_async_db)
+):
     sequence_id = str(uuid.uuid4())
-    uploaded_files = []
-    
-    for i, file in enumerate(files):
-        upload_id = str(uuid.uuid4())
-        file_extension = os.path.splitext(file.filename)[1]
-        stored_filename = f"{sequence_id}_frame_{i:06d}{file_extension}"
-        
-        uploaded_files.append({
-            "upload_id": upload_id,
-            "sequence_id": sequence_id,
-            "frame_number": i,
-            "original_filename": file.filename,
-            "stored_filename": stored_filename,
-            "category": "traffic_sequence",
-            "file_size": file.size,
-            "processing_status": "completed"
-        })
+    uploaded_files = await append_sequence_frames(sequence_id, files, timestamps, frame_interval)
+    container = get_sequence_container(sequence_id)
+    await record_sequence(db, sequence_id, container.frame_count, container.size)
     
     return {
         "message": f"Successfully uploaded traffic sequence with {len(uploaded_files)} frames",
@@ -170,25 +261,96 @@ async def upload_traffic_sequence(files: List[UploadFile] = File(...)):
         "uploads": uploaded_files
     }
 
-@router.get("/{category}/{upload_id}")
-async def get_upload(category: str, upload_id: str):
+@router.post("/traffic/sequence/{sequence_id}")
+async def append_traffic_sequence(
+    sequence_id: str,
+    files: List[UploadFile] = File(...),
+    timestamps: Optional[str] = Form(None),
+    frame_interval: float = Form(0.1),
+    db: AsyncSession = Depends(get_async_db)
+):
+    get_sequence_container(sequence_id)
+    uploaded_files = await append_sequence_frames(sequence_id, files, timestamps, frame_interval)
+    container = get_sequence_container(sequence_id)
+    await record_sequence(db, sequence_id, container.frame_count, container.size)
+    
     return {
-        "upload_id": upload_id,
-        "category": category,
-        "original_filename": f"sample_{upload_id}.jpg",
-        "stored_filename": f"{upload_id}.jpg",
-        "file_size": 1024000,
-        "processing_status": "completed",
-        "created_at": "2024-01-01T00:00:00Z",
-        "analysis_results": {
-            "processed": True,
-            "format": "JPEG",
-            "dimensions": {"width": 1024, "height": 1024}
-        }
+        "message": f"Appended {len(uploaded_files)} frames to traffic sequence",
+        "sequence_id": sequence_id,
+        "frame_count": container.frame_count,
+        "uploads": uploaded_files
+    }
+
+@router.get("/traffic/sequence/{sequence_id}")
+async def get_traffic_sequence(sequence_id: str):
+    container = get_sequence_container(sequence_id)
+    timestamps = container.index["timestamp"]
+    return {
+        "sequence_id": sequence_id,
+        "frame_count": container.frame_count,
+        "container_size": container.size,
+        "start_timestamp": float(timestamps[0]) if len(timestamps) else None,
+        "end_timestamp": float(timestamps[-1]) if len(timestamps) else None,
+        "frame_url": f"/api/v1/images/traffic-sequence/{sequence_id}/{{frame_number}}"
     }
 
+@router.get("/traffic/sequence/{sequence_id}/frames")
+async def get_traffic_sequence_frames(
+    sequence_id: str,
+    start: int = Query(0, ge=0),
+    stop: Optional[int] = Query(None, ge=1)
+):
+    container = get_sequence_container(sequence_id)
+    stop = container.frame_count if stop is None else min(stop, container.frame_count)
+    if start >= stop:
+        raise HTTPException(status_code=416, detail=f"Frame range {start}:{stop} is empty")
+    stop = min(stop, start + MAX_RANGE_FRAMES)
+    records = container.index[start:stop]
+    payload = await run_in_threadpool(container.read_range, start, stop)
+    return Response(
+        content=payload,
+        media_type="application/octet-stream",
+        headers={
+            "X-Frame-Start": str(start),
+            "X-Frame-Count": str(stop - start),
+            "X-Frame-Total": str(container.frame_count),
+            "X-Frame-Lengths": ",".join(str(length) for length in records["length"].tolist()),
+            "X-Frame-Timestamps": ",".join(repr(t) for t in records["timestamp"].tolist())
+        }
+    )
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job.snapshot()
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    manager = get_job_manager()
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return StreamingResponse(
+        manager.events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{category}/{upload_id}")
+async def get_upload(category: str, upload_id: str, db: AsyncSession = Depends(get_async_db)):
+    upload = await find_upload(db, category, upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    return upload_to_dict(upload)
+
 @router.delete("/{category}/{upload_id}")
-async def delete_upload(category: str, upload_id: str):
+async def delete_upload(category: str, upload_id: str, db: AsyncSession = Depends(get_async_db)):
+    upload = await find_upload(db, category, upload_id)
+    if upload is None:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    await delete_upload_record(db, upload)
     return {
         "message": f"Upload {upload_id} deleted successfully",
         "upload_id": upload_id,
@@ -196,17 +358,16 @@ async def delete_upload(category: str, upload_id: str):
     }
 
 @router.get("/xray/{upload_id}/analysis")
-async def get_xray_analysis(upload_id: str):
+async def get_xray_analysis(upload_id: str, db: AsyncSession = Depends(get_async_db)):
+    upload = await find_upload(db, "xray", upload_id)
+    if upload is None or not upload.file_path:
+        raise HTTPException(status_code=404, detail=f"Upload {upload_id} not found")
+    analysis = await get_inference_engine().analyze(upload.file_path, upload.stored_filename)
     return {
         "upload_id": upload_id,
         "analysis": {
-            "pneumonia_probability": 0.15,
-            "normal_probability": 0.85,
-            "confidence_score": 0.92,
-            "model_prediction": "Normal",
-            "processing_time_ms": 1250,
-            "model_version": "v1.0",
-            "analysis_date": "2024-01-01T00:00:00Z"
+            **analysis,
+            "analysis_date": upload.created_at.isoformat() if upload.created_at else None
         }
     }
 
@@ -1,7 +1,17 @@
+import asyncio
+import logging
 from fastapi import FastAPI
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import SQLAlchemyError
 from app.core.config import settings
-from app.api.api_v1.api import api_router
+from app.api.api_v1.api import include_api
+from app.db.base import async_engine, pool_stats
+from app.services.metrics import CONTENT_TYPE, MetricsMiddleware, instrument_engine, registry
+from app.services.usage import UsageMeteringMiddleware, get_usage_meter
+from app.services.warmup import startup_profile, warm_up
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="ML Dataset Explorer API",
@@ -18,7 +28,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(api_router, prefix=settings.API_V1_STR)
+app.add_middleware(UsageMeteringMiddleware)
+# added last so it is the outermost layer and its latency covers the other middleware too
+app.add_middleware(MetricsMiddleware)
+
+instrument_engine(async_engine.sync_engine)
+# the other services register their gauges when they are first used
+registry.source("db_pool", "Async connection pool", pool_stats)
+
+include_api(app, settings.API_V1_STR, lazy=settings.LAZY_ROUTERS)
 
 @app.get("/")
 async def root():
@@ -27,3 +45,49 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/health/db")
+async def database_pool():
+    return pool_stats()
+
+@app.get("/health/startup")
+async def startup_report():
+    return startup_profile.as_dict()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+@app.on_event("startup")
+async def start_warmup():
+    if settings.WARMUP_ON_STARTUP:
+        app.state.warmup = asyncio.create_task(warm_up(app))
+
+@app.on_event("startup")
+async def recover_jobs():
+    if settings.JOB_RECOVER_ON_STARTUP:
+        from app.services.jobs import get_job_manager
+
+        try:
+            await get_job_manager().recover()
+        except (SQLAlchemyError, OSError):
+            # a database that is not reachable yet must not keep the server from starting
+            logger.exception("Requeuing unfinished uploads failed")
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    warmup = getattr(app.state, "warmup", None)
+    if warmup is not None:
+        warmup.cancel()
+        await asyncio.gather(warmup, return_exceptions=True)
+    # the workers' modules pull in NumPy and the process pools, so they are not imported at startup
+    from app.services.inference import get_inference_engine
+    from app.services.jobs import get_job_manager
+    from app.services.transcoder import get_transcoder
+
+    await get_job_manager().shutdown()
+    await get_inference_engine().batcher.shutdown()
+    get_transcoder().shutdown()
+    # the last batch of usage counts needs the database, so flush before disposing the engine
+    await get_usage_meter().shutdown()
+    await async_engine.dispose()
@@ -1,38 +1,50 @@
-from sqlalchemy import Column, String, Text, DateTime, Integer, BigInteger, JSON
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Text, DateTime, Integer, BigInteger, JSON, Uuid, Index
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 import uuid
+from datetime import datetime, timezone
 from app.db.base import Base
 
 class Dataset(Base):
     __tablename__ = "datasets"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     name = Column(String(255), nullable=False)
     source_type = Column(String(50), nullable=False)
     source_url = Column(Text)
     description = Column(Text)
+    statistics = Column(JSON)
+    # mergeable accumulators plus the set of files already scanned; only loaded when statistics are updated
+    statistics_state = deferred(Column(JSON))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Image(Base):
     __tablename__ = "images"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    dataset_id = Column(UUID(as_uuid=True))
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    dataset_id = Column(Uuid(as_uuid=True))
     filename = Column(String(255), nullable=False)
     file_path = Column(Text)
     file_size = Column(BigInteger)
     mime_type = Column(String(100))
     width = Column(Integer)
     height = Column(Integer)
-    metadata = Column(JSON)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    image_metadata = Column("metadata", JSON)
+    # set client side as well, with microseconds, so rows inserted within the same second keep their order
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+
+    __table_args__ = (
+        # keyset reads walk a dataset in (created_at, id) order
+        Index("ix_images_dataset_created", "dataset_id", "created_at", "id"),
+        # one row per file per dataset, so catalog loads can be rerun
+        Index("ux_images_dataset_path", "dataset_id", "file_path", unique=True),
+    )
 
 class Upload(Base):
     __tablename__ = "uploads"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id = Column(UUID(as_uuid=True))
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(Uuid(as_uuid=True))
     category = Column(String(50), nullable=False)
     original_filename = Column(String(255))
     stored_filename = Column(String(255))
@@ -42,12 +54,22 @@ class Upload(Base):
     analysis_results = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        Index("ix_uploads_file_path", "file_path"),
+        Index("ix_uploads_stored_category", "stored_filename", "category"),
+    )
+
 class APIUsage(Base):
     __tablename__ = "api_usage"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid(as_uuid=True), primary_key=True, default=uuid.uuid4)
     endpoint = Column(String(255))
-    user_id = Column(UUID(as_uuid=True))
+    user_id = Column(Uuid(as_uuid=True))
     request_count = Column(Integer, default=1)
     date = Column(DateTime(timezone=True), server_default=func.current_date())
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # counts are flushed as upserts into one row per endpoint, user and day
+        Index("ux_api_usage_endpoint_user_date", "endpoint", "user_id", "date", unique=True),
+    )
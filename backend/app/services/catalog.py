@@ -0,0 +1,39 @@
+import uuid
+from typing import Dict
+from sqlalchemy.orm import Session
+from app.models.dataset import Dataset
+
+CATALOG_NAMESPACE = uuid.UUID("5b0c8f2e-2d4e-4c55-9d1a-6f1f0c7e3a10")
+
+DATASETS: Dict[str, Dict[str, str]] = {
+    "chest-xray": {
+        "name": "Chest X-ray Pneumonia Detection",
+        "source_type": "kaggle",
+        "source_url": "https://www.kaggle.com/datasets/paultimothymooney/chest-xray-pneumonia",
+        "description": "Medical imaging dataset for pneumonia classification"
+    },
+    "tiny-imagenet": {
+        "name": "Tiny-ImageNet-200",
+        "source_type": "stanford",
+        "source_url": "http://cs231n.stanford.edu/tiny-imagenet-200.zip",
+        "description": "200-class object recognition dataset"
+    },
+    "kitti": {
+        "name": "KITTI Dataset",
+        "source_type": "kitti",
+        "source_url": "http://www.cvlibs.net/datasets/kitti",
+        "description": "Autonomous driving and computer vision"
+    },
+}
+
+def dataset_uuid(slug: str) -> uuid.UUID:
+    # derived from the slug so every database agrees on the id without a lookup table
+    return uuid.uuid5(CATALOG_NAMESPACE, slug)
+
+def get_or_create_dataset(db: Session, slug: str) -> Dataset:
+    dataset = db.get(Dataset, dataset_uuid(slug))
+    if dataset is None:
+        dataset = Dataset(id=dataset_uuid(slug), **DATASETS[slug])
+        db.add(dataset)
+        db.flush()
+    return dataset
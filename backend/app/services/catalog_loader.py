@@ -0,0 +1,157 @@
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List
+from PIL import Image as PILImage
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.base import SessionLocal
+from app.models.dataset import Image
+from app.services.catalog import get_or_create_dataset
+from app.services.chest_xray_index import CATEGORY_NAMES, SPLITS as CHEST_SPLITS, get_chest_xray_index
+from app.services.image_statistics import SOURCES as STATISTICS_SOURCES, update_dataset_statistics
+from app.services.kitti_timeline import SENSORS
+from app.services.tiny_imagenet_archive import get_tiny_imagenet_archive
+from app.services.tiny_imagenet_tensors import SPLITS as TINY_SPLITS, export_rows
+
+INSERT_BATCH = 5000
+MIME_TYPES = {".jpeg": "image/jpeg", ".jpg": "image/jpeg", ".png": "image/png"}
+
+Row = Dict[str, Any]
+
+def chest_xray_rows() -> Iterator[Row]:
+    index = get_chest_xray_index()
+    if index is None:
+        raise FileNotFoundError(f"Chest X-ray dataset not found at {settings.CHEST_XRAY_DIR}")
+    sizes, widths, heights = index.size.tolist(), index.width.tolist(), index.height.tolist()
+    splits, labels = index.split.tolist(), index.label.tolist()
+    for row in range(index.total):
+        path = index.path(row)
+        yield {
+            "filename": os.path.basename(path),
+            "file_path": path,
+            "file_size": sizes[row],
+            "mime_type": MIME_TYPES.get(os.path.splitext(path)[1].lower()),
+            "width": widths[row],
+            "height": heights[row],
+            "metadata": {"category": CATEGORY_NAMES[labels[row]], "split": CHEST_SPLITS[splits[row]]}
+        }
+
+def tiny_imagenet_rows() -> Iterator[Row]:
+    archive = get_tiny_imagenet_archive()
+    if archive is None:
+        raise FileNotFoundError(f"Tiny-ImageNet archive not found at {settings.TINY_IMAGENET_ZIP}")
+    rows, labels, splits, wnids = export_rows(archive)
+    sizes = archive.file_size.tolist()
+    for row, label, split in zip(rows, labels.tolist(), splits.tolist()):
+        key = archive.keys[row]
+        yield {
+            "filename": key.split("/", 1)[1],
+            # members of the zip are addressed as <archive>/<key>
+            "file_path": os.path.join(archive.archive_path, key),
+            "file_size": sizes[row],
+            "mime_type": "image/jpeg",
+            "width": 64,
+            "height": 64,
+            "metadata": {"category": wnids[label] if label >= 0 else None, "split": TINY_SPLITS[split]}
+        }
+
+def kitti_rows() -> Iterator[Row]:
+    if not os.path.isdir(settings.KITTI_DIR):
+        raise FileNotFoundError(f"KITTI directory not found at {settings.KITTI_DIR}")
+    cameras = [sensor for sensor in SENSORS if sensor.startswith("image_")]
+    for sequence in sorted(os.listdir(settings.KITTI_DIR)):
+        for camera in cameras:
+            directory = os.path.join(settings.KITTI_DIR, sequence, camera, "data")
+            if not os.path.isdir(directory):
+                continue
+            for entry in sorted((e for e in os.scandir(directory) if e.is_file()), key=lambda e: e.name):
+                mime_type = MIME_TYPES.get(os.path.splitext(entry.name)[1].lower())
+                if mime_type is None:
+                    continue
+                try:
+                    # opening only parses the header, the pixels are never decoded
+                    with PILImage.open(entry.path) as img:
+                        width, height = img.size
+                except OSError:
+                    continue
+                yield {
+                    "filename": entry.name,
+                    "file_path": entry.path,
+                    "file_size": entry.stat().st_size,
+                    "mime_type": mime_type,
+                    "width": width,
+                    "height": height,
+                    "metadata": {"category": camera, "sequence": sequence, "frame": int(os.path.splitext(entry.name)[0])}
+                }
+
+LOADERS = {
+    "chest-xray": chest_xray_rows,
+    "tiny-imagenet": tiny_imagenet_rows,
+    "kitti": kitti_rows,
+}
+
+def insert_images(db: Session):
+    # rows that already exist for (dataset_id, file_path) are skipped by the unique index,
+    # which makes a rerun after an interruption safe even if it overlaps committed batches;
+    # only the rows actually written come back, so the skipped ones are not counted as inserted
+    dialect = db.get_bind().dialect.name
+    table = Image.__table__
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+        return dialect_insert(table).on_conflict_do_nothing(index_elements=["dataset_id", "file_path"]).returning(table.c.id)
+    return insert(table)
+
+def load_catalog(slug: str, batch_size: int = INSERT_BATCH) -> Dict[str, Any]:
+    with SessionLocal() as db:
+        dataset = get_or_create_dataset(db, slug)
+        db.commit()
+        existing = {
+            path for (path,) in db.query(Image.file_path).filter(Image.dataset_id == dataset.id).yield_per(batch_size)
+        }
+        statement = insert_images(db)
+        inserted = skipped = 0
+        batch: List[Row] = []
+
+        def flush() -> None:
+            nonlocal inserted, skipped
+            # one timestamp per batch keeps created_at increasing across batches for keyset readers
+            created_at = datetime.now(timezone.utc)
+            for row in batch:
+                row["created_at"] = created_at
+            result = db.execute(statement, batch)
+            written = len(result.all()) if result.returns_rows else len(batch)
+            db.commit()
+            inserted += written
+            skipped += len(batch) - written
+            batch.clear()
+
+        for row in LOADERS[slug]():
+            if row["file_path"] in existing:
+                skipped += 1
+                continue
+            row["id"] = uuid.uuid4()
+            row["dataset_id"] = dataset.id
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    if inserted and slug in STATISTICS_SOURCES:
+        # the scan is incremental, so only the images registered by this load are read
+        update_dataset_statistics(slug)
+    return {"dataset": slug, "inserted": inserted, "skipped": skipped}
+
+if __name__ == "__main__":
+    slugs = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or list(LOADERS)
+    batch_size = next((int(arg.split("=", 1)[1]) for arg in sys.argv[1:] if arg.startswith("--batch-size=")), INSERT_BATCH)
+    for slug in slugs:
+        started = time.perf_counter()
+        result = load_catalog(slug, batch_size)
+        print(f"{slug}: inserted {result['inserted']} images, {result['skipped']} already catalogued "
+              f"({time.perf_counter() - started:.1f}s)")
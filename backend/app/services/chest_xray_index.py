@@ -0,0 +1,195 @@
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.index_store import PackedStrings, build_lock, index_stamp, pack_strings, read_index, write_index
+
+SPLITS = ("train", "val", "test")
+LABELS = ("NORMAL", "PNEUMONIA")
+CATEGORY_NAMES = ("Normal", "Pneumonia")
+CATEGORY_COLORS = ("#10b981", "#ef4444")
+IMAGE_EXTENSIONS = (".jpeg", ".jpg", ".png")
+INDEX_VERSION = 1
+
+def scan_chest_xray(root: str) -> Dict[str, np.ndarray]:
+    from PIL import Image
+
+    names, sizes, widths, heights, splits, labels = [], [], [], [], [], []
+    for split_code, split in enumerate(SPLITS):
+        for label_code, label in enumerate(LABELS):
+            directory = os.path.join(root, split, label)
+            if not os.path.isdir(directory):
+                continue
+            entries = sorted(
+                (e for e in os.scandir(directory)
+                 if e.is_file() and e.name.lower().endswith(IMAGE_EXTENSIONS)),
+                key=lambda e: e.name,
+            )
+            for entry in entries:
+                try:
+                    with Image.open(entry.path) as img:
+                        width, height = img.size
+                except OSError:
+                    continue
+                names.append(f"{split}/{label}/{entry.name}")
+                sizes.append(entry.stat().st_size)
+                widths.append(width)
+                heights.append(height)
+                splits.append(split_code)
+                labels.append(label_code)
+
+    name_blob, name_offsets = pack_strings(names)
+    return {
+        "size": np.asarray(sizes, dtype=np.int64),
+        "width": np.asarray(widths, dtype=np.int32),
+        "height": np.asarray(heights, dtype=np.int32),
+        "split": np.asarray(splits, dtype=np.uint8),
+        "label": np.asarray(labels, dtype=np.uint8),
+        "name_blob": name_blob,
+        "name_offsets": name_offsets,
+    }
+
+def build_chest_xray_index(root: str, index_path: str) -> None:
+    columns = scan_chest_xray(root)
+    meta = {
+        "version": INDEX_VERSION,
+        "root": os.path.abspath(root),
+        "count": int(len(columns["size"])),
+        "built_at": time.time(),
+    }
+    write_index(index_path, columns, meta)
+
+class ChestXrayIndex:
+    def __init__(self, columns: Dict[str, np.ndarray], meta: Dict[str, Any]):
+        self.root = meta["root"]
+        self.size = columns["size"]
+        self.width = columns["width"]
+        self.height = columns["height"]
+        self.split = columns["split"]
+        self.label = columns["label"]
+        self.names = PackedStrings(columns["name_blob"], columns["name_offsets"])
+        self.total = len(self.size)
+        # split x label contingency table; every count/statistic derives from it
+        self.counts = np.bincount(
+            self.split.astype(np.intp) * len(LABELS) + self.label,
+            minlength=len(SPLITS) * len(LABELS),
+        ).reshape(len(SPLITS), len(LABELS))
+
+    @classmethod
+    def load(cls, index_path: str) -> "ChestXrayIndex":
+        columns, meta = read_index(index_path)
+        return cls(columns, meta)
+
+    def image_id(self, row: int) -> str:
+        return f"chest_xray_{row + 1}"
+
+    def row_for_id(self, image_id: str) -> Optional[int]:
+        prefix = "chest_xray_"
+        if not image_id.startswith(prefix) or not image_id[len(prefix):].isdigit():
+            return None
+        row = int(image_id[len(prefix):]) - 1
+        return row if 0 <= row < self.total else None
+
+    def path(self, row: int) -> str:
+        return os.path.join(self.root, self.names[row])
+
+    def page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        start = max(offset, 0)
+        stop = min(start + max(limit, 0), self.total)
+        return self.samples(np.arange(start, stop))
+
+    def samples(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        sizes = self.size[rows].tolist()
+        widths = self.width[rows].tolist()
+        heights = self.height[rows].tolist()
+        splits = self.split[rows].tolist()
+        labels = self.label[rows].tolist()
+        samples = []
+        for i, row in enumerate(rows.tolist()):
+            image_id = self.image_id(row)
+            samples.append({
+                "id": image_id,
+                "filename": os.path.basename(self.names[row]),
+                "category": CATEGORY_NAMES[labels[i]],
+                "split": SPLITS[splits[i]],
+                "file_size": sizes[i],
+                "width": widths[i],
+                "height": heights[i],
+                "url": f"/api/v1/images/chest-xray/{image_id}"
+            })
+        return samples
+
+    def categories(self) -> List[Dict[str, Any]]:
+        per_label = self.counts.sum(axis=0)
+        total = max(self.total, 1)
+        return [
+            {
+                "name": CATEGORY_NAMES[i],
+                "count": int(per_label[i]),
+                "percentage": round(float(per_label[i]) * 100.0 / total, 1)
+            }
+            for i in range(len(LABELS))
+        ]
+
+    def statistics(self) -> Dict[str, Any]:
+        per_label = self.counts.sum(axis=0)
+        per_split = self.counts.sum(axis=1)
+        has_rows = self.total > 0
+        return {
+            "total_images": self.total,
+            "normal_cases": int(per_label[0]),
+            "pneumonia_cases": int(per_label[1]),
+            "splits": {
+                split: {
+                    "total": int(per_split[s]),
+                    **{CATEGORY_NAMES[l].lower(): int(self.counts[s, l]) for l in range(len(LABELS))}
+                }
+                for s, split in enumerate(SPLITS)
+            },
+            "total_bytes": int(self.size.sum()),
+            "average_width": float(self.width.mean()) if has_rows else 0.0,
+            "average_height": float(self.height.mean()) if has_rows else 0.0,
+            "min_width": int(self.width.min()) if has_rows else 0,
+            "max_width": int(self.width.max()) if has_rows else 0,
+            "min_height": int(self.height.min()) if has_rows else 0,
+            "max_height": int(self.height.max()) if has_rows else 0,
+            "distribution": [
+                {"name": CATEGORY_NAMES[i], "value": int(per_label[i]), "color": CATEGORY_COLORS[i]}
+                for i in range(len(LABELS))
+            ]
+        }
+
+def chest_xray_index_path() -> str:
+    return os.path.join(settings.INDEX_DIR, "chest_xray")
+
+@lru_cache(maxsize=2)
+def _load_chest_xray_index(index_path: str, stamp: Tuple[int, int]) -> ChestXrayIndex:
+    return ChestXrayIndex.load(index_path)
+
+def get_chest_xray_index() -> Optional[ChestXrayIndex]:
+    # keyed on the CURRENT pointer, so a rebuild published by any process is mapped on the next call
+    index_path = chest_xray_index_path()
+    stamp = index_stamp(index_path)
+    if stamp is None:
+        if not os.path.isdir(settings.CHEST_XRAY_DIR):
+            return None
+        with build_lock(index_path):
+            # another worker may have built it while this one waited for the lock
+            if index_stamp(index_path) is None:
+                build_chest_xray_index(settings.CHEST_XRAY_DIR, index_path)
+        stamp = index_stamp(index_path)
+    return _load_chest_xray_index(index_path, stamp)
+
+async def ensure_chest_xray_index() -> Optional[ChestXrayIndex]:
+    # for request handlers: mapping a published index is cheap, but a first build reads every image and
+    # may wait on another worker's build lock, so that part runs in the threadpool
+    if index_stamp(chest_xray_index_path()) is not None or not os.path.isdir(settings.CHEST_XRAY_DIR):
+        return get_chest_xray_index()
+    return await run_in_threadpool(get_chest_xray_index)
+
+if __name__ == "__main__":
+    build_chest_xray_index(settings.CHEST_XRAY_DIR, chest_xray_index_path())
+    print(f"Indexed {ChestXrayIndex.load(chest_xray_index_path()).total} chest X-ray images")
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, NamedTuple, Optional
+from app.core.config import settings
+
+HASH_CHUNK_SIZE = 1024 * 1024
+DISK_SCAN_INTERVAL = 5.0
+
+class CacheEntry(NamedTuple):
+    content: bytes
+    media_type: str
+    headers: Dict[str, str]
+
+@lru_cache(maxsize=65536)
+def _digest(path: str, size: int, mtime_ns: int) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def file_digest(path: str) -> str:
+    stat = os.stat(path)
+    return _digest(path, stat.st_size, stat.st_mtime_ns)
+
+def derivative_key(source_hash: str, params: Dict[str, Any]) -> str:
+    canonical = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{source_hash}\n{canonical}".encode("utf-8")).hexdigest()
+
+class DerivativeCache:
+    def __init__(self, directory: str, max_bytes: int, hot_max_bytes: int, scan_interval: float = DISK_SCAN_INTERVAL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hot_max_bytes = hot_max_bytes
+        self.scan_interval = scan_interval
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+        self._hot: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._hot_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._counters = {
+            "hot_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "hot_evictions": 0,
+            "disk_evictions": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+        self._evict_disk()
+
+    def _scan(self) -> "OrderedDict[str, int]":
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # evicted by another worker while we were listing
+                    continue
+                entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        # mtime is refreshed on every disk hit, so it doubles as the persisted LRU order
+        return OrderedDict((key, size) for _, key, size in sorted(entries))
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._hot.get(key)
+            if entry is not None:
+                self._hot.move_to_end(key)
+                self._counters["hot_hits"] += 1
+                return entry
+
+        # the directory is shared with other workers, so a key this one never wrote may still be on disk
+        entry = self._read(key)
+        with self._lock:
+            if entry is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._put_hot(key, entry)
+        return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        size = self._write(key, entry)
+        with self._lock:
+            self._counters["stores"] += 1
+            self._disk_bytes += size - self._disk.pop(key, 0)
+            self._disk[key] = size
+            self._put_hot(key, entry)
+            due = self._disk_bytes > self.max_bytes or time.monotonic() - self._scanned_at >= self.scan_interval
+        if due:
+            self._evict_disk()
+
+    def _put_hot(self, key: str, entry: CacheEntry) -> None:
+        size = len(entry.content)
+        if size > self.hot_max_bytes:
+            return
+        previous = self._hot.pop(key, None)
+        if previous is not None:
+            self._hot_bytes -= len(previous.content)
+        self._hot[key] = entry
+        self._hot_bytes += size
+        while self._hot_bytes > self.hot_max_bytes:
+            _, evicted = self._hot.popitem(last=False)
+            self._hot_bytes -= len(evicted.content)
+            self._counters["hot_evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        # every worker writes to the same directory, so the budget is checked against what is on disk
+        # rather than against what this process has stored
+        disk = self._scan()
+        with self._lock:
+            self._disk, self._disk_bytes = disk, sum(disk.values())
+            self._scanned_at = time.monotonic()
+            evicted = []
+            while self._disk_bytes > self.max_bytes and self._disk:
+                key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                self._counters["disk_evictions"] += 1
+                evicted.append(key)
+        for key in evicted:
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _read(self, key: str) -> Optional[CacheEntry]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                content = f.read()
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self._disk_bytes -= self._disk.pop(key, 0)
+            return None
+        return CacheEntry(content, header["media_type"], header["headers"])
+
+    def _write(self, key: str, entry: CacheEntry) -> int:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        header = json.dumps({"media_type": entry.media_type, "headers": entry.headers}).encode("utf-8")
+        fd, tmp = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header + b"\n")
+                f.write(entry.content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return len(header) + 1 + len(entry.content)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._counters["hot_hits"] + self._counters["disk_hits"] + self._counters["misses"]
+            hits = self._counters["hot_hits"] + self._counters["disk_hits"]
+            return {
+                **self._counters,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "hot_entries": len(self._hot),
+                "hot_bytes": self._hot_bytes,
+                "hot_max_bytes": self.hot_max_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.max_bytes,
+            }
+
+@lru_cache(maxsize=None)
+def get_derivative_cache() -> DerivativeCache:
+    return DerivativeCache(settings.CACHE_DIR, settings.CACHE_MAX_BYTES, settings.CACHE_HOT_MAX_BYTES)
@@ -0,0 +1,169 @@
+import asyncio
+import uuid
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.dataset import Image
+from app.services.chest_xray_index import CATEGORY_NAMES, SPLITS, ChestXrayIndex, get_chest_xray_index
+
+Range = Tuple[Optional[float], Optional[float]]
+REFRESH_BATCH = 10000
+
+class UnknownFacet(ValueError):
+    pass
+
+class FacetIndex:
+    # categorical facets are stored as integer codes plus one boolean bitmap per value;
+    # numeric columns are filtered with vectorized range comparisons
+    def __init__(self, facets: Iterable[str], numeric: Iterable[str]):
+        self.size = 0
+        self.vocab: Dict[str, List[str]] = {facet: [] for facet in facets}
+        self._code_of: Dict[str, Dict[str, int]] = {facet: {} for facet in self.vocab}
+        self.codes: Dict[str, np.ndarray] = {facet: np.empty(0, dtype=np.int32) for facet in self.vocab}
+        self.numeric: Dict[str, np.ndarray] = {name: np.empty(0, dtype=np.float64) for name in numeric}
+        self.bitmaps: Dict[str, List[np.ndarray]] = {facet: [] for facet in self.vocab}
+
+    def append(self, facet_values: Dict[str, List[Optional[str]]], numeric_values: Dict[str, List[Optional[float]]]) -> None:
+        count = len(next(iter(numeric_values.values()))) if numeric_values else len(next(iter(facet_values.values())))
+        if count == 0:
+            return
+        for facet, values in facet_values.items():
+            code_of, vocab = self._code_of[facet], self.vocab[facet]
+            codes = np.empty(count, dtype=np.int32)
+            for i, value in enumerate(values):
+                value = "unknown" if value is None else str(value)
+                code = code_of.get(value)
+                if code is None:
+                    code = code_of[value] = len(vocab)
+                    vocab.append(value)
+                codes[i] = code
+            self.codes[facet] = np.concatenate([self.codes[facet], codes])
+            # extend existing bitmaps with the new rows and start bitmaps for new values
+            bitmaps = [np.concatenate([bitmap, codes == code]) for code, bitmap in enumerate(self.bitmaps[facet])]
+            bitmaps.extend(self.codes[facet] == code for code in range(len(bitmaps), len(vocab)))
+            self.bitmaps[facet] = bitmaps
+        for name, values in numeric_values.items():
+            column = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            self.numeric[name] = np.concatenate([self.numeric[name], column])
+        self.size += count
+
+    def _selection(self, facet: str, values: List[str]) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            code = self._code_of[facet].get(value)
+            if code is not None:
+                mask |= self.bitmaps[facet][code]
+        return mask
+
+    def query(
+        self, selections: Dict[str, List[str]], ranges: Dict[str, Range]
+    ) -> Tuple[np.ndarray, Dict[str, Dict[str, int]]]:
+        # a filter on a column this index does not carry would otherwise match everything
+        unknown = sorted((set(selections) - set(self.codes)) | (set(ranges) - set(self.numeric)))
+        if unknown:
+            raise UnknownFacet(f"Cannot filter on {', '.join(unknown)}")
+        base = np.ones(self.size, dtype=bool)
+        for name, (low, high) in ranges.items():
+            if low is not None:
+                base &= self.numeric[name] >= low
+            if high is not None:
+                base &= self.numeric[name] <= high
+        selected = {facet: self._selection(facet, values) for facet, values in selections.items()
+                    if values}
+
+        mask = base.copy()
+        for facet_mask in selected.values():
+            mask &= facet_mask
+        facets = {}
+        for facet, codes in self.codes.items():
+            # each facet is counted with every filter except its own, so the UI can show alternatives
+            facet_base = base.copy()
+            for other, facet_mask in selected.items():
+                if other != facet:
+                    facet_base &= facet_mask
+            counts = np.bincount(codes[facet_base], minlength=len(self.vocab[facet]))
+            facets[facet] = {value: int(n) for value, n in zip(self.vocab[facet], counts.tolist())}
+        return np.flatnonzero(mask), facets
+
+def build_chest_xray_facets(index: ChestXrayIndex) -> FacetIndex:
+    facets = FacetIndex(("category", "split"), ("width", "height", "file_size"))
+    facets.append(
+        {
+            "category": [CATEGORY_NAMES[label] for label in index.label.tolist()],
+            "split": [SPLITS[split] for split in index.split.tolist()]
+        },
+        {"width": index.width.tolist(), "height": index.height.tolist(), "file_size": index.size.tolist()}
+    )
+    return facets
+
+@lru_cache(maxsize=1)
+def _chest_xray_facets(index: ChestXrayIndex) -> FacetIndex:
+    return build_chest_xray_facets(index)
+
+def get_chest_xray_facets() -> Optional[FacetIndex]:
+    # rebuilt whenever a new index version is mapped
+    index = get_chest_xray_index()
+    return _chest_xray_facets(index) if index is not None else None
+
+class ImageTableFacets:
+    # rows are pulled in (created_at, id) order, so each refresh only reads rows added since the last one;
+    # edits and deletes are not seen by the watermark, so whatever makes them must call invalidate_image_table_facets
+    def __init__(self, dataset_id: uuid.UUID):
+        self.dataset_id = dataset_id
+        self.index = FacetIndex(("mime_type", "category", "split"), ("width", "height", "file_size"))
+        self.ids: List[uuid.UUID] = []
+        self._watermark: Optional[Tuple[Any, uuid.UUID]] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, db: AsyncSession) -> int:
+        async with self._lock:
+            added = 0
+            while True:
+                # the facet keys are extracted by the database instead of decoding every metadata document
+                query = select(
+                    Image.id, Image.mime_type, Image.width, Image.height, Image.file_size,
+                    Image.image_metadata["category"].as_string().label("category"),
+                    Image.image_metadata["split"].as_string().label("split"),
+                    Image.created_at
+                ).where(Image.dataset_id == self.dataset_id)
+                if self._watermark is not None:
+                    created_at, last_id = self._watermark
+                    query = query.where(or_(
+                        Image.created_at > created_at,
+                        and_(Image.created_at == created_at, Image.id > last_id)
+                    ))
+                rows = (await db.execute(query.order_by(Image.created_at, Image.id).limit(REFRESH_BATCH))).all()
+                if not rows:
+                    return added
+                await run_in_threadpool(
+                    self.index.append,
+                    {
+                        "mime_type": [row.mime_type for row in rows],
+                        "category": [row.category for row in rows],
+                        "split": [row.split for row in rows]
+                    },
+                    {
+                        "width": [row.width for row in rows],
+                        "height": [row.height for row in rows],
+                        "file_size": [row.file_size for row in rows]
+                    }
+                )
+                self.ids.extend(row.id for row in rows)
+                self._watermark = (rows[-1].created_at, rows[-1].id)
+                added += len(rows)
+
+_table_facets: Dict[uuid.UUID, ImageTableFacets] = {}
+
+def invalidate_image_table_facets(dataset_id: uuid.UUID) -> None:
+    # the next request rebuilds the index from the table
+    _table_facets.pop(dataset_id, None)
+
+async def get_image_table_facets(db: AsyncSession, dataset_id: uuid.UUID) -> ImageTableFacets:
+    facets = _table_facets.get(dataset_id)
+    if facets is None:
+        facets = _table_facets.setdefault(dataset_id, ImageTableFacets(dataset_id))
+    await facets.refresh(db)
+    return facets
@@ -0,0 +1,170 @@
+import asyncio
+import fcntl
+import os
+import struct
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+import numpy as np
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.upload_store import CHUNK_SIZE, FileTooLarge
+
+# layout: header | frame bytes ... | index (FRAME_RECORD x N) | trailer
+# appends write new frames, index and trailer after the old trailer, so bytes are never rewritten
+HEADER = struct.Struct("<8sII")
+HEADER_MAGIC = b"MLFRAMES"
+TRAILER = struct.Struct("<QQ8s")
+TRAILER_MAGIC = b"MLFIDX01"
+FORMAT_VERSION = 1
+FRAME_RECORD = np.dtype([("offset", "<u8"), ("length", "<u4"), ("timestamp", "<f8")])
+MAX_OPEN_CONTAINERS = 64
+LOCK_POLL_INTERVAL = 0.05
+
+class ContainerError(Exception):
+    pass
+
+def container_path(sequence_id: str) -> str:
+    return os.path.join(settings.UPLOAD_DIR, "sequences", f"{sequence_id}.frames")
+
+@asynccontextmanager
+async def append_lock(sequence_id: str) -> AsyncIterator[None]:
+    # flock on a sibling lock file serializes appends across worker processes and across coroutines of
+    # this one (each holder opens its own file description); polling keeps the wait off the threadpool
+    path = container_path(sequence_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.lock"), "w") as lock:
+        while True:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(LOCK_POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def read_container_index(f) -> Tuple[np.ndarray, int]:
+    end = os.fstat(f.fileno()).st_size
+    if end < HEADER.size + TRAILER.size:
+        raise ContainerError("Frame container is truncated")
+    index_offset, count, magic = TRAILER.unpack(os.pread(f.fileno(), TRAILER.size, end - TRAILER.size))
+    if magic != TRAILER_MAGIC:
+        raise ContainerError("Frame container has no valid index")
+    raw = os.pread(f.fileno(), count * FRAME_RECORD.itemsize, index_offset)
+    return np.frombuffer(raw, dtype=FRAME_RECORD), end
+
+class FrameContainer:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self.index, self.size = read_container_index(self._file)
+        except ContainerError:
+            self._file.close()
+            raise
+        self.version = (os.fstat(self._file.fileno()).st_mtime_ns, self.size)
+
+    @property
+    def frame_count(self) -> int:
+        return len(self.index)
+
+    def close(self) -> None:
+        self._file.close()
+
+    def read_frame(self, frame: int) -> bytes:
+        record = self.index[frame]
+        return os.pread(self._file.fileno(), int(record["length"]), int(record["offset"]))
+
+    def read_range(self, start: int, stop: int) -> bytes:
+        # frames from one write are contiguous; each append leaves the old index between runs
+        records = self.index[start:stop]
+        ends = records["offset"] + records["length"]
+        breaks = np.flatnonzero(records["offset"][1:] != ends[:-1]) + 1
+        runs = zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(records)])))
+        return b"".join(
+            os.pread(self._file.fileno(), int(ends[last - 1] - records["offset"][first]), int(records["offset"][first]))
+            for first, last in runs
+        )
+
+class FrameContainerWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self.records: List[Tuple[int, int, float]] = []
+        self.created = not os.path.exists(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if self.created:
+            self._file = open(path, "w+b")
+            self._file.write(HEADER.pack(HEADER_MAGIC, FORMAT_VERSION, 0))
+            self._initial_end = 0
+        else:
+            self._file = open(path, "r+b")
+            existing, self._initial_end = read_container_index(self._file)
+            self.records = [(int(r["offset"]), int(r["length"]), float(r["timestamp"])) for r in existing]
+            self._file.seek(self._initial_end)
+
+    async def write_upload(self, file: UploadFile, timestamp: float, max_size: int) -> Tuple[int, int]:
+        offset = await run_in_threadpool(self._file.tell)
+        length = 0
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            length += len(chunk)
+            if length > max_size:
+                await run_in_threadpool(self._file.truncate, offset)
+                await run_in_threadpool(self._file.seek, offset)
+                raise FileTooLarge(f"File {file.filename} exceeds {max_size} bytes")
+            await run_in_threadpool(self._file.write, chunk)
+        self.records.append((offset, length, timestamp))
+        return offset, length
+
+    def close(self) -> None:
+        index = np.array(self.records, dtype=FRAME_RECORD)
+        index_offset = self._file.tell()
+        self._file.write(index.tobytes())
+        self._file.write(TRAILER.pack(index_offset, len(index), TRAILER_MAGIC))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def abort(self) -> None:
+        # drop everything written since open so the previous trailer is the last thing in the file again
+        if self.created:
+            self._file.close()
+            os.unlink(self.path)
+        else:
+            self._file.truncate(self._initial_end)
+            self._file.close()
+
+class FrameContainerStore:
+    def __init__(self):
+        self._open: "OrderedDict[str, FrameContainer]" = OrderedDict()
+
+    def get(self, sequence_id: str) -> Optional[FrameContainer]:
+        path = container_path(sequence_id)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        cached = self._open.get(sequence_id)
+        if cached is not None and cached.version == (stat.st_mtime_ns, stat.st_size):
+            self._open.move_to_end(sequence_id)
+            return cached
+        # replaced or evicted readers are not closed here; a read may still be in flight on their fd
+        try:
+            container = FrameContainer(path)
+        except ContainerError:
+            # an append in progress has written past the old trailer but not the new one yet; the cached
+            # reader only covers bytes before that point, which the append never touches
+            if cached is not None:
+                return cached
+            raise
+        self._open[sequence_id] = container
+        while len(self._open) > MAX_OPEN_CONTAINERS:
+            self._open.popitem(last=False)
+        return container
+
+frame_containers = FrameContainerStore()
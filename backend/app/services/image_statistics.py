@@ -0,0 +1,309 @@
+import base64
+import hashlib
+import io
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal, SessionLocal
+from app.models.dataset import Dataset, Upload
+from app.services.catalog import dataset_uuid, get_or_create_dataset
+from app.services.chest_xray_index import get_chest_xray_index
+from app.services.index_store import build_lock
+from app.services.tiny_imagenet_archive import TinyImageNetArchive, get_tiny_imagenet_archive, tiny_imagenet_index_path
+
+logger = logging.getLogger(__name__)
+CHANNELS = ("red", "green", "blue")
+# bucket upper edges in pixels; the last bucket is open ended
+SIZE_EDGES = (64, 128, 256, 512, 1024, 2048, 4096)
+CHUNK_IMAGES = 256
+COMMIT_EVERY_CHUNKS = 16
+STATE_VERSION = 2
+# completed uploads of these categories are merged into the statistics of the dataset they extend
+UPLOAD_DATASETS = {"xray": "chest-xray"}
+
+class ImageStats:
+    # per-channel mean/M2 are merged with Chan et al.'s parallel form of Welford's update,
+    # so partial results from any split of the dataset combine exactly
+    def __init__(self):
+        self.images = 0
+        self.pixels = 0
+        self.mean = np.zeros(len(CHANNELS))
+        self.m2 = np.zeros(len(CHANNELS))
+        self.histogram = np.zeros(256, dtype=np.int64)
+        self.width_counts = np.zeros(len(SIZE_EDGES) + 1, dtype=np.int64)
+        self.height_counts = np.zeros(len(SIZE_EDGES) + 1, dtype=np.int64)
+        self.width_sum = 0
+        self.height_sum = 0
+        self.bytes = 0
+        self.modes: Dict[str, int] = {}
+
+    def add_image(self, img: Image.Image, file_size: int) -> None:
+        width, height = img.size
+        gray = np.asarray(img.convert("L"))
+        if img.mode in ("L", "I;16", "I", "1"):
+            # greyscale: every channel carries the same values
+            sums = np.full(len(CHANNELS), gray.sum(dtype=np.int64), dtype=np.float64)
+            squares = np.full(len(CHANNELS), np.einsum("ij,ij->", gray, gray, dtype=np.int64), dtype=np.float64)
+        else:
+            rgb = np.asarray(img.convert("RGB")).reshape(-1, 3)
+            sums = rgb.sum(axis=0, dtype=np.int64).astype(np.float64)
+            squares = np.einsum("ij,ij->j", rgb, rgb, dtype=np.int64).astype(np.float64)
+        n = width * height
+        mean = sums / n
+        part = ImageStats()
+        part.images, part.pixels = 1, n
+        part.mean, part.m2 = mean, squares - sums * mean
+        part.histogram = np.bincount(gray.ravel(), minlength=256).astype(np.int64)
+        part.width_counts[np.searchsorted(SIZE_EDGES, width)] += 1
+        part.height_counts[np.searchsorted(SIZE_EDGES, height)] += 1
+        part.width_sum, part.height_sum, part.bytes = width, height, file_size
+        part.modes = {img.mode: 1}
+        self.merge(part)
+
+    def merge(self, other: "ImageStats") -> None:
+        if other.pixels:
+            total = self.pixels + other.pixels
+            delta = other.mean - self.mean
+            self.mean = self.mean + delta * (other.pixels / total)
+            self.m2 = self.m2 + other.m2 + delta * delta * (self.pixels * other.pixels / total)
+            self.pixels = total
+        self.images += other.images
+        self.histogram += other.histogram
+        self.width_counts += other.width_counts
+        self.height_counts += other.height_counts
+        self.width_sum += other.width_sum
+        self.height_sum += other.height_sum
+        self.bytes += other.bytes
+        for mode, count in other.modes.items():
+            self.modes[mode] = self.modes.get(mode, 0) + count
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "images": self.images,
+            "pixels": self.pixels,
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+            "histogram": self.histogram.tolist(),
+            "width_counts": self.width_counts.tolist(),
+            "height_counts": self.height_counts.tolist(),
+            "width_sum": self.width_sum,
+            "height_sum": self.height_sum,
+            "bytes": self.bytes,
+            "modes": self.modes
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageStats":
+        stats = cls()
+        stats.images, stats.pixels = data["images"], data["pixels"]
+        stats.mean, stats.m2 = np.asarray(data["mean"]), np.asarray(data["m2"])
+        stats.histogram = np.asarray(data["histogram"], dtype=np.int64)
+        stats.width_counts = np.asarray(data["width_counts"], dtype=np.int64)
+        stats.height_counts = np.asarray(data["height_counts"], dtype=np.int64)
+        stats.width_sum, stats.height_sum, stats.bytes = data["width_sum"], data["height_sum"], data["bytes"]
+        stats.modes = dict(data["modes"])
+        return stats
+
+    def summary(self) -> Dict[str, Any]:
+        std = np.sqrt(self.m2 / self.pixels) if self.pixels else np.zeros(len(CHANNELS))
+        size_labels = [f"<={edge}" for edge in SIZE_EDGES] + [f">{SIZE_EDGES[-1]}"]
+        return {
+            "images": self.images,
+            "pixels": self.pixels,
+            "total_bytes": self.bytes,
+            # on the 0-1 scale used by torchvision-style Normalize transforms
+            "mean": [round(v / 255.0, 6) for v in self.mean.tolist()],
+            "std": [round(v / 255.0, 6) for v in std.tolist()],
+            "channels": list(CHANNELS),
+            "intensity_histogram": self.histogram.tolist(),
+            "average_width": round(self.width_sum / self.images, 2) if self.images else 0.0,
+            "average_height": round(self.height_sum / self.images, 2) if self.images else 0.0,
+            "width_distribution": dict(zip(size_labels, self.width_counts.tolist())),
+            "height_distribution": dict(zip(size_labels, self.height_counts.tolist())),
+            "color_modes": self.modes,
+            "updated_at": time.time()
+        }
+
+def key_hashes(keys: List[str]) -> np.ndarray:
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(k.encode("utf-8"), digest_size=8).digest(), "little") for k in keys],
+        dtype=np.uint64
+    )
+
+def encode_hashes(hashes: np.ndarray) -> str:
+    return base64.b64encode(np.sort(hashes).astype("<u8").tobytes()).decode("ascii")
+
+def decode_hashes(data: Optional[str]) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype="<u8").astype(np.uint64) if data else np.empty(0, dtype=np.uint64)
+
+# each source lists (key, item) pairs; an item is a file path or an archive row a worker can open itself.
+# keys carry a content stamp, so a file replaced under the same name counts as removed and rescanned
+def upload_key(stored_filename: str) -> str:
+    # blobs are named by their sha256, so the stored filename already identifies the content
+    return f"upload:{stored_filename}"
+
+def upload_items(slug: str) -> List[Tuple[str, Any]]:
+    categories = [category for category, target in UPLOAD_DATASETS.items() if target == slug]
+    if not categories:
+        return []
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(Upload.stored_filename, Upload.file_path)
+            .where(Upload.category.in_(categories), Upload.processing_status == "completed")
+            .distinct()
+        ).all()
+    return [(upload_key(stored_filename), path) for stored_filename, path in rows if path]
+
+def chest_xray_items() -> List[Tuple[str, Any]]:
+    index = get_chest_xray_index()
+    items = []
+    for row in range(index.total if index is not None else 0):
+        path = index.path(row)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        items.append((f"{index.names[row]}:{stat.st_size}:{stat.st_mtime_ns}", path))
+    return items + upload_items("chest-xray")
+
+def tiny_imagenet_items() -> List[Tuple[str, Any]]:
+    archive = get_tiny_imagenet_archive()
+    if archive is None:
+        return []
+    return [
+        (f"{archive.keys[row]}:{int(archive.crc[row])}:{int(archive.file_size[row])}", row)
+        for row in range(len(archive.keys)) if archive.keys[row].upper().endswith(".JPEG")
+    ]
+
+SOURCES = {
+    "chest-xray": chest_xray_items,
+    "tiny-imagenet": tiny_imagenet_items,
+}
+
+_worker_archive: Optional[TinyImageNetArchive] = None
+
+def scan_chunk(items: List[Any]) -> Dict[str, Any]:
+    global _worker_archive
+    stats = ImageStats()
+    for item in items:
+        try:
+            if isinstance(item, str):
+                with Image.open(item) as img:
+                    img.load()
+                    stats.add_image(img, os.path.getsize(item))
+            else:
+                if _worker_archive is None:
+                    _worker_archive = TinyImageNetArchive.load(settings.TINY_IMAGENET_ZIP, tiny_imagenet_index_path())
+                data = _worker_archive.read_row(item)
+                with Image.open(io.BytesIO(data)) as img:
+                    img.load()
+                    stats.add_image(img, len(data))
+        except OSError:
+            continue
+    return stats.to_dict()
+
+def save_statistics(db: Session, dataset: Dataset, stats: ImageStats, processed: np.ndarray) -> None:
+    dataset.statistics = stats.summary()
+    dataset.statistics_state = {"version": STATE_VERSION, "partial": stats.to_dict(), "processed": encode_hashes(processed)}
+    db.commit()
+
+def statistics_lock(slug: str):
+    # a scan and the merges from ingest paths read, extend and write the same accumulators
+    return build_lock(os.path.join(settings.INDEX_DIR, "statistics", slug))
+
+def update_dataset_statistics(slug: str, workers: Optional[int] = None, full: bool = False) -> Dict[str, Any]:
+    items = SOURCES[slug]()
+    hashes = key_hashes([key for key, _ in items])
+    with statistics_lock(slug), SessionLocal() as db:
+        dataset = get_or_create_dataset(db, slug)
+        state = dataset.statistics_state or {}
+        processed = decode_hashes(state.get("processed"))
+        # a file that disappeared cannot be subtracted from the accumulators, so start over
+        if full or state.get("version") != STATE_VERSION or not np.isin(processed, hashes).all():
+            processed = np.empty(0, dtype=np.uint64)
+            stats = ImageStats()
+        else:
+            stats = ImageStats.from_dict(state["partial"])
+        pending = np.flatnonzero(~np.isin(hashes, processed))
+        chunks = [pending[i:i + CHUNK_IMAGES] for i in range(0, len(pending), CHUNK_IMAGES)]
+
+        if chunks:
+            with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+                results = pool.map(scan_chunk, [[items[i][1] for i in chunk] for chunk in chunks])
+                for n, (chunk, partial) in enumerate(zip(chunks, results), 1):
+                    stats.merge(ImageStats.from_dict(partial))
+                    processed = np.concatenate([processed, hashes[chunk]])
+                    # checkpoint so an interrupted scan resumes where it stopped
+                    if n % COMMIT_EVERY_CHUNKS == 0:
+                        save_statistics(db, dataset, stats, processed)
+        if chunks or dataset.statistics is None:
+            save_statistics(db, dataset, stats, processed)
+        invalidate_statistics(slug)
+        return {"dataset": slug, "scanned": int(len(pending)), "images": stats.images}
+
+def merge_images(slug: str, items: List[Tuple[str, Any]]) -> int:
+    # folds a few newly added images into the stored accumulators in process, without listing the source;
+    # the next full update sees their keys as processed
+    with statistics_lock(slug), SessionLocal() as db:
+        dataset = get_or_create_dataset(db, slug)
+        state = dataset.statistics_state or {}
+        if state and state.get("version") != STATE_VERSION:
+            # the stored state has to be rebuilt by a scan first
+            return 0
+        processed = decode_hashes(state.get("processed"))
+        stats = ImageStats.from_dict(state["partial"]) if state else ImageStats()
+        hashes = key_hashes([key for key, _ in items])
+        new = np.flatnonzero(~np.isin(hashes, processed))
+        # the same blob may be listed more than once
+        new = np.sort(new[np.unique(hashes[new], return_index=True)[1]])
+        if not len(new):
+            return 0
+        stats.merge(ImageStats.from_dict(scan_chunk([items[i][1] for i in new])))
+        save_statistics(db, dataset, stats, np.concatenate([processed, hashes[new]]))
+        invalidate_statistics(slug)
+        return int(len(new))
+
+async def load_statistics(db: AsyncSession, slug: str) -> Optional[Dict[str, Any]]:
+    # statistics only enrich the dataset endpoints, so a missing table or database is not an error;
+    # async drivers can surface a refused connection as a plain OSError
+    try:
+        row = (await db.execute(select(Dataset.statistics).where(Dataset.id == dataset_uuid(slug)))).first()
+    except (SQLAlchemyError, OSError):
+        logger.warning("Loading the %s statistics failed", slug, exc_info=True)
+        return None
+    return row[0] if row else None
+
+_cached_statistics: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+
+async def cached_statistics(slug: str) -> Optional[Dict[str, Any]]:
+    # the column only changes when a scan is merged, so the statistics endpoints read it at most once per
+    # STATISTICS_CACHE_SECONDS instead of checking out a connection on every request
+    now = time.monotonic()
+    cached = _cached_statistics.get(slug)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    async with AsyncSessionLocal() as db:
+        statistics = await load_statistics(db, slug)
+    _cached_statistics[slug] = (now + settings.STATISTICS_CACHE_SECONDS, statistics)
+    return statistics
+
+def invalidate_statistics(slug: str) -> None:
+    _cached_statistics.pop(slug, None)
+
+if __name__ == "__main__":
+    slugs = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or list(SOURCES)
+    for slug in slugs:
+        started = time.perf_counter()
+        result = update_dataset_statistics(slug, full="--full" in sys.argv)
+        print(f"{slug}: scanned {result['scanned']} new images, {result['images']} total "
+              f"({time.perf_counter() - started:.1f}s)")
@@ -0,0 +1,152 @@
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+META_FILE = "meta.json"
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+# the version before the current one stays on disk so a worker that read CURRENT just before a swap
+# can still open it; older versions are removed (workers that mapped them keep their mappings)
+KEEP_VERSIONS = 2
+
+def pack_strings(values: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(v) for v in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+class PackedStrings:
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.blob[start:end].tobytes().decode("utf-8")
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        return [self[i] for i in range(start, min(stop, len(self)))]
+
+@contextmanager
+def staged_directory(path: str) -> Iterator[str]:
+    # build into a sibling temp dir and swap it in only once everything was written
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=parent)
+    try:
+        yield tmp
+        old = None
+        if os.path.exists(path):
+            old = tempfile.mkdtemp(prefix=".old-", dir=parent)
+            os.replace(path, os.path.join(old, "index"))
+        os.replace(tmp, path)
+        if old:
+            shutil.rmtree(old, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+def write_meta(directory: str, meta: Dict[str, Any]) -> None:
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f)
+
+@contextmanager
+def build_lock(path: str) -> Iterator[None]:
+    # serializes builds of one index across worker processes; callers re-check after acquiring it
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    with open(os.path.join(parent, f".{os.path.basename(path)}.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+def index_version_path(path: str) -> Optional[str]:
+    # published indexes resolve through CURRENT; a plain directory with a meta file is read as is
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            return os.path.join(path, VERSIONS_DIR, f.read().strip())
+    except FileNotFoundError:
+        return path if os.path.isfile(os.path.join(path, META_FILE)) else None
+
+def index_stamp(path: str) -> Optional[Tuple[int, int]]:
+    # a swap replaces CURRENT with a new file, so (inode, mtime) changes with every published version;
+    # this is one stat, cheap enough to check on every request
+    for name in (CURRENT_FILE, META_FILE):
+        try:
+            stat = os.stat(os.path.join(path, name))
+        except FileNotFoundError:
+            continue
+        return stat.st_ino, stat.st_mtime_ns
+    return None
+
+def prune_versions(path: str, keep: int = KEEP_VERSIONS) -> None:
+    versions_dir = os.path.join(path, VERSIONS_DIR)
+    current = os.path.basename(index_version_path(path) or "")
+    versions = sorted(v for v in os.listdir(versions_dir) if not v.startswith("."))
+    for version in versions[:-keep] if keep > 0 else versions:
+        if version != current:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+@contextmanager
+def staged_version(path: str) -> Iterator[Tuple[str, str]]:
+    # every build is an immutable version directory; readers switch when CURRENT is atomically
+    # replaced, so a rebuild never changes bytes that a running worker has mapped. Builders that
+    # write their files themselves (e.g. through a memmap) fill the yielded directory directly
+    version = f"{time.time_ns():020d}"
+    with staged_directory(os.path.join(path, VERSIONS_DIR, version)) as tmp:
+        yield tmp, version
+    pointer = os.path.join(path, f".{CURRENT_FILE}.{version}")
+    with open(pointer, "w") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer, os.path.join(path, CURRENT_FILE))
+    # files of an index written before versioning sit next to CURRENT and are no longer read
+    for entry in os.listdir(path):
+        if entry == META_FILE or entry.endswith(".npy"):
+            os.unlink(os.path.join(path, entry))
+    prune_versions(path)
+
+def write_index(path: str, columns: Dict[str, np.ndarray], meta: Dict[str, Any]) -> str:
+    with staged_version(path) as (tmp, version):
+        for name, array in columns.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(array))
+        write_meta(tmp, {**meta, "index_version": version})
+    return version
+
+def read_meta(path: str) -> Dict[str, Any]:
+    version_path = index_version_path(path)
+    if version_path is None:
+        raise FileNotFoundError(f"No index at {path}")
+    with open(os.path.join(version_path, META_FILE)) as f:
+        return json.load(f)
+
+def read_index(path: str) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    # columns are mapped read-only, so every worker process shares the same page-cache pages
+    version_path = index_version_path(path)
+    if version_path is None:
+        raise FileNotFoundError(f"No index at {path}")
+    with open(os.path.join(version_path, META_FILE)) as f:
+        meta = json.load(f)
+    columns = {}
+    for entry in os.listdir(version_path):
+        if entry.endswith(".npy"):
+            columns[entry[:-4]] = np.load(os.path.join(version_path, entry), mmap_mode="r")
+    return columns, meta
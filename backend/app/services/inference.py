@@ -0,0 +1,182 @@
+import asyncio
+import io
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple, Union
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.services.metrics import registry, timed
+
+INPUT_SIZE = 64
+CLASS_NAMES = ("Normal", "Pneumonia")
+
+def preprocess_xray(source: Union[bytes, str]) -> np.ndarray:
+    # Pillow is imported on first use so it stays out of the server's import time
+    from PIL import Image
+
+    with timed("image_decode"), Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        img.draft("L", (INPUT_SIZE, INPUT_SIZE))
+        img = img.convert("L")
+    with timed("image_resize"):
+        pixels = np.asarray(img.resize((INPUT_SIZE, INPUT_SIZE), Image.BILINEAR), dtype=np.float32)
+    pixels = pixels.ravel() / 255.0
+    return (pixels - pixels.mean()) / (pixels.std() + 1e-6)
+
+class ReferencePneumoniaModel:
+    version = "reference-numpy-v1"
+
+    def __init__(self, weights_path: Optional[str] = None, hidden: int = 32, seed: int = 0):
+        if weights_path:
+            weights = np.load(weights_path)
+            self.w1, self.b1, self.w2, self.b2 = (weights[k].astype(np.float32) for k in ("w1", "b1", "w2", "b2"))
+            self.version = f"{self.version}+{weights_path.rsplit('/', 1)[-1]}"
+        else:
+            rng = np.random.default_rng(seed)
+            features = INPUT_SIZE * INPUT_SIZE
+            self.w1 = (rng.standard_normal((features, hidden)) * np.sqrt(2.0 / features)).astype(np.float32)
+            self.b1 = np.zeros(hidden, dtype=np.float32)
+            self.w2 = (rng.standard_normal((hidden, len(CLASS_NAMES))) * np.sqrt(2.0 / hidden)).astype(np.float32)
+            self.b2 = np.zeros(len(CLASS_NAMES), dtype=np.float32)
+
+    def forward(self, batch: np.ndarray) -> np.ndarray:
+        hidden = np.maximum(batch @ self.w1 + self.b1, 0.0)
+        logits = hidden @ self.w2 + self.b2
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+MODELS = {
+    "reference": ReferencePneumoniaModel,
+}
+
+class MicroBatcher:
+    def __init__(self, model, max_batch: int, max_wait_ms: float):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.items = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def predict(self, features: np.ndarray) -> np.ndarray:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((features, future))
+        return await future
+
+    async def _collect(self) -> List[Tuple[np.ndarray, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._collect()
+            try:
+                inputs = np.stack([features for features, _ in batch])
+                with timed("inference_batch"):
+                    probabilities = await run_in_threadpool(self.model.forward, inputs)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), row in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(row)
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+class InferenceEngine:
+    def __init__(self, model, max_batch: int, max_wait_ms: float, cache_size: int):
+        self.model = model
+        self.batcher = MicroBatcher(model, max_batch, max_wait_ms)
+        self.cache_size = cache_size
+        self.cache_hits = 0
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def analyze(self, source: Union[bytes, str], content_hash: str) -> Dict[str, Any]:
+        cached = self._cache.get(content_hash)
+        if cached is not None:
+            self._cache.move_to_end(content_hash)
+            self.cache_hits += 1
+            return {**cached, "cached": True}
+        pending = self._inflight.get(content_hash)
+        if pending is not None:
+            return {**await asyncio.shield(pending), "cached": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[content_hash] = future
+        try:
+            started = time.perf_counter()
+            features = await run_in_threadpool(preprocess_xray, source)
+            probabilities = await self.batcher.predict(features)
+            result = self._result(probabilities, started)
+            future.set_result(result)
+        except BaseException as exc:
+            future.set_exception(exc)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[content_hash]
+
+        self._cache[content_hash] = result
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return {**result, "cached": False}
+
+    def _result(self, probabilities: np.ndarray, started: float) -> Dict[str, Any]:
+        normal, pneumonia = (float(p) for p in probabilities)
+        predicted = int(np.argmax(probabilities))
+        return {
+            "pneumonia_probability": round(pneumonia, 4),
+            "normal_probability": round(normal, 4),
+            "confidence_score": round(max(normal, pneumonia), 4),
+            "model_prediction": CLASS_NAMES[predicted],
+            "processing_time_ms": round((time.perf_counter() - started) * 1000, 2),
+            "model_version": self.model.version
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        batches = self.batcher.batches
+        return {
+            "model_version": self.model.version,
+            "batches": batches,
+            "items": self.batcher.items,
+            "average_batch_size": round(self.batcher.items / batches, 2) if batches else 0.0,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits
+        }
+
+@lru_cache(maxsize=None)
+def get_inference_engine() -> InferenceEngine:
+    model = MODELS[settings.XRAY_MODEL](settings.XRAY_MODEL_WEIGHTS or None)
+    engine = InferenceEngine(
+        model, settings.INFERENCE_MAX_BATCH, settings.INFERENCE_MAX_WAIT_MS, settings.INFERENCE_CACHE_SIZE
+    )
+    registry.source("inference", "Pneumonia inference batcher and result cache", engine.stats)
+    return engine
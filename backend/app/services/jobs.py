@@ -0,0 +1,272 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.models.dataset import Upload
+
+logger = logging.getLogger(__name__)
+KEEPALIVE_SECONDS = 15
+MAX_RETAINED_JOBS = 1000
+UNFINISHED_STATUSES = ("pending", "processing")
+
+CATEGORY_ANALYSIS = {
+    "medical": lambda: {"image_type": "medical", "anonymized": True},
+    "xray": lambda: {"image_type": "chest_xray", "orientation": "corrected"},
+    "traffic": lambda: {
+        "image_type": "traffic_scene",
+        "detected_objects": [
+            {"type": "vehicle", "count": 3, "confidence": 0.92},
+            {"type": "traffic_sign", "count": 1, "confidence": 0.88},
+            {"type": "pedestrian", "count": 0, "confidence": 0.0}
+        ],
+        "gps_coordinates": None
+    },
+}
+
+def analyze_image(path: str, category: str) -> Dict[str, Any]:
+    from PIL import Image, ImageStat
+
+    started = time.perf_counter()
+    with Image.open(path) as img:
+        img_format = img.format
+        width, height = img.size
+        mode = img.mode
+        img.draft("L", (min(width, 512), min(height, 512)))
+        stat = ImageStat.Stat(img.convert("L"))
+    results = CATEGORY_ANALYSIS.get(category, dict)()
+    results.update({
+        "processed": True,
+        "format": img_format,
+        "mode": mode,
+        "dimensions": {"width": width, "height": height},
+        "mean_intensity": round(stat.mean[0], 2),
+        "processing_time_ms": round((time.perf_counter() - started) * 1000, 2)
+    })
+    return results
+
+async def find_existing_analysis(stored_filename: str, upload_id: uuid.UUID, category: str) -> Optional[Dict[str, Any]]:
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(Upload.analysis_results).where(
+                Upload.stored_filename == stored_filename,
+                Upload.category == category,
+                Upload.processing_status == "completed",
+                Upload.id != upload_id
+            ).limit(1)
+        )).first()
+        return row[0] if row else None
+
+async def write_upload_status(upload_id: uuid.UUID, status: str, results: Optional[Dict[str, Any]] = None) -> None:
+    async with AsyncSessionLocal() as db:
+        upload = await db.get(Upload, upload_id)
+        if upload is None:
+            return
+        upload.processing_status = status
+        if results is not None:
+            upload.analysis_results = results
+        await db.commit()
+
+async def merge_upload_statistics(category: str, path: str, stored_filename: str) -> None:
+    from app.services.image_statistics import UPLOAD_DATASETS, merge_images, upload_key
+
+    slug = UPLOAD_DATASETS.get(category)
+    if slug is None:
+        return
+    try:
+        await run_in_threadpool(merge_images, slug, [(upload_key(stored_filename), path)])
+    except Exception:
+        # the upload itself was analysed; the next statistics update picks it up from the uploads table
+        logger.exception("Merging upload %s into the %s statistics failed", stored_filename, slug)
+
+class Job:
+    def __init__(self, category: str, uploads: List[Tuple[uuid.UUID, str, str]]):
+        self.id = str(uuid.uuid4())
+        self.category = category
+        self.uploads = uploads
+        self.status = "pending"
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.completed = 0
+        self.failed = 0
+        self.results: Dict[str, str] = {str(upload_id): "pending" for upload_id, _, _ in uploads}
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "category": self.category,
+            "status": self.status,
+            "total": len(self.uploads),
+            "completed": self.completed,
+            "failed": self.failed,
+            "uploads": self.results,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+    def publish(self, event: str, data: Dict[str, Any]) -> None:
+        for queue in self._subscribers:
+            queue.put_nowait((event, data))
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.remove(queue)
+
+class JobManager:
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._recovery_lock = None
+
+    def _start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ProcessPoolExecutor(max_workers=self.concurrency)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    def submit(self, category: str, uploads: List[Tuple[uuid.UUID, str, str]]) -> Job:
+        self._start()
+        job = Job(category, uploads)
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_RETAINED_JOBS:
+            oldest = next(iter(self.jobs.values()))
+            if not oldest.done:
+                break
+            self.jobs.popitem(last=False)
+        for upload in uploads:
+            self._queue.put_nowait((job, upload))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def recover(self) -> List[Job]:
+        # the queue only lives in memory, so uploads a stopped process left pending or processing are queued
+        # again. The first worker of a deployment to take the lock does this and keeps the lock while it runs,
+        # so workers started next to it do not queue uploads a live sibling still holds. Analysis results are
+        # rewritten whole, so an upload that does get analysed twice ends up the same.
+        if self._recovery_lock is None:
+            os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+            lock = open(os.path.join(settings.UPLOAD_DIR, ".jobs.recovery.lock"), "w")
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                return []
+            self._recovery_lock = lock
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Upload.id, Upload.category, Upload.file_path, Upload.stored_filename)
+                .where(
+                    Upload.processing_status.in_(UNFINISHED_STATUSES),
+                    Upload.category.in_(list(CATEGORY_ANALYSIS))
+                )
+                .order_by(Upload.created_at, Upload.id)
+            )).all()
+        by_category: Dict[str, List[Tuple[uuid.UUID, str, str]]] = {}
+        for upload_id, category, path, stored_filename in rows:
+            by_category.setdefault(category, []).append((upload_id, path, stored_filename))
+        jobs = [self.submit(category, uploads) for category, uploads in by_category.items()]
+        if rows:
+            logger.info("Requeued %d unfinished uploads in %d jobs", len(rows), len(jobs))
+        return jobs
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job, (upload_id, path, stored_filename) = await self._queue.get()
+            if job.status == "pending":
+                job.status = "processing"
+            try:
+                await write_upload_status(upload_id, "processing")
+                results = await find_existing_analysis(stored_filename, upload_id, job.category)
+                if results is None:
+                    results = await loop.run_in_executor(self._executor, analyze_image, path, job.category)
+                    if job.category == "xray":
+                        from app.services.inference import get_inference_engine
+
+                        results["pneumonia_detection"] = await get_inference_engine().analyze(path, stored_filename)
+                await write_upload_status(upload_id, "completed", results)
+                await merge_upload_statistics(job.category, path, stored_filename)
+                job.completed += 1
+                job.results[str(upload_id)] = "completed"
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                job.failed += 1
+                job.results[str(upload_id)] = "failed"
+                try:
+                    await write_upload_status(upload_id, "failed", {"error": str(exc)})
+                except Exception:
+                    pass
+            finally:
+                self._queue.task_done()
+
+            if job.completed + job.failed == len(job.uploads):
+                job.status = "failed" if job.failed == len(job.uploads) else "completed"
+                job.finished_at = time.time()
+                job.publish("complete", job.snapshot())
+            else:
+                job.publish("progress", job.snapshot())
+
+    async def events(self, job: Job) -> AsyncIterator[str]:
+        queue = job.subscribe()
+        try:
+            yield format_event("progress", job.snapshot())
+            if job.done:
+                yield format_event("complete", job.snapshot())
+                return
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event(event, data)
+                if event == "complete":
+                    return
+        finally:
+            job.unsubscribe(queue)
+
+    async def shutdown(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._recovery_lock is not None:
+            self._recovery_lock.close()
+            self._recovery_lock = None
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@lru_cache(maxsize=None)
+def get_job_manager() -> JobManager:
+    return JobManager(settings.JOB_CONCURRENCY)
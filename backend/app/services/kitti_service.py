@@ -1,8 +1,65 @@
-from typing import List, Dict, Any
+import os
+from typing import List, Dict, Any, Optional
+import numpy as np
+from app.core.config import settings
+from app.services.kitti_timeline import DEFAULT_REFERENCE, SequenceTimeline, load_sequence_timeline
+from app.services.kitti_trajectory import Trajectory, load_sequence_trajectory
+
+def parse_frame_number(frame_id: str) -> Optional[int]:
+    number = frame_id.rsplit("_", 1)[-1]
+    return int(number) if number.isdigit() else None
 
 class KittiService:
     def __init__(self):
         self.base_url = "http://www.cvlibs.net/datasets/kitti"
+        self.data_dir = settings.KITTI_DIR
+    
+    def sequence_path(self, sequence_id: str) -> Optional[str]:
+        if os.path.basename(sequence_id) != sequence_id or sequence_id.startswith("."):
+            return None
+        path = os.path.join(self.data_dir, sequence_id)
+        return path if os.path.isdir(path) else None
+    
+    def camera_path(self, sequence_id: str, frame_number: int, camera: str = "image_02") -> Optional[str]:
+        sequence_path = self.sequence_path(sequence_id)
+        if sequence_path is None:
+            return None
+        path = os.path.join(sequence_path, camera, "data", f"{frame_number:010d}.png")
+        return path if os.path.isfile(path) else None
+    
+    def velodyne_path(self, sequence_id: str, frame_number: int) -> Optional[str]:
+        sequence_path = self.sequence_path(sequence_id)
+        if sequence_path is None:
+            return None
+        path = os.path.join(sequence_path, "velodyne_points", "data", f"{frame_number:010d}.bin")
+        return path if os.path.isfile(path) else None
+    
+    def timeline(self, sequence_id: str) -> Optional[SequenceTimeline]:
+        sequence_path = self.sequence_path(sequence_id)
+        return load_sequence_timeline(sequence_path) if sequence_path is not None else None
+    
+    def trajectory(self, sequence_id: str) -> Optional[Trajectory]:
+        sequence_path = self.sequence_path(sequence_id)
+        return load_sequence_trajectory(sequence_path) if sequence_path is not None else None
+    
+    def timeline_frames(
+        self, sequence_id: str, timeline: SequenceTimeline, limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        frame_numbers = np.arange(offset, min(offset + limit, len(timeline.stream(DEFAULT_REFERENCE))))
+        timestamps = timeline.timestamps(DEFAULT_REFERENCE, frame_numbers).tolist()
+        aligned = timeline.align(DEFAULT_REFERENCE, frame_numbers)
+        lidar_frames = aligned["velodyne_points"][0].tolist() if "velodyne_points" in aligned else frame_numbers.tolist()
+        frames = []
+        for frame_id, timestamp, lidar_id in zip(frame_numbers.tolist(), timestamps, lidar_frames):
+            frames.append({
+                "id": f"{sequence_id}_frame_{frame_id:06d}",
+                "sequence_id": sequence_id,
+                "frame_number": frame_id,
+                "timestamp": timestamp,
+                "camera_url": f"/api/v1/images/kitti/{sequence_id}/camera_{frame_id:06d}",
+                "lidar_url": f"/api/v1/images/kitti/{sequence_id}/lidar_{lidar_id:06d}"
+            })
+        return frames
     
     async def get_sequences(self) -> List[Dict[str, Any]]:
         sequences = []
@@ -29,6 +86,10 @@ class KittiService:
         }
     
     async def get_sequence_frames(self, sequence_id: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        timeline = self.timeline(sequence_id)
+        if timeline is not None and timeline.stream(DEFAULT_REFERENCE) is not None:
+            return self.timeline_frames(sequence_id, timeline, limit, offset)
+        
         frames = []
         for i in range(limit):
             frame_id = offset + i
@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.index_store import build_lock, index_stamp, read_index, read_meta, write_index
+
+SENSORS = ("image_00", "image_01", "image_02", "image_03", "velodyne_points", "oxts")
+DEFAULT_REFERENCE = "image_02"
+NS_PER_SECOND = 1_000_000_000
+TIMELINE_INDEX_VERSION = 1
+
+TimestampFiles = Tuple[Tuple[str, str, int, int], ...]
+
+def load_timestamps(path: str) -> np.ndarray:
+    # KITTI raw stamps look like "2011-09-26 13:02:25.964389445"; keep full nanosecond precision
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return np.array(lines, dtype="datetime64[ns]").astype(np.int64)
+
+class SensorStream:
+    def __init__(self, stamps: np.ndarray, order: Optional[np.ndarray] = None, sorted_stamps: Optional[np.ndarray] = None):
+        self.stamps = stamps
+        # Velodyne and OXTS stamps are occasionally out of order, so queries run on a sorted copy;
+        # a mapped timeline index brings both precomputed
+        self.order = np.argsort(stamps, kind="stable") if order is None else order
+        self.sorted = stamps[self.order] if sorted_stamps is None else sorted_stamps
+
+    def __len__(self) -> int:
+        return len(self.stamps)
+
+    def nearest(self, times: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        last = len(self.sorted) - 1
+        pos = np.searchsorted(self.sorted, times)
+        left = np.clip(pos - 1, 0, last)
+        right = np.clip(pos, 0, last)
+        pick = np.where(times - self.sorted[left] <= self.sorted[right] - times, left, right)
+        return self.order[pick], self.sorted[pick] - times
+
+    def window(self, t0: Optional[int], t1: Optional[int]) -> np.ndarray:
+        lo = np.searchsorted(self.sorted, t0, side="left") if t0 is not None else 0
+        hi = np.searchsorted(self.sorted, t1, side="right") if t1 is not None else len(self.sorted)
+        return self.order[lo:hi]
+
+class SequenceTimeline:
+    def __init__(self, streams: Dict[str, SensorStream]):
+        self.streams = streams
+        # all relative times are measured from the earliest stamp of any sensor
+        self.origin = int(min(stream.sorted[0] for stream in self.streams.values()))
+
+    @property
+    def sensors(self) -> Tuple[str, ...]:
+        return tuple(self.streams)
+
+    def stream(self, sensor: str) -> Optional[SensorStream]:
+        return self.streams.get(sensor)
+
+    def to_ns(self, seconds: float) -> int:
+        return self.origin + int(round(seconds * NS_PER_SECOND))
+
+    def to_seconds(self, stamps: np.ndarray) -> np.ndarray:
+        return (stamps - self.origin) / NS_PER_SECOND
+
+    def timestamps(self, sensor: str, frames: np.ndarray) -> np.ndarray:
+        return self.to_seconds(self.streams[sensor].stamps[frames])
+
+    def window(self, sensor: str, t0: Optional[float], t1: Optional[float]) -> np.ndarray:
+        return self.streams[sensor].window(
+            self.to_ns(t0) if t0 is not None else None, self.to_ns(t1) if t1 is not None else None
+        )
+
+    def align(
+        self, reference: str, frames: np.ndarray, max_delta_ns: Optional[int] = None
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        # nearest frame of every other sensor as (frame numbers, deltas in ns); -1 when beyond max_delta_ns
+        times = self.streams[reference].stamps[frames]
+        aligned = {}
+        for sensor, stream in self.streams.items():
+            if sensor == reference:
+                continue
+            nearest, delta = stream.nearest(times)
+            if max_delta_ns is not None:
+                nearest = np.where(np.abs(delta) <= max_delta_ns, nearest, -1)
+            aligned[sensor] = (nearest, delta)
+        return aligned
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            sensor: {
+                "frame_count": len(stream),
+                "start": float(self.to_seconds(stream.sorted[0])),
+                "end": float(self.to_seconds(stream.sorted[-1]))
+            }
+            for sensor, stream in self.streams.items()
+        }
+
+def timestamp_files(sequence_path: str) -> TimestampFiles:
+    files = []
+    for sensor in SENSORS:
+        path = os.path.join(sequence_path, sensor, "timestamps.txt")
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        files.append((sensor, path, stat.st_size, stat.st_mtime_ns))
+    return tuple(files)
+
+def timeline_index_path(sequence_path: str) -> str:
+    return os.path.join(settings.INDEX_DIR, "kitti", os.path.basename(os.path.normpath(sequence_path)))
+
+def build_timeline_index(files: TimestampFiles, index_path: str) -> None:
+    columns = {}
+    for sensor, path, _, _ in files:
+        stamps = load_timestamps(path)
+        if not len(stamps):
+            continue
+        order = np.argsort(stamps, kind="stable")
+        columns[f"{sensor}.stamps"] = stamps
+        columns[f"{sensor}.order"] = order
+        columns[f"{sensor}.sorted"] = stamps[order]
+    write_index(index_path, columns, {
+        "version": TIMELINE_INDEX_VERSION,
+        "sources": [list(f) for f in files],
+        "built_at": time.time()
+    })
+
+def timeline_index_is_current(index_path: str, files: TimestampFiles) -> bool:
+    try:
+        meta = read_meta(index_path)
+    except (OSError, ValueError):
+        return False
+    return meta.get("version") == TIMELINE_INDEX_VERSION and meta.get("sources") == [list(f) for f in files]
+
+@lru_cache(maxsize=64)
+def _ensure_timeline_index(files: TimestampFiles, index_path: str) -> None:
+    # checked once per set of stamp file sizes/mtimes; only one worker rebuilds a stale index
+    if timeline_index_is_current(index_path, files):
+        return
+    with build_lock(index_path):
+        if not timeline_index_is_current(index_path, files):
+            build_timeline_index(files, index_path)
+
+@lru_cache(maxsize=64)
+def _load_timeline(index_path: str, stamp: Tuple[int, int]) -> Optional[SequenceTimeline]:
+    columns, _ = read_index(index_path)
+    streams = {
+        sensor: SensorStream(columns[f"{sensor}.stamps"], columns[f"{sensor}.order"], columns[f"{sensor}.sorted"])
+        for sensor in SENSORS if f"{sensor}.stamps" in columns
+    }
+    return SequenceTimeline(streams) if streams else None
+
+@lru_cache(maxsize=64)
+def _build_timeline(files: TimestampFiles) -> Optional[SequenceTimeline]:
+    streams = {sensor: load_timestamps(path) for sensor, path, _, _ in files}
+    streams = {sensor: SensorStream(stamps) for sensor, stamps in streams.items() if len(stamps)}
+    return SequenceTimeline(streams) if streams else None
+
+def load_sequence_timeline(sequence_path: str) -> Optional[SequenceTimeline]:
+    # keyed on size/mtime of every stamp file so edited sequences are picked up without a restart;
+    # the stamps are served from a shared mapped index, or parsed in process if INDEX_DIR is not writable
+    files = timestamp_files(sequence_path)
+    if not files:
+        return None
+    index_path = timeline_index_path(sequence_path)
+    try:
+        _ensure_timeline_index(files, index_path)
+    except OSError:
+        return _build_timeline(files)
+    return _load_timeline(index_path, index_stamp(index_path))
+
+if __name__ == "__main__":
+    sequences = [arg for arg in sys.argv[1:] if not arg.startswith("--")] or sorted(os.listdir(settings.KITTI_DIR))
+    for sequence in sequences:
+        sequence_path = os.path.join(settings.KITTI_DIR, sequence)
+        files = timestamp_files(sequence_path)
+        if not files:
+            continue
+        build_timeline_index(files, timeline_index_path(sequence_path))
+        print(f"Indexed {len(files)} timestamp files of {sequence}")
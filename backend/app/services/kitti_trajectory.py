@@ -0,0 +1,120 @@
+import io
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+EARTH_RADIUS = 6378137.0
+# Douglas-Peucker tolerances in metres; 0 keeps every pose
+TOLERANCES = (0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0)
+# OXTS columns: lat, lon, alt, roll, pitch, yaw, ... (30 values per pose)
+LAT, LON, ALT, YAW = 0, 1, 2, 5
+
+def load_oxts(data_dir: str) -> Tuple[np.ndarray, np.ndarray]:
+    names = sorted(name for name in os.listdir(data_dir) if name.endswith(".txt"))
+    text = []
+    for name in names:
+        with open(os.path.join(data_dir, name)) as f:
+            text.append(f.read().strip())
+    frames = np.array([int(os.path.splitext(name)[0]) for name in names], dtype=np.int64)
+    poses = np.loadtxt(io.StringIO("\n".join(text)), ndmin=2) if text else np.empty((0, 30))
+    return frames, poses
+
+def mercator_metres(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    # same projection as the KITTI devkit: Mercator scaled by the latitude of the first pose
+    scale = np.cos(np.radians(lat[0]))
+    x = scale * EARTH_RADIUS * np.radians(lon)
+    y = scale * EARTH_RADIUS * np.log(np.tan(np.radians(90.0 + lat) / 2.0))
+    xy = np.column_stack((x, y))
+    return xy - xy[0]
+
+def simplification_importance(points: np.ndarray) -> np.ndarray:
+    # one Douglas-Peucker pass that records, for every pose, the largest tolerance that still keeps it;
+    # a level for tolerance t is then just importance > t
+    n = len(points)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[[0, -1]] = np.inf
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        first, last, cap = stack.pop()
+        if last - first < 2:
+            continue
+        a, b = points[first], points[last]
+        inner = points[first + 1:last]
+        direction = b - a
+        length = np.hypot(*direction)
+        if length > 0:
+            distances = np.abs(direction[0] * (inner[:, 1] - a[1]) - direction[1] * (inner[:, 0] - a[0])) / length
+        else:
+            distances = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        i = int(np.argmax(distances))
+        split = first + 1 + i
+        # a child never outlives its parent segment, which keeps the levels nested
+        importance[split] = min(distances[i], cap)
+        stack.append((first, split, importance[split]))
+        stack.append((split, last, importance[split]))
+    return importance
+
+class Trajectory:
+    def __init__(self, frames: np.ndarray, poses: np.ndarray):
+        self.frames = frames
+        self.lat = poses[:, LAT]
+        self.lon = poses[:, LON]
+        self.alt = poses[:, ALT]
+        self.yaw = poses[:, YAW]
+        self.xy = mercator_metres(self.lat, self.lon)
+        importance = simplification_importance(self.xy)
+        self.levels = [np.flatnonzero(importance > tolerance) if tolerance else np.arange(len(frames))
+                       for tolerance in TOLERANCES]
+        self._payloads: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def level_for(self, zoom: Optional[float] = None, max_points: Optional[int] = None) -> int:
+        level = 0
+        if zoom is not None and len(self):
+            # one screen pixel in Web Mercator metres; anything finer is invisible at this zoom
+            metres_per_pixel = 156543.03392 * np.cos(np.radians(self.lat[0])) / 2 ** zoom
+            level = max(i for i, tolerance in enumerate(TOLERANCES) if tolerance <= metres_per_pixel)
+        if max_points is not None:
+            while level < len(TOLERANCES) - 1 and len(self.levels[level]) > max_points:
+                level += 1
+        return level
+
+    def payload(self, level: int) -> Dict[str, Any]:
+        payload = self._payloads.get(level)
+        if payload is None:
+            rows = self.levels[level]
+            payload = {
+                "tolerance_m": TOLERANCES[level],
+                "point_count": len(rows),
+                "frames": self.frames[rows].tolist(),
+                "lat": self.lat[rows].tolist(),
+                "lon": self.lon[rows].tolist(),
+                "alt": self.alt[rows].round(3).tolist(),
+                "yaw": self.yaw[rows].round(5).tolist(),
+                "x": self.xy[rows, 0].round(3).tolist(),
+                "y": self.xy[rows, 1].round(3).tolist()
+            }
+            self._payloads[level] = payload
+        return payload
+
+    def levels_summary(self) -> List[Dict[str, Any]]:
+        return [{"level": i, "tolerance_m": tolerance, "point_count": len(rows)}
+                for i, (tolerance, rows) in enumerate(zip(TOLERANCES, self.levels))]
+
+@lru_cache(maxsize=32)
+def _build_trajectory(data_dir: str, mtime_ns: int) -> Optional[Trajectory]:
+    frames, poses = load_oxts(data_dir)
+    return Trajectory(frames, poses) if len(frames) else None
+
+def load_sequence_trajectory(sequence_path: str) -> Optional[Trajectory]:
+    data_dir = os.path.join(sequence_path, "oxts", "data")
+    try:
+        mtime_ns = os.stat(data_dir).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _build_trajectory(data_dir, mtime_ns)
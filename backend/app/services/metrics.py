@@ -0,0 +1,208 @@
+import math
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4"
+UNMATCHED_ROUTE = "<unmatched>"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = []
+    for name, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{name}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class Histogram:
+    # the bucket array is allocated once; an observation is a bisect plus three in-place adds
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = array("q", [0] * (len(bounds) + 1))
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def render(self, name: str, labels: Labels) -> List[str]:
+        with self._lock:
+            counts, total = self.counts.tolist(), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', format_value(bound)),))} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+class Family:
+    # one child per label combination, created on first use and reused afterwards
+    def __init__(self, name: str, kind: str, help_text: str, label_names: Tuple[str, ...], factory: Callable):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.label_names = label_names
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            labels = tuple(zip(self.label_names, values))
+            if isinstance(child, Histogram):
+                lines.extend(child.render(self.name, labels))
+            else:
+                lines.append(f"{self.name}{format_labels(labels)} {format_value(child.value)}")
+        return lines
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+class Gauge(Counter):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, Family] = {}
+        self._sources: List[Tuple[str, str, Callable[[], Dict[str, Any]]]] = []
+
+    def _family(self, name: str, kind: str, help_text: str, label_names: Tuple[str, ...], factory: Callable) -> Family:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = Family(name, kind, help_text, label_names, factory)
+        return family
+
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Family:
+        return self._family(name, "histogram", help_text, label_names, lambda: Histogram(buckets))
+
+    def counter(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Family:
+        return self._family(name, "counter", help_text, label_names, Counter)
+
+    def gauge(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()) -> Family:
+        return self._family(name, "gauge", help_text, label_names, Gauge)
+
+    def source(self, prefix: str, help_text: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        # components that already keep counters (pool, caches, batchers) are read only when
+        # /metrics is scraped; every numeric entry becomes a <prefix>_<key> gauge
+        self._sources.append((prefix, help_text, stats))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        for prefix, help_text, stats in self._sources:
+            for key, value in stats().items():
+                if isinstance(value, (int, float)):
+                    name = f"{prefix}_{key}"
+                    lines.extend([f"# HELP {name} {help_text}: {key}", f"# TYPE {name} gauge", f"{name} {format_value(value)}"])
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests by method, route template and status code", ("method", "route", "status")
+)
+http_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by method and route template", ("method", "route")
+)
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served").labels()
+hot_path_latency = registry.histogram(
+    "hot_path_duration_seconds", "Time spent in instrumented hot paths", ("operation",)
+)
+
+class HotPathTimer:
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> "HotPathTimer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.started)
+
+def timed(operation: str) -> HotPathTimer:
+    # with timed("image_decode"): ...
+    return HotPathTimer(hot_path_latency.labels(operation))
+
+def instrument_engine(engine) -> None:
+    # times every statement the engine sends to the database, including those issued by async sessions
+    histogram = hot_path_latency.labels("db_query")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        histogram.observe(time.perf_counter() - context._query_started)
+
+class MetricsMiddleware:
+    # plain ASGI; the route label is the matched path template, so path parameters do not
+    # create a series per id
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            route = scope.get("route")
+            path = route.path if route is not None else UNMATCHED_ROUTE
+            method = scope["method"]
+            http_latency.labels(method, path).observe(elapsed)
+            http_requests.labels(method, path, str(status)).inc()
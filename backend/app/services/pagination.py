@@ -0,0 +1,57 @@
+import base64
+import hashlib
+import hmac
+import json
+from typing import Any, Dict, List, NamedTuple, Optional
+import numpy as np
+from app.core.config import settings
+
+CURSOR_VERSION = 1
+SIGNATURE_BYTES = 12
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+class InvalidCursor(ValueError):
+    pass
+
+def _signature(payload: bytes) -> bytes:
+    return hmac.new(settings.SECRET_KEY.encode("utf-8"), payload, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+def encode_cursor(scope: str, after: Any) -> str:
+    # signed so clients treat it as opaque, and bound to the listing it came from
+    payload = json.dumps({"v": CURSOR_VERSION, "s": scope, "a": after}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(_signature(payload) + payload).rstrip(b"=").decode("ascii")
+
+def decode_cursor(token: str, scope: str) -> Any:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    signature, payload = raw[:SIGNATURE_BYTES], raw[SIGNATURE_BYTES:]
+    if not hmac.compare_digest(signature, _signature(payload)):
+        raise InvalidCursor("Malformed cursor")
+    data = json.loads(payload)
+    if data.get("v") != CURSOR_VERSION or data.get("s") != scope:
+        raise InvalidCursor("Cursor belongs to a different listing")
+    return data["a"]
+
+class Window(NamedTuple):
+    start: int
+    stop: int
+    next_cursor: Optional[str]
+
+def keyset_window(
+    keys: np.ndarray, scope: str, cursor: Optional[str], offset: int, limit: Optional[int]
+) -> Window:
+    # keys are ascending and unique; a cursor resumes after the last key served, so the cost of
+    # a page does not depend on how deep it is and rows added before it do not shift it
+    if cursor is not None:
+        start = int(np.searchsorted(keys, decode_cursor(cursor, scope), side="right"))
+    else:
+        start = min(max(offset, 0), len(keys))
+    stop = len(keys) if limit is None else min(start + limit, len(keys))
+    next_cursor = encode_cursor(scope, keys[stop - 1].item()) if start < stop < len(keys) else None
+    return Window(start, stop, next_cursor)
+
+def ndjson_chunk(rows: List[Dict[str, Any]]) -> bytes:
+    # listings are streamed one encoded batch at a time, so memory is bounded by the batch size
+    return "".join(json.dumps(row, separators=(",", ":")) + "\n" for row in rows).encode("utf-8")
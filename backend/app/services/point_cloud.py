@@ -0,0 +1,90 @@
+import os
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+POINT_FIELDS = 4
+ENCODINGS = ("float16", "int16", "float32")
+INT16_MAX = 32767
+
+def load_velodyne_scan(path: str) -> np.ndarray:
+    if os.path.getsize(path) == 0:
+        return np.zeros((0, POINT_FIELDS), dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode="r").reshape(-1, POINT_FIELDS)
+
+def crop_range(points: np.ndarray, max_range: Optional[float] = None, min_range: Optional[float] = None) -> np.ndarray:
+    if max_range is None and min_range is None:
+        return points
+    dist2 = np.einsum("ij,ij->i", points[:, :3], points[:, :3])
+    mask = np.ones(len(points), dtype=bool)
+    if max_range is not None:
+        mask &= dist2 <= max_range * max_range
+    if min_range is not None:
+        mask &= dist2 >= min_range * min_range
+    return points[mask]
+
+def voxel_downsample(points: np.ndarray, voxel_size: float) -> np.ndarray:
+    if len(points) == 0:
+        return points
+    coords = np.floor(points[:, :3] / voxel_size).astype(np.int64)
+    coords -= coords.min(axis=0)
+    dims = coords.max(axis=0) + 1
+    if int(np.prod(dims, dtype=object)) <= np.iinfo(np.int64).max:
+        _, inverse, counts = np.unique(np.ravel_multi_index(coords.T, dims), return_inverse=True, return_counts=True)
+    else:
+        # voxels too small for a linear int64 key over the scan extent; group the coordinate rows directly
+        _, inverse, counts = np.unique(coords, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    # centroid of every occupied voxel, one weighted bincount per field
+    merged = np.empty((len(counts), points.shape[1]), dtype=np.float32)
+    for field in range(points.shape[1]):
+        merged[:, field] = np.bincount(inverse, weights=points[:, field], minlength=len(counts)) / counts
+    return merged
+
+def random_downsample(points: np.ndarray, max_points: int, seed: int = 0) -> np.ndarray:
+    if len(points) <= max_points:
+        return points
+    rng = np.random.default_rng(seed)
+    keep = np.sort(rng.choice(len(points), size=max_points, replace=False))
+    return points[keep]
+
+def encode_points(points: np.ndarray, encoding: str) -> Tuple[bytes, Dict[str, str]]:
+    headers = {
+        "X-Point-Count": str(len(points)),
+        "X-Point-Fields": "x,y,z,reflectance",
+        "X-Point-Encoding": encoding,
+    }
+    if encoding == "float32":
+        payload = np.ascontiguousarray(points, dtype="<f4")
+    elif encoding == "float16":
+        payload = np.ascontiguousarray(points, dtype="<f2")
+    elif encoding == "int16":
+        extent = float(np.abs(points[:, :3]).max()) if len(points) else 0.0
+        scale = extent / INT16_MAX if extent > 0 else 1.0
+        payload = np.empty(points.shape, dtype="<i2")
+        payload[:, :3] = np.rint(points[:, :3] / scale)
+        payload[:, 3] = np.rint(np.clip(points[:, 3], 0.0, 1.0) * INT16_MAX)
+        headers["X-Point-Scale"] = repr(scale)
+        headers["X-Intensity-Scale"] = repr(1.0 / INT16_MAX)
+    else:
+        raise ValueError(f"Unsupported encoding {encoding}")
+    return payload.tobytes(), headers
+
+def prepare_scan(
+    path: str,
+    max_range: Optional[float] = None,
+    min_range: Optional[float] = None,
+    voxel_size: Optional[float] = None,
+    max_points: Optional[int] = None,
+    encoding: str = "float16",
+    seed: int = 0,
+) -> Tuple[bytes, Dict[str, str]]:
+    points = load_velodyne_scan(path)
+    raw_count = len(points)
+    points = crop_range(points, max_range, min_range)
+    if voxel_size:
+        points = voxel_downsample(points, voxel_size)
+    if max_points is not None:
+        points = random_downsample(points, max_points, seed)
+    payload, headers = encode_points(points, encoding)
+    headers["X-Point-Source-Count"] = str(raw_count)
+    return payload, headers
@@ -0,0 +1,54 @@
+import hashlib
+import io
+import math
+from typing import Any, Dict, List, Tuple
+from PIL import Image
+from app.services.tiny_imagenet_archive import TinyImageNetArchive
+from app.services.transcoder import DEFAULT_QUALITY, OUTPUT_FORMATS
+
+SPRITE_TILE = 64
+MAX_SPRITE_IMAGES = 500
+DEFAULT_COLUMNS = 10
+
+def class_rows(archive: TinyImageNetArchive, class_id: str, offset: int, count: int) -> Tuple[List[int], int]:
+    start, stop = archive.prefix_range(f"{class_id}/")
+    first = min(start + offset, stop)
+    return list(range(first, min(first + count, stop))), stop - start
+
+def sprite_digest(archive: TinyImageNetArchive, rows: List[int]) -> str:
+    # changes whenever any packed entry changes, or the selection itself does
+    joined = "\n".join(archive.entry_digest(row) for row in rows)
+    return hashlib.sha256(joined.encode("utf-8")).hexdigest()
+
+def sprite_map(archive: TinyImageNetArchive, rows: List[int], columns: int) -> List[Dict[str, Any]]:
+    entries = []
+    for i, row in enumerate(rows):
+        filename = archive.keys[row].split("/", 1)[1]
+        entries.append({
+            "id": filename.rsplit(".", 1)[0],
+            "filename": filename,
+            "x": (i % columns) * SPRITE_TILE,
+            "y": (i // columns) * SPRITE_TILE,
+            "width": SPRITE_TILE,
+            "height": SPRITE_TILE
+        })
+    return entries
+
+def pack_sprite(
+    archive: TinyImageNetArchive, rows: List[int], columns: int, fmt: str, quality: int = DEFAULT_QUALITY
+) -> Tuple[bytes, str]:
+    columns = max(1, min(columns, len(rows)))
+    sheet = Image.new("RGB", (columns * SPRITE_TILE, math.ceil(len(rows) / columns) * SPRITE_TILE))
+    for i, row in enumerate(rows):
+        with Image.open(io.BytesIO(archive.read_row(row))) as img:
+            # a few Tiny-ImageNet images are greyscale
+            tile = img.convert("RGB")
+        if tile.size != (SPRITE_TILE, SPRITE_TILE):
+            tile = tile.resize((SPRITE_TILE, SPRITE_TILE), Image.LANCZOS)
+        sheet.paste(tile, ((i % columns) * SPRITE_TILE, (i // columns) * SPRITE_TILE))
+
+    pil_format, media_type = OUTPUT_FORMATS[fmt]
+    options = {"quality": quality} if pil_format in ("JPEG", "WEBP") else {}
+    out = io.BytesIO()
+    sheet.save(out, format=pil_format, **options)
+    return out.getvalue(), media_type
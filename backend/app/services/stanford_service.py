@@ -1,14 +1,19 @@
-import requests
-import zipfile
 import io
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from app.core.config import settings
+from app.services.tiny_imagenet_archive import get_tiny_imagenet_archive
 
 class StanfordService:
     def __init__(self):
         self.base_url = "http://cs231n.stanford.edu"
         self.dataset_url = f"{self.base_url}/tiny-imagenet-200.zip"
+        self.archive_path = settings.TINY_IMAGENET_ZIP
     
     async def get_class_list(self) -> List[Dict[str, Any]]:
+        archive = get_tiny_imagenet_archive()
+        if archive is not None:
+            return archive.classes()
+
         classes = []
         class_names = [
             "Egyptian cat", "Persian cat", "tabby cat", "tiger cat", "Siamese cat",
@@ -29,6 +34,21 @@ class StanfordService:
         return classes
     
     async def get_class_samples(self, class_id: str, count: int = 20) -> List[Dict[str, Any]]:
+        archive = get_tiny_imagenet_archive()
+        if archive is not None:
+            filenames, _ = archive.class_samples(class_id, count)
+            return [
+                {
+                    "id": filename.rsplit(".", 1)[0],
+                    "filename": filename,
+                    "class_id": class_id,
+                    "width": 64,
+                    "height": 64,
+                    "url": f"/api/v1/images/tiny-imagenet/{class_id}/{filename.rsplit('.', 1)[0]}"
+                }
+                for filename in filenames
+            ]
+
         samples = []
         for i in range(count):
             samples.append({
@@ -41,6 +61,12 @@ class StanfordService:
             })
         return samples
     
+    async def get_image(self, class_id: str, image_id: str) -> Optional[bytes]:
+        archive = get_tiny_imagenet_archive()
+        if archive is None:
+            return None
+        return archive.read_image(class_id, image_id)
+    
     async def get_dataset_statistics(self) -> Dict[str, Any]:
         return {
             "total_images": 120000,
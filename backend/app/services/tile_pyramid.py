@@ -0,0 +1,137 @@
+import io
+import math
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from app.core.config import settings
+from app.services.transcoder import OUTPUT_FORMATS
+
+TILE_SIZE = 256
+TILE_OVERLAP = 1
+TILE_QUALITY = 90
+
+def write_atomic(path: str, write) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+class TilePyramid:
+    # DeepZoom layout: level max_level is full resolution and every level below halves it, down to 1x1 at level 0
+    def __init__(self, source_path: str, source_hash: str, directory: str, fmt: str):
+        self.source_path = source_path
+        self.directory = os.path.join(directory, source_hash)
+        self.fmt = fmt
+        with Image.open(source_path) as img:
+            self.width, self.height = img.size
+            self.mode = "L" if img.mode in ("L", "I;16", "I", "1") else "RGB"
+        self.max_level = math.ceil(math.log2(max(self.width, self.height, 1)))
+        self._locks: Dict[int, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        scale = 2 ** (self.max_level - level)
+        return math.ceil(self.width / scale), math.ceil(self.height / scale)
+
+    def grid_size(self, level: int) -> Tuple[int, int]:
+        width, height = self.level_size(level)
+        return math.ceil(width / TILE_SIZE), math.ceil(height / TILE_SIZE)
+
+    def has_tile(self, level: int, col: int, row: int) -> bool:
+        if not 0 <= level <= self.max_level:
+            return False
+        cols, rows = self.grid_size(level)
+        return 0 <= col < cols and 0 <= row < rows
+
+    def _lock(self, level: int) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(level, threading.Lock())
+
+    def level_array(self, level: int) -> np.ndarray:
+        with Image.open(self.source_path) as img:
+            image = img.convert(self.mode)
+        # each level is a 2x box reduction of the one above, never a resample of the original
+        for _ in range(self.max_level - level):
+            image = image.reduce(2)
+        return np.asarray(image)
+
+    def tile_path(self, level: int, col: int, row: int) -> str:
+        return os.path.join(self.directory, str(level), f"{col}_{row}.{self.fmt}")
+
+    def _read_tile(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _encode(self, array: np.ndarray, col: int, row: int) -> bytes:
+        height, width = array.shape[:2]
+        x0 = max(col * TILE_SIZE - TILE_OVERLAP, 0)
+        y0 = max(row * TILE_SIZE - TILE_OVERLAP, 0)
+        x1 = min((col + 1) * TILE_SIZE + TILE_OVERLAP, width)
+        y1 = min((row + 1) * TILE_SIZE + TILE_OVERLAP, height)
+        pil_format, _ = OUTPUT_FORMATS[self.fmt]
+        options = {"quality": TILE_QUALITY} if pil_format in ("JPEG", "WEBP") else {}
+        out = io.BytesIO()
+        Image.fromarray(np.ascontiguousarray(array[y0:y1, x0:x1])).save(out, format=pil_format, **options)
+        return out.getvalue()
+
+    def tile(self, level: int, col: int, row: int) -> bytes:
+        path = self.tile_path(level, col, row)
+        content = self._read_tile(path)
+        if content is not None:
+            return content
+
+        with self._lock(level):
+            content = self._read_tile(path)
+            if content is not None:
+                return content
+            # the level only lives in memory while the whole grid is cut from it, so the
+            # encoded tiles are all that is kept on disk
+            array = self.level_array(level)
+            cols, rows = self.grid_size(level)
+            for c in range(cols):
+                for r in range(rows):
+                    if (c, r) != (col, row) and os.path.exists(self.tile_path(level, c, r)):
+                        continue
+                    encoded = self._encode(array, c, r)
+                    write_atomic(self.tile_path(level, c, r), lambda f: f.write(encoded))
+                    if (c, r) == (col, row):
+                        content = encoded
+            # pyramids written before levels stopped being persisted
+            try:
+                os.unlink(os.path.join(self.directory, f"level_{level}.npy"))
+            except FileNotFoundError:
+                pass
+        return content
+
+    def info(self) -> Dict[str, Any]:
+        levels: List[Dict[str, Any]] = []
+        for level in range(self.max_level + 1):
+            width, height = self.level_size(level)
+            cols, rows = self.grid_size(level)
+            levels.append({"level": level, "width": width, "height": height, "columns": cols, "rows": rows})
+        return {
+            "width": self.width,
+            "height": self.height,
+            "tile_size": TILE_SIZE,
+            "overlap": TILE_OVERLAP,
+            "format": self.fmt,
+            "max_level": self.max_level,
+            "levels": levels
+        }
+
+@lru_cache(maxsize=256)
+def get_tile_pyramid(source_path: str, source_hash: str) -> TilePyramid:
+    return TilePyramid(source_path, source_hash, settings.TILE_DIR, settings.TILE_FORMAT)
@@ -0,0 +1,198 @@
+import bisect
+import mmap
+import os
+import struct
+import time
+import zipfile
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.index_store import PackedStrings, build_lock, index_stamp, pack_strings, read_index, read_meta, write_index
+
+ROOT_PREFIX = "tiny-imagenet-200/"
+INDEX_VERSION = 1
+LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+def entry_key(name: str) -> str:
+    if name.startswith(ROOT_PREFIX):
+        name = name[len(ROOT_PREFIX):]
+    parts = name.split("/")
+    # train/<wnid>/images/<file> -> <wnid>/<file>; {val,test}/images/<file> -> <split>/<file>
+    if len(parts) == 4 and parts[0] == "train" and parts[2] == "images":
+        return f"{parts[1]}/{parts[3]}"
+    if len(parts) == 3 and parts[0] in ("val", "test") and parts[1] == "images":
+        return f"{parts[0]}/{parts[2]}"
+    return name
+
+def build_archive_index(archive_path: str, index_path: str) -> None:
+    rows: List[Tuple[str, int, int, int, int, int]] = []
+    with open(archive_path, "rb") as f, zipfile.ZipFile(f) as archive:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                header = LOCAL_HEADER.unpack_from(mm, info.header_offset)
+                if header[0] != LOCAL_HEADER_SIGNATURE:
+                    raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+                data_offset = info.header_offset + LOCAL_HEADER.size + header[-2] + header[-1]
+                rows.append((
+                    entry_key(info.filename), data_offset, info.compress_size,
+                    info.file_size, info.compress_type, info.CRC,
+                ))
+        finally:
+            mm.close()
+
+    rows.sort(key=lambda r: r[0])
+    key_blob, key_offsets = pack_strings([r[0] for r in rows])
+    stat = os.stat(archive_path)
+    write_index(index_path, {
+        "key_blob": key_blob,
+        "key_offsets": key_offsets,
+        "data_offset": np.asarray([r[1] for r in rows], dtype=np.int64),
+        "compress_size": np.asarray([r[2] for r in rows], dtype=np.int64),
+        "file_size": np.asarray([r[3] for r in rows], dtype=np.int64),
+        "method": np.asarray([r[4] for r in rows], dtype=np.uint8),
+        "crc": np.asarray([r[5] for r in rows], dtype=np.uint32),
+    }, {
+        "version": INDEX_VERSION,
+        "archive": os.path.abspath(archive_path),
+        "archive_size": stat.st_size,
+        "archive_mtime_ns": stat.st_mtime_ns,
+        "count": len(rows),
+        "built_at": time.time(),
+    })
+
+def index_is_current(index_path: str, archive_path: str) -> bool:
+    try:
+        meta = read_meta(index_path)
+        stat = os.stat(archive_path)
+    except (OSError, ValueError):
+        return False
+    return (
+        meta.get("version") == INDEX_VERSION
+        and meta.get("archive_size") == stat.st_size
+        and meta.get("archive_mtime_ns") == stat.st_mtime_ns
+    )
+
+class TinyImageNetArchive:
+    def __init__(self, archive_path: str, columns: Dict[str, np.ndarray]):
+        self.archive_path = archive_path
+        self.keys = PackedStrings(columns["key_blob"], columns["key_offsets"])
+        self.data_offset = columns["data_offset"]
+        self.compress_size = columns["compress_size"]
+        self.file_size = columns["file_size"]
+        self.method = columns["method"]
+        self.crc = columns["crc"]
+        self._file = open(archive_path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._classes: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def load(cls, archive_path: str, index_path: str) -> "TinyImageNetArchive":
+        columns, _ = read_index(index_path)
+        return cls(archive_path, columns)
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def find(self, key: str) -> Optional[int]:
+        row = bisect.bisect_left(self.keys, key)
+        if row < len(self.keys) and self.keys[row] == key:
+            return row
+        return None
+
+    def read_row(self, row: int) -> bytes:
+        start = int(self.data_offset[row])
+        data = self._mm[start:start + int(self.compress_size[row])]
+        method = int(self.method[row])
+        if method == zipfile.ZIP_STORED:
+            return data
+        if method == zipfile.ZIP_DEFLATED:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        raise zipfile.BadZipFile(f"Unsupported compression method {method}")
+
+    def entry_digest(self, row: int) -> str:
+        return f"zip-{int(self.crc[row]):08x}-{int(self.file_size[row])}"
+
+    def read(self, key: str) -> Optional[bytes]:
+        row = self.find(key)
+        return None if row is None else self.read_row(row)
+
+    def image_key(self, class_id: str, image_id: str) -> str:
+        if not os.path.splitext(image_id)[1]:
+            image_id = f"{image_id}.JPEG"
+        return f"{class_id}/{image_id}"
+
+    def read_image(self, class_id: str, image_id: str) -> Optional[bytes]:
+        return self.read(self.image_key(class_id, image_id))
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        start = bisect.bisect_left(self.keys, prefix)
+        # "0" sorts directly after "/", so this bounds every key under prefix
+        stop = bisect.bisect_left(self.keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo=start)
+        return start, stop
+
+    def class_size(self, class_id: str) -> int:
+        start, stop = self.prefix_range(f"{class_id}/")
+        return stop - start
+
+    def class_samples(self, class_id: str, limit: int, offset: int = 0) -> Tuple[List[str], int]:
+        start, stop = self.prefix_range(f"{class_id}/")
+        first = start + max(offset, 0)
+        names = [key.split("/", 1)[1] for key in self.keys.slice(first, min(stop, first + max(limit, 0)))]
+        return names, stop - start
+
+    def classes(self) -> List[Dict[str, Any]]:
+        if self._classes is None:
+            words = {}
+            raw_words = self.read("words.txt") or b""
+            for line in raw_words.decode("utf-8").splitlines():
+                wnid, _, name = line.partition("\t")
+                words[wnid] = name.split(",")[0].strip()
+            wnids = (self.read("wnids.txt") or b"").decode("utf-8").split()
+            self._classes = []
+            for wnid in wnids:
+                start, stop = self.prefix_range(f"{wnid}/")
+                self._classes.append({
+                    "id": wnid,
+                    "name": words.get(wnid, wnid),
+                    "wordnet_id": wnid,
+                    "sample_count": stop - start
+                })
+        return self._classes
+
+def tiny_imagenet_index_path() -> str:
+    return os.path.join(settings.INDEX_DIR, "tiny_imagenet")
+
+@lru_cache(maxsize=4)
+def _ensure_archive_index(archive_path: str, index_path: str, size: int, mtime_ns: int) -> None:
+    # checked once per archive size/mtime; only one worker rebuilds a stale index
+    if index_is_current(index_path, archive_path):
+        return
+    with build_lock(index_path):
+        if not index_is_current(index_path, archive_path):
+            build_archive_index(archive_path, index_path)
+
+@lru_cache(maxsize=2)
+def _load_tiny_imagenet_archive(archive_path: str, index_path: str, stamp: Tuple[int, int]) -> TinyImageNetArchive:
+    return TinyImageNetArchive.load(archive_path, index_path)
+
+def get_tiny_imagenet_archive() -> Optional[TinyImageNetArchive]:
+    archive_path = settings.TINY_IMAGENET_ZIP
+    try:
+        stat = os.stat(archive_path)
+    except FileNotFoundError:
+        return None
+    index_path = tiny_imagenet_index_path()
+    _ensure_archive_index(archive_path, index_path, stat.st_size, stat.st_mtime_ns)
+    return _load_tiny_imagenet_archive(archive_path, index_path, index_stamp(index_path))
+
+if __name__ == "__main__":
+    build_archive_index(settings.TINY_IMAGENET_ZIP, tiny_imagenet_index_path())
+    archive = TinyImageNetArchive.load(settings.TINY_IMAGENET_ZIP, tiny_imagenet_index_path())
+    print(f"Indexed {len(archive.keys)} entries in {settings.TINY_IMAGENET_ZIP}")
@@ -0,0 +1,143 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from app.core.config import settings
+from app.services.index_store import PackedStrings, index_stamp, pack_strings, read_index, staged_version, write_meta
+from app.services.tiny_imagenet_archive import TinyImageNetArchive, get_tiny_imagenet_archive, tiny_imagenet_index_path
+
+IMAGE_SHAPE = (64, 64, 3)
+SPLITS = ("train", "val", "test")
+UNLABELED = -1
+CHUNK_ROWS = 512
+TENSOR_VERSION = 1
+
+def tensor_store_path() -> str:
+    return os.path.join(settings.INDEX_DIR, "tiny_imagenet_tensors")
+
+def export_rows(archive: TinyImageNetArchive) -> Tuple[List[int], np.ndarray, np.ndarray, List[str]]:
+    wnids = (archive.read("wnids.txt") or b"").decode("utf-8").split()
+    label_of = {wnid: i for i, wnid in enumerate(wnids)}
+    val_labels: Dict[str, int] = {}
+    for line in (archive.read("val/val_annotations.txt") or b"").decode("utf-8").splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 2 and parts[1] in label_of:
+            val_labels[parts[0]] = label_of[parts[1]]
+
+    rows, labels, splits = [], [], []
+    # train first, then val and test, so every split is one contiguous block of the tensor
+    for split in SPLITS:
+        prefixes = [f"{wnid}/" for wnid in wnids] if split == "train" else [f"{split}/"]
+        for prefix in prefixes:
+            start, stop = archive.prefix_range(prefix)
+            for row in range(start, stop):
+                filename = archive.keys[row].split("/", 1)[1]
+                if not filename.upper().endswith(".JPEG"):
+                    continue
+                rows.append(row)
+                splits.append(SPLITS.index(split))
+                if split == "train":
+                    labels.append(label_of[prefix[:-1]])
+                else:
+                    labels.append(val_labels.get(filename, UNLABELED) if split == "val" else UNLABELED)
+    return rows, np.asarray(labels, dtype=np.int16), np.asarray(splits, dtype=np.uint8), wnids
+
+_worker_archive: Optional[TinyImageNetArchive] = None
+
+def _init_worker(archive_path: str, index_path: str) -> None:
+    global _worker_archive
+    _worker_archive = TinyImageNetArchive.load(archive_path, index_path)
+
+def decode_chunk(images_path: str, first: int, rows: List[int]) -> int:
+    # each worker writes its slice straight into the shared memmap instead of pickling pixels back
+    images = np.load(images_path, mmap_mode="r+")
+    for i, row in enumerate(rows):
+        with Image.open(io.BytesIO(_worker_archive.read_row(row))) as img:
+            img = img.convert("RGB")
+            if img.size != IMAGE_SHAPE[:2]:
+                img = img.resize(IMAGE_SHAPE[:2], Image.BILINEAR)
+            images[first + i] = np.asarray(img)
+    images.flush()
+    return len(rows)
+
+def export_tensor_store(path: str, workers: Optional[int] = None) -> int:
+    archive = get_tiny_imagenet_archive()
+    if archive is None:
+        raise FileNotFoundError(f"Tiny-ImageNet archive not found at {settings.TINY_IMAGENET_ZIP}")
+    rows, labels, splits, wnids = export_rows(archive)
+    keys = [archive.keys[row] for row in rows]
+
+    # published as a new version of the store, like every other index, so a re-export swaps in atomically
+    with staged_version(path) as (tmp, version):
+        images_path = os.path.join(tmp, "images.npy")
+        images = np.lib.format.open_memmap(images_path, mode="w+", dtype=np.uint8, shape=(len(rows), *IMAGE_SHAPE))
+        del images
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(settings.TINY_IMAGENET_ZIP, tiny_imagenet_index_path())
+        ) as pool:
+            futures = [
+                pool.submit(decode_chunk, images_path, first, rows[first:first + CHUNK_ROWS])
+                for first in range(0, len(rows), CHUNK_ROWS)
+            ]
+            for future in futures:
+                future.result()
+
+        key_blob, key_offsets = pack_strings(keys)
+        for name, array in (("labels", labels), ("splits", splits), ("key_blob", key_blob), ("key_offsets", key_offsets)):
+            np.save(os.path.join(tmp, f"{name}.npy"), array)
+        write_meta(tmp, {
+            "version": TENSOR_VERSION,
+            "count": len(rows),
+            "shape": list(IMAGE_SHAPE),
+            "classes": wnids,
+            "split_ranges": {
+                split: [int(np.searchsorted(splits, i)), int(np.searchsorted(splits, i, side="right"))]
+                for i, split in enumerate(SPLITS)
+            },
+            "built_at": time.time(),
+            "index_version": version
+        })
+    return len(rows)
+
+class TensorStore:
+    def __init__(self, columns: Dict[str, np.ndarray], meta: Dict[str, object]):
+        self.images = columns["images"]
+        self.labels = columns["labels"]
+        self.splits = columns["splits"]
+        self.keys = PackedStrings(columns["key_blob"], columns["key_offsets"])
+        self.classes: List[str] = meta["classes"]
+        self.split_ranges: Dict[str, List[int]] = meta["split_ranges"]
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def split_range(self, split: Optional[str]) -> Tuple[int, int]:
+        return tuple(self.split_ranges[split]) if split else (0, len(self))
+
+@lru_cache(maxsize=2)
+def _load_tensor_store(path: str, stamp: Tuple[int, int]) -> TensorStore:
+    return TensorStore(*read_index(path))
+
+def get_tensor_store() -> Optional[TensorStore]:
+    # keyed on the CURRENT pointer, so a fresh export is mapped on the next call without a restart
+    path = tensor_store_path()
+    stamp = index_stamp(path)
+    if stamp is None:
+        return None
+    return _load_tensor_store(path, stamp)
+
+def npy_header(array: np.ndarray) -> bytes:
+    out = io.BytesIO()
+    np.lib.format.write_array_header_1_0(out, np.lib.format.header_data_from_array_1_0(array))
+    return out.getvalue()
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    count = export_tensor_store(tensor_store_path())
+    print(f"Exported {count} images to {tensor_store_path()} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,111 @@
+import asyncio
+import io
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+from app.core.config import settings
+from app.services.metrics import registry, timed
+
+OUTPUT_FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "png": ("PNG", "image/png"),
+}
+SOURCE_FORMATS = {"JPEG": "jpeg", "WEBP": "webp", "PNG": "png"}
+DEFAULT_QUALITY = 85
+
+class TranscoderBusy(Exception):
+    pass
+
+def target_size(width: int, height: int, max_width: Optional[int], max_height: Optional[int]) -> Tuple[int, int]:
+    scale = 1.0
+    if max_width:
+        scale = min(scale, max_width / width)
+    if max_height:
+        scale = min(scale, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def transcode_image(
+    source: Union[bytes, str],
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    quality: Optional[int] = None,
+    fmt: Optional[str] = None,
+) -> Tuple[bytes, str]:
+    from PIL import Image
+
+    # closed on exit, so a worker process never holds the source file open until garbage collection
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        out_format = fmt or SOURCE_FORMATS.get(img.format, "png")
+        size = target_size(img.width, img.height, width, height)
+
+        if size != img.size:
+            if img.format == "JPEG":
+                # let libjpeg decode at 1/2, 1/4 or 1/8 scale instead of full resolution
+                img.draft(img.mode, size)
+            factor = min(img.width // size[0], img.height // size[1])
+            if factor >= 2:
+                img = img.reduce(factor)
+            if img.size != size:
+                img = img.resize(size, Image.LANCZOS)
+
+        pil_format, media_type = OUTPUT_FORMATS[out_format]
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        elif img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA" if "transparency" in img.info or img.mode == "P" else "RGB")
+
+        options = {}
+        if pil_format in ("JPEG", "WEBP"):
+            options["quality"] = quality or DEFAULT_QUALITY
+        if pil_format in ("JPEG", "PNG"):
+            options["optimize"] = True
+        out = io.BytesIO()
+        img.save(out, pil_format, **options)
+    return out.getvalue(), media_type
+
+class TranscodeEngine:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def transcode(
+        self,
+        source: Union[bytes, str],
+        width: Optional[int] = None,
+        height: Optional[int] = None,
+        quality: Optional[int] = None,
+        fmt: Optional[str] = None,
+    ) -> Tuple[bytes, str]:
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise TranscoderBusy(f"{self.pending} transcodes already pending")
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            # decode and resize run in worker processes, so they are timed here as one operation
+            with timed("image_transcode"):
+                return await loop.run_in_executor(
+                    self._get_executor(), transcode_image, source, width, height, quality, fmt
+                )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+@lru_cache(maxsize=None)
+def get_transcoder() -> TranscodeEngine:
+    engine = TranscodeEngine(settings.TRANSCODE_WORKERS, settings.TRANSCODE_MAX_PENDING)
+    registry.source("transcoder", "Image transcode queue", lambda: {"pending": engine.pending, "rejected": engine.rejected})
+    return engine
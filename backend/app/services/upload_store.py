@@ -0,0 +1,172 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import tempfile
+import uuid
+from typing import IO, Any, Dict, List, NamedTuple, Optional, Tuple
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.dataset import Upload
+from app.services.metrics import timed
+
+CHUNK_SIZE = 1024 * 1024
+BLOB_LOCK_POLL_INTERVAL = 0.01
+
+class FileTooLarge(Exception):
+    pass
+
+class StoredBlob(NamedTuple):
+    sha256: str
+    path: str
+    size: int
+    deduplicated: bool
+    # shared flock held until the request has committed its rows or given the blob up
+    handle: Optional[IO[bytes]] = None
+
+def blob_path(sha256: str, upload_dir: Optional[str] = None) -> str:
+    return os.path.join(upload_dir or settings.UPLOAD_DIR, "blobs", sha256[:2], sha256)
+
+# A blob is only unlinked by a holder of an exclusive flock on it that finds no committed row pointing at it.
+# Requests keep a shared flock from the moment they store or reuse a blob until their rows are committed, so
+# a delete that runs in between leaves the blob alone, in this process or any other worker.
+async def _hold_blob(path: str) -> Optional[IO[bytes]]:
+    try:
+        handle = open(path, "rb")
+    except FileNotFoundError:
+        return None
+    while True:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            await asyncio.sleep(BLOB_LOCK_POLL_INTERVAL)
+    if os.fstat(handle.fileno()).st_nlink == 0:
+        # unlinked while this request waited for the lock
+        handle.close()
+        return None
+    return handle
+
+async def _commit_blob(tmp_path: str, path: str) -> Tuple[bool, IO[bytes]]:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    while True:
+        # link instead of rename, so an existing blob is never replaced under a reader
+        try:
+            await run_in_threadpool(os.link, tmp_path, path)
+            deduplicated = False
+        except FileExistsError:
+            deduplicated = True
+        handle = await _hold_blob(path)
+        if handle is not None:
+            os.unlink(tmp_path)
+            return deduplicated, handle
+
+async def _unlink_unreferenced(db: AsyncSession, path: str, handle: Optional[IO[bytes]] = None) -> bool:
+    if handle is None:
+        try:
+            handle = open(path, "rb")
+        except FileNotFoundError:
+            return False
+    try:
+        try:
+            # converts this request's own shared lock; fails while any other request still holds the blob
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        referenced = (await db.execute(select(Upload.id).where(Upload.file_path == path).limit(1))).first()
+        try:
+            current = os.path.samestat(os.fstat(handle.fileno()), os.stat(path))
+        except FileNotFoundError:
+            current = False
+        if referenced is None and current:
+            await run_in_threadpool(os.unlink, path)
+            return True
+        return False
+    finally:
+        handle.close()
+
+async def store_upload(file: UploadFile, max_size: Optional[int] = None) -> StoredBlob:
+    max_size = settings.MAX_FILE_SIZE if max_size is None else max_size
+    tmp_dir = os.path.join(settings.UPLOAD_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    sha = hashlib.sha256()
+    size = 0
+    try:
+        with timed("upload_write"), os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLarge(f"File {file.filename} exceeds {max_size} bytes")
+                sha.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+        digest = sha.hexdigest()
+        path = blob_path(digest)
+        deduplicated, handle = await _commit_blob(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return StoredBlob(digest, path, size, deduplicated, handle)
+
+def parse_upload_id(upload_id: str) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(upload_id)
+    except ValueError:
+        return None
+
+async def find_upload(db: AsyncSession, category: str, upload_id: str) -> Optional[Upload]:
+    parsed = parse_upload_id(upload_id)
+    if parsed is None:
+        return None
+    upload = await db.get(Upload, parsed)
+    if upload is None or upload.category != category:
+        return None
+    return upload
+
+async def save_uploads(db: AsyncSession, uploads: List[Upload]) -> None:
+    db.add_all(uploads)
+    await db.commit()
+
+async def delete_upload(db: AsyncSession, upload: Upload) -> bool:
+    file_path = upload.file_path
+    await db.delete(upload)
+    await db.commit()
+    # blobs are shared by every upload of the same content
+    return bool(file_path) and await _unlink_unreferenced(db, file_path)
+
+def release_blobs(blobs: List[StoredBlob]) -> None:
+    # once the rows are committed they keep the blobs alive
+    for blob in blobs:
+        if blob.handle is not None:
+            blob.handle.close()
+
+async def discard_blobs(db: AsyncSession, blobs: List[StoredBlob]) -> None:
+    # undo a failed request: a blob goes only if no other request holds it and no saved upload points at it
+    held: Dict[str, StoredBlob] = {}
+    for blob in blobs:
+        if blob.path in held:
+            # the same content twice in one request; one lock is enough to decide
+            release_blobs([blob])
+        else:
+            held[blob.path] = blob
+    for blob in held.values():
+        await _unlink_unreferenced(db, blob.path, blob.handle)
+
+def upload_to_dict(upload: Upload) -> Dict[str, Any]:
+    return {
+        "upload_id": str(upload.id),
+        "category": upload.category,
+        "original_filename": upload.original_filename,
+        "stored_filename": upload.stored_filename,
+        "file_size": upload.file_size,
+        "processing_status": upload.processing_status,
+        "created_at": upload.created_at.isoformat() if upload.created_at else None,
+        "analysis_results": upload.analysis_results
+    }
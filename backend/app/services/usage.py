@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.models.dataset import APIUsage
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# requests without a valid token are metered under the nil UUID, so the
+# (endpoint, user_id, date) unique index also covers them (NULLs never conflict)
+ANONYMOUS_USER = uuid.UUID(int=0)
+UNMATCHED_ENDPOINT = "<unmatched>"
+
+UsageKey = Tuple[str, uuid.UUID, int]
+
+@lru_cache(maxsize=4096)
+def _token_subject(token: str) -> Tuple[Optional[uuid.UUID], float]:
+    # python-jose pulls in the cryptography backends, so it is loaded with the first token seen
+    from jose import JWTError, jwt
+    from app.core.security import ALGORITHM
+
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[ALGORITHM])
+        return uuid.UUID(str(claims.get("sub"))), float(claims.get("exp", float("inf")))
+    except (JWTError, ValueError):
+        return None, float("inf")
+
+def request_user(headers: List[Tuple[bytes, bytes]]) -> uuid.UUID:
+    # tokens are verified once and then served from the cache until they expire
+    for name, value in headers:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                break
+            user_id, expires = _token_subject(token)
+            if user_id is not None and expires > time.time():
+                return user_id
+            break
+    return ANONYMOUS_USER
+
+class UsageMeter:
+    def __init__(self, flush_interval: float, flush_max_keys: int):
+        self.flush_interval = flush_interval
+        self.flush_max_keys = flush_max_keys
+        # only touched from the event loop thread, and flushes swap the whole dict out,
+        # so recording needs no lock
+        self._counts: Dict[UsageKey, int] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed_rows = 0
+        self.flush_errors = 0
+
+    def record(self, endpoint: str, user_id: uuid.UUID) -> None:
+        # days are kept as ordinals; they only become datetimes when flushed
+        key = (endpoint, user_id, int(time.time() // 86400))
+        counts = self._counts
+        counts[key] = counts.get(key, 0) + 1
+        if self._task is None:
+            self._start()
+        elif len(counts) >= self.flush_max_keys:
+            self._wakeup.set()
+
+    @property
+    def pending(self) -> int:
+        return sum(self._counts.values())
+
+    def _start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        counts, self._counts = self._counts, {}
+        if not counts:
+            return 0
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "endpoint": endpoint,
+                "user_id": user_id,
+                "date": datetime.fromtimestamp(day * 86400, tz=timezone.utc),
+                "request_count": count
+            }
+            for (endpoint, user_id, day), count in counts.items()
+        ]
+        try:
+            await upsert_usage(rows)
+        except Exception:
+            # keep the counts for the next attempt instead of dropping them
+            for key, count in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + count
+            self.flush_errors += 1
+            logger.exception("Flushing %d API usage rows failed", len(rows))
+            return 0
+        self.flushed_rows += len(rows)
+        return len(rows)
+
+    async def shutdown(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending_keys": len(self._counts),
+            "pending_requests": self.pending,
+            "flushed_rows": self.flushed_rows,
+            "flush_errors": self.flush_errors
+        }
+
+async def upsert_usage(rows: List[Dict]) -> None:
+    table = APIUsage.__table__
+    async with AsyncSessionLocal() as db:
+        dialect = db.get_bind().dialect.name
+        if dialect in ("postgresql", "sqlite"):
+            insert = postgresql_insert if dialect == "postgresql" else sqlite_insert
+            statement = insert(table)
+            statement = statement.on_conflict_do_update(
+                index_elements=["endpoint", "user_id", "date"],
+                set_={"request_count": table.c.request_count + statement.excluded.request_count}
+            )
+            await db.execute(statement, rows)
+        else:
+            for row in rows:
+                key = (table.c.endpoint == row["endpoint"]) & (table.c.user_id == row["user_id"]) & (table.c.date == row["date"])
+                if (await db.execute(select(table.c.id).where(key))).first():
+                    await db.execute(update(table).where(key).values(request_count=table.c.request_count + row["request_count"]))
+                else:
+                    await db.execute(table.insert().values(**row))
+        await db.commit()
+
+@lru_cache(maxsize=None)
+def get_usage_meter() -> UsageMeter:
+    meter = UsageMeter(settings.USAGE_FLUSH_INTERVAL, settings.USAGE_FLUSH_MAX_KEYS)
+    registry.source("usage_meter", "Buffered API usage counts", meter.stats)
+    return meter
+
+class UsageMeteringMiddleware:
+    # plain ASGI rather than BaseHTTPMiddleware, so responses are not re-wrapped per request
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # the router stores the matched route in the scope, so usage is keyed by the path template
+            route = scope.get("route")
+            endpoint = f"{scope['method']} {route.path}" if route is not None else UNMATCHED_ENDPOINT
+            get_usage_meter().record(endpoint, request_user(scope["headers"]))
@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+import time
+from importlib import import_module
+from typing import Any, Callable, Dict, Optional
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from app.api.api_v1.api import lazy_endpoints
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+def load_kitti_timelines() -> None:
+    from app.services.kitti_timeline import load_sequence_timeline
+
+    if os.path.isdir(settings.KITTI_DIR):
+        for sequence in sorted(os.listdir(settings.KITTI_DIR)):
+            load_sequence_timeline(os.path.join(settings.KITTI_DIR, sequence))
+
+# every loader imports its service on call, so importing this module stays cheap
+INDEX_LOADERS: Dict[str, Callable[[], Any]] = {
+    "chest-xray": lambda: import_module("app.services.chest_xray_index").get_chest_xray_index(),
+    "chest-xray-facets": lambda: import_module("app.services.facets").get_chest_xray_facets(),
+    "tiny-imagenet": lambda: import_module("app.services.tiny_imagenet_archive").get_tiny_imagenet_archive(),
+    "kitti": load_kitti_timelines,
+}
+
+class StartupProfile:
+    def __init__(self):
+        self.state = "idle"
+        self.routers: Dict[str, float] = {}
+        self.indexes: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.seconds: Optional[float] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "routers_seconds": self.routers,
+            "indexes_seconds": self.indexes,
+            "errors": self.errors,
+            "warmup_seconds": self.seconds
+        }
+
+startup_profile = StartupProfile()
+
+def load_indexes(profile: StartupProfile = startup_profile) -> Dict[str, float]:
+    for name, loader in INDEX_LOADERS.items():
+        started = time.perf_counter()
+        try:
+            loader()
+        except Exception as exc:
+            profile.errors[name] = str(exc)
+            logger.exception("Warming up the %s index failed", name)
+        profile.indexes[name] = round(time.perf_counter() - started, 4)
+    return profile.indexes
+
+async def warm_up(app: FastAPI, profile: StartupProfile = startup_profile) -> None:
+    profile.state = "running"
+    started = time.perf_counter()
+    # yield first, so the server finishes starting and accepts connections while this runs
+    await asyncio.sleep(0)
+    for route in lazy_endpoints(app):
+        module_started = time.perf_counter()
+        # the import runs in a thread; including the routes mutates the route table, so that
+        # part stays on the event loop
+        await run_in_threadpool(import_module, f"app.api.api_v1.endpoints.{route.module}")
+        route.load()
+        profile.routers[route.module] = round(time.perf_counter() - module_started, 4)
+    await run_in_threadpool(load_indexes, profile)
+    profile.seconds = round(time.perf_counter() - started, 4)
+    profile.state = "done"
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from benchmarks.workloads import Call, build_schedule, parse_mix, synthetic_xray
+
+DEFAULT_REQUESTS = 2000
+DEFAULT_CONCURRENCY = 16
+DEFAULT_WARMUP = 100
+DEFAULT_SEED_UPLOADS = 32
+DEFAULT_THRESHOLD = 0.25
+# differences below this are timer noise on a laptop and never count as a regression
+MIN_LATENCY_DELTA_MS = 0.5
+
+Sample = Tuple[str, float, int]
+
+def scratch_environment() -> str:
+    # an empty SQLite database and fresh upload/cache directories make runs comparable;
+    # dataset directories still come from the environment
+    root = tempfile.mkdtemp(prefix="ml-explorer-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(root, 'bench.sqlite')}"
+    os.environ["ASYNC_DATABASE_URL"] = ""
+    os.environ["UPLOAD_DIR"] = os.path.join(root, "uploads")
+    os.environ["CACHE_DIR"] = os.path.join(root, "cache")
+    os.environ["TILE_DIR"] = os.path.join(root, "tiles")
+    return root
+
+async def send(client, call: Call) -> Sample:
+    started = time.perf_counter()
+    response = await client.request(call.method, call.url, files=call.files)
+    return call.route, time.perf_counter() - started, response.status_code
+
+async def drive(client, calls: List[Call], concurrency: int) -> List[Sample]:
+    samples: List[Sample] = []
+    queue = iter(calls)
+
+    async def worker():
+        for call in queue:
+            samples.append(await send(client, call))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+async def seed_uploads(client, count: int, seed: int) -> List[str]:
+    # image fetches need something to fetch, so a fixed set of uploads exists before timing starts
+    rng = np.random.default_rng(seed + 1)
+    files = [("files", (f"seed-{i}.jpg", synthetic_xray(rng), "image/jpeg")) for i in range(count)]
+    response = await client.post("/api/v1/upload/xray", files=files)
+    response.raise_for_status()
+    return [upload["upload_id"] for upload in response.json()["uploads"]]
+
+def latency_summary(seconds: np.ndarray) -> Dict[str, float]:
+    ms = seconds * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "mean_ms": round(float(ms.mean()), 3),
+        "max_ms": round(float(ms.max()), 3)
+    }
+
+def summarize(samples: List[Sample], wall: float) -> Dict[str, Any]:
+    routes: Dict[str, Dict[str, Any]] = {}
+    for route in sorted({route for route, _, _ in samples}):
+        seconds = np.array([elapsed for name, elapsed, _ in samples if name == route])
+        errors = sum(1 for name, _, status in samples if name == route and status >= 400)
+        routes[route] = {
+            "requests": len(seconds),
+            "errors": errors,
+            "throughput_rps": round(len(seconds) / wall, 2),
+            **latency_summary(seconds)
+        }
+    return {
+        "routes": routes,
+        "total": {
+            "requests": len(samples),
+            "errors": sum(route["errors"] for route in routes.values()),
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(samples) / wall, 2),
+            **latency_summary(np.array([elapsed for _, elapsed, _ in samples]))
+        }
+    }
+
+async def run_benchmark(
+    requests: int = DEFAULT_REQUESTS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    warmup: int = DEFAULT_WARMUP,
+    mix: Optional[Dict[str, int]] = None,
+    seed: int = 0
+) -> Dict[str, Any]:
+    # the app reads its settings at import time, so it is only imported once the environment is set
+    import httpx
+    from app.db.base import Base, engine
+    from app.main import app
+    from app.models import dataset  # noqa: F401 - registers the tables
+
+    mix = mix or parse_mix(None)
+    Base.metadata.create_all(bind=engine)
+    await app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            upload_ids = await seed_uploads(client, DEFAULT_SEED_UPLOADS, seed) if mix.get("image") else []
+            if warmup:
+                await drive(client, build_schedule(mix, warmup, seed + 2, upload_ids), concurrency)
+            calls = build_schedule(mix, requests, seed, upload_ids)
+            started = time.perf_counter()
+            samples = await drive(client, calls, concurrency)
+            wall = time.perf_counter() - started
+    finally:
+        await app.router.shutdown()
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "requests": requests,
+            "concurrency": concurrency,
+            "warmup": warmup,
+            "mix": mix,
+            "seed": seed,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        },
+        **summarize(samples, wall)
+    }
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    # a route regresses when p50 or p95 grows, or its throughput drops, by more than the threshold
+    regressions = []
+    for route, base in baseline["routes"].items():
+        now = current["routes"].get(route)
+        if now is None:
+            continue
+        for key in ("p50_ms", "p95_ms"):
+            if now[key] > base[key] * (1 + threshold) and now[key] - base[key] > MIN_LATENCY_DELTA_MS:
+                regressions.append(f"{route}: {key} {base[key]:.2f} -> {now[key]:.2f}")
+        if now["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(f"{route}: throughput_rps {base['throughput_rps']:.1f} -> {now['throughput_rps']:.1f}")
+    base_total, now_total = baseline["total"]["throughput_rps"], current["total"]["throughput_rps"]
+    if now_total < base_total * (1 - threshold):
+        regressions.append(f"total: throughput_rps {base_total:.1f} -> {now_total:.1f}")
+    return regressions
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"{'route':<58} {'req':>6} {'err':>4} {'rps':>9} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in [*report["routes"].items(), ("total", report["total"])]:
+        print(f"{route:<58} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>9.1f} "
+              f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}")
+
+def option(name: str, default: Optional[str] = None) -> Optional[str]:
+    return next((arg.split("=", 1)[1] for arg in sys.argv[1:] if arg.startswith(f"--{name}=")), default)
+
+if __name__ == "__main__":
+    scratch = None if "--use-env" in sys.argv[1:] else scratch_environment()
+    try:
+        report = asyncio.run(run_benchmark(
+            requests=int(option("requests", str(DEFAULT_REQUESTS))),
+            concurrency=int(option("concurrency", str(DEFAULT_CONCURRENCY))),
+            warmup=int(option("warmup", str(DEFAULT_WARMUP))),
+            mix=parse_mix(option("mix")),
+            seed=int(option("seed", "0"))
+        ))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+    print_report(report)
+
+    output = option("output")
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+
+    baseline_path = option("baseline")
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        threshold = float(option("threshold", str(DEFAULT_THRESHOLD)))
+        regressions = compare(report, baseline, threshold)
+        if regressions:
+            print(f"Regressions beyond {threshold:.0%} against {baseline_path}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions beyond {threshold:.0%} against {baseline_path}")
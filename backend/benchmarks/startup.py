@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+from benchmarks.run import option, scratch_environment
+
+DEFAULT_BUDGET = 1.5
+DEFAULT_REPEAT = 5
+TOP_MODULES = 15
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+IMPORT_SCRIPT = """
+import time
+started = time.perf_counter()
+import app.main
+print(time.perf_counter() - started)
+"""
+
+INDEX_SCRIPT = """
+import json
+from app.services.warmup import load_indexes, startup_profile
+load_indexes()
+print(json.dumps({"indexes": startup_profile.indexes, "errors": startup_profile.errors}))
+"""
+
+FIRST_REQUEST_SCRIPT = """
+import asyncio, json, time
+started = time.perf_counter()
+import httpx
+from app.main import app
+
+async def first_request():
+    imported = time.perf_counter()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        response = await client.get("/api/v1/datasets/chest-xray/samples?limit=1")
+    done = time.perf_counter()
+    print(json.dumps({"status": response.status_code, "request": done - imported, "total": done - started}))
+
+asyncio.run(first_request())
+"""
+
+def python(script: str, *flags: str) -> subprocess.CompletedProcess:
+    # every measurement runs in a fresh interpreter, so nothing is already imported or mapped
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.run(
+        [sys.executable, *flags, "-c", script], cwd=backend, env=os.environ.copy(),
+        capture_output=True, text=True, check=True
+    )
+
+def parse_importtime(stderr: str) -> List[Dict[str, Any]]:
+    # children are printed before their parent, so entries are buffered until the top-level
+    # import they belong to; only the app's own imports are kept, not interpreter startup
+    modules, pending = [], []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        pending.append({
+            "module": name,
+            "depth": len(indent) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+        if pending[-1]["depth"] == 0:
+            if name == "app" or name.startswith("app."):
+                modules.extend(pending)
+            pending = []
+    return modules
+
+def startup_profile(repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    # the fastest of several cold imports is the least noisy number a laptop can reproduce
+    import_seconds = [float(python(IMPORT_SCRIPT).stdout.strip().splitlines()[-1]) for _ in range(repeat)]
+    modules = parse_importtime(python("import app.main", "-X", "importtime").stderr)
+    direct = [m for m in modules if m["depth"] == 1]
+    first_request = json.loads(python(FIRST_REQUEST_SCRIPT).stdout.strip().splitlines()[-1])
+    indexes = json.loads(python(INDEX_SCRIPT).stdout.strip().splitlines()[-1])
+    return {
+        "import_seconds": round(min(import_seconds), 4),
+        "import_seconds_runs": [round(s, 4) for s in import_seconds],
+        "imports_by_package": sorted(
+            ({"module": m["module"], "cumulative_ms": m["cumulative_ms"]} for m in direct),
+            key=lambda m: -m["cumulative_ms"]
+        )[:TOP_MODULES],
+        "imports_by_self_time": sorted(
+            ({"module": m["module"], "self_ms": m["self_ms"]} for m in modules), key=lambda m: -m["self_ms"]
+        )[:TOP_MODULES],
+        "first_request": {key: round(value, 4) if isinstance(value, float) else value for key, value in first_request.items()},
+        "index_load_seconds": indexes["indexes"],
+        "index_errors": indexes["errors"]
+    }
+
+def print_profile(profile: Dict[str, Any]) -> None:
+    print(f"import app.main: {profile['import_seconds'] * 1000:.0f} ms (best of {len(profile['import_seconds_runs'])})")
+    print("slowest imports (cumulative, as imported by the app):")
+    for m in profile["imports_by_package"]:
+        print(f"  {m['module']:<48} {m['cumulative_ms']:>9.1f} ms")
+    print("slowest modules (self time):")
+    for m in profile["imports_by_self_time"]:
+        print(f"  {m['module']:<48} {m['self_ms']:>9.1f} ms")
+    first = profile["first_request"]
+    print(f"first request: {first['request'] * 1000:.0f} ms after import, {first['total'] * 1000:.0f} ms from process start "
+          f"(status {first['status']})")
+    print("index load (cold process):")
+    for name, seconds in profile["index_load_seconds"].items():
+        error = profile["index_errors"].get(name)
+        print(f"  {name:<48} {seconds * 1000:>9.1f} ms{f'  ({error})' if error else ''}")
+
+if __name__ == "__main__":
+    if "--use-env" not in sys.argv[1:]:
+        scratch_environment()
+    profile = startup_profile(int(option("repeat", str(DEFAULT_REPEAT))))
+    print_profile(profile)
+
+    output: Optional[str] = option("output")
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(profile, f, indent=2)
+        print(f"Profile written to {output}")
+
+    budget = float(option("budget", str(DEFAULT_BUDGET)))
+    if profile["import_seconds"] > budget:
+        print(f"Import time {profile['import_seconds']:.3f}s exceeds the {budget:.3f}s budget")
+        sys.exit(1)
+    print(f"Import time within the {budget:.3f}s budget")
@@ -0,0 +1,79 @@
+import io
+from typing import Any, Dict, List, NamedTuple, Optional
+import numpy as np
+from PIL import Image
+
+API = "/api/v1"
+DEFAULT_MIX = {"list": 4, "image": 3, "upload": 1, "analyze": 1}
+IMAGE_WIDTHS = (64, 128, 256)
+
+class Call(NamedTuple):
+    # route is the path template, so results line up with /metrics and api_usage
+    route: str
+    method: str
+    url: str
+    files: Optional[List[Any]] = None
+
+def synthetic_xray(rng: np.random.Generator, size: int = 512) -> bytes:
+    # a smooth gradient plus noise compresses and decodes like a real radiograph, and every
+    # payload is distinct so uploads and analyses never hit the content-hash caches
+    y, x = np.mgrid[0:size, 0:size]
+    base = 96 + 64 * np.sin(x / size * np.pi) * np.cos(y / size * np.pi)
+    pixels = np.clip(base + rng.normal(0, 12, (size, size)), 0, 255).astype(np.uint8)
+    out = io.BytesIO()
+    Image.fromarray(pixels, "L").save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+def listing_call(rng: np.random.Generator) -> Call:
+    choice = int(rng.integers(3))
+    offset = int(rng.integers(0, 500))
+    if choice == 0:
+        return Call(f"GET {API}/datasets/chest-xray/samples", "GET", f"{API}/datasets/chest-xray/samples?limit=50&offset={offset}")
+    if choice == 1:
+        return Call(f"GET {API}/datasets/tiny-imagenet/classes", "GET", f"{API}/datasets/tiny-imagenet/classes?limit=50&offset={offset % 200}")
+    return Call(f"GET {API}/datasets/kitti/sequences", "GET", f"{API}/datasets/kitti/sequences")
+
+def image_call(rng: np.random.Generator, upload_ids: List[str]) -> Call:
+    upload_id = upload_ids[int(rng.integers(len(upload_ids)))]
+    width = IMAGE_WIDTHS[int(rng.integers(len(IMAGE_WIDTHS)))]
+    return Call(
+        f"GET {API}/images/upload/{{category}}/{{upload_id}}", "GET", f"{API}/images/upload/xray/{upload_id}?w={width}"
+    )
+
+def upload_call(rng: np.random.Generator) -> Call:
+    files = [("files", ("bench.jpg", synthetic_xray(rng), "image/jpeg"))]
+    return Call(f"POST {API}/upload/xray", "POST", f"{API}/upload/xray", files)
+
+def analyze_call(rng: np.random.Generator) -> Call:
+    files = [("files", ("bench.jpg", synthetic_xray(rng), "image/jpeg"))]
+    return Call(f"POST {API}/upload/xray/analyze", "POST", f"{API}/upload/xray/analyze", files)
+
+def parse_mix(spec: Optional[str]) -> Dict[str, int]:
+    # "list:4,image:3,upload:1,analyze:1"; omitted kinds are not exercised
+    if not spec:
+        return dict(DEFAULT_MIX)
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition(":")
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f"Unknown workload {kind!r}, expected one of {', '.join(DEFAULT_MIX)}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+def build_schedule(mix: Dict[str, int], count: int, seed: int, upload_ids: List[str]) -> List[Call]:
+    # payloads are generated up front from a fixed seed, so two runs send identical requests
+    # and image synthesis is never part of a measured latency
+    rng = np.random.default_rng(seed)
+    kinds = [kind for kind, weight in mix.items() if weight > 0]
+    weights = np.array([mix[kind] for kind in kinds], dtype=np.float64)
+    calls = []
+    for kind in rng.choice(kinds, size=count, p=weights / weights.sum()):
+        if kind == "list":
+            calls.append(listing_call(rng))
+        elif kind == "image":
+            calls.append(image_call(rng, upload_ids))
+        elif kind == "upload":
+            calls.append(upload_call(rng))
+        else:
+            calls.append(analyze_call(rng))
+    return calls
@@ -0,0 +1,135 @@
+import io
+import os
+import tempfile
+import zipfile
+import numpy as np
+import pytest
+from PIL import Image
+
+# settings are read once when app.core.config is imported, so the scratch tree is configured
+# before any test module imports the app
+ROOT = tempfile.mkdtemp(prefix="ml-explorer-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(ROOT, 'test.sqlite')}",
+    "ASYNC_DATABASE_URL": "",
+    "SECRET_KEY": "test-secret",
+    "UPLOAD_DIR": os.path.join(ROOT, "uploads"),
+    "INDEX_DIR": os.path.join(ROOT, "indexes"),
+    "CACHE_DIR": os.path.join(ROOT, "cache"),
+    "TILE_DIR": os.path.join(ROOT, "tiles"),
+    "CHEST_XRAY_DIR": os.path.join(ROOT, "chest_xray"),
+    "TINY_IMAGENET_ZIP": os.path.join(ROOT, "tiny-imagenet-200.zip"),
+    "KITTI_DIR": os.path.join(ROOT, "kitti"),
+    "TRANSCODE_WORKERS": "0",
+    "JOB_CONCURRENCY": "1",
+    "USAGE_FLUSH_INTERVAL": "3600",
+})
+
+# (split, label, width, height) of every generated chest X-ray
+CHEST_XRAY_IMAGES = (
+    ("train", "NORMAL", 300, 200),
+    ("train", "NORMAL", 320, 240),
+    ("train", "NORMAL", 640, 480),
+    ("train", "PNEUMONIA", 300, 200),
+    ("train", "PNEUMONIA", 800, 600),
+    ("test", "NORMAL", 1024, 768),
+    ("test", "PNEUMONIA", 300, 300),
+    ("test", "PNEUMONIA", 512, 512),
+)
+TINY_CLASSES = ("n01443537", "n01629819")
+TINY_IMAGES_PER_CLASS = 6
+KITTI_SEQUENCE = "sequence_00"
+KITTI_FRAMES = 10
+KITTI_POSES = 60
+
+def image_bytes(size=(64, 64), color=(128, 64, 32), fmt="JPEG", mode="RGB") -> bytes:
+    out = io.BytesIO()
+    Image.new(mode, size, color if mode == "RGB" else color[0]).save(out, fmt)
+    return out.getvalue()
+
+def gradient_image(width: int, height: int) -> Image.Image:
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    return Image.fromarray(((x[None, :] + y[:, None]) / 2).astype(np.uint8), "L")
+
+def build_chest_xray(root: str) -> None:
+    for i, (split, label, width, height) in enumerate(CHEST_XRAY_IMAGES):
+        directory = os.path.join(root, split, label)
+        os.makedirs(directory, exist_ok=True)
+        gradient_image(width, height).save(os.path.join(directory, f"img{i}.jpeg"), "JPEG")
+
+def build_tiny_imagenet(path: str) -> None:
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("tiny-imagenet-200/wnids.txt", "\n".join(TINY_CLASSES) + "\n")
+        archive.writestr("tiny-imagenet-200/words.txt", "n01443537\tgoldfish, Carassius auratus\nn01629819\tEuropean fire salamander\n")
+        annotations = []
+        for c, wnid in enumerate(TINY_CLASSES):
+            for i in range(TINY_IMAGES_PER_CLASS):
+                # alternate stored and deflated members, the reader handles both
+                archive.writestr(
+                    f"tiny-imagenet-200/train/{wnid}/images/{wnid}_{i}.JPEG",
+                    image_bytes(color=(c * 120, i * 40, 0)),
+                    compress_type=zipfile.ZIP_DEFLATED if i % 2 else zipfile.ZIP_STORED
+                )
+            archive.writestr(f"tiny-imagenet-200/val/images/val_{c}.JPEG", image_bytes(color=(0, 0, c * 120)))
+            annotations.append(f"val_{c}.JPEG\t{wnid}\t0\t0\t63\t63")
+        archive.writestr("tiny-imagenet-200/val/val_annotations.txt", "\n".join(annotations) + "\n")
+
+def write_kitti_stamps(path: str, seconds: np.ndarray) -> None:
+    base = np.datetime64("2011-09-26T13:02:25.000000000", "ns")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for offset in seconds:
+            f.write(str(base + np.timedelta64(int(round(offset * 1e9)), "ns")).replace("T", " ") + "\n")
+
+def build_kitti(root: str) -> None:
+    sequence = os.path.join(root, KITTI_SEQUENCE)
+    frames = np.arange(KITTI_FRAMES) * 0.1
+    write_kitti_stamps(os.path.join(sequence, "image_02", "timestamps.txt"), frames)
+    lidar = frames + 0.03
+    # Velodyne stamps are occasionally out of order in the raw recordings
+    lidar[[4, 5]] = lidar[[5, 4]]
+    write_kitti_stamps(os.path.join(sequence, "velodyne_points", "timestamps.txt"), lidar)
+    write_kitti_stamps(os.path.join(sequence, "oxts", "timestamps.txt"), np.arange(KITTI_POSES) * 0.1 + 0.006)
+
+    camera_dir = os.path.join(sequence, "image_02", "data")
+    os.makedirs(camera_dir, exist_ok=True)
+    for frame in range(2):
+        Image.new("RGB", (124, 38), (frame * 100, 80, 40)).save(os.path.join(camera_dir, f"{frame:010d}.png"))
+
+    velodyne_dir = os.path.join(sequence, "velodyne_points", "data")
+    os.makedirs(velodyne_dir, exist_ok=True)
+    rng = np.random.default_rng(0)
+    points = np.column_stack([
+        rng.uniform(-20, 20, 5000), rng.uniform(-20, 20, 5000), rng.uniform(-1.8, 0.5, 5000), rng.uniform(0, 1, 5000)
+    ]).astype(np.float32)
+    points.tofile(os.path.join(velodyne_dir, f"{0:010d}.bin"))
+
+    oxts_dir = os.path.join(sequence, "oxts", "data")
+    os.makedirs(oxts_dir, exist_ok=True)
+    t = np.arange(KITTI_POSES)
+    # a straight drive east followed by a turn north
+    lat = 49.011 + np.where(t < 30, 0.0, (t - 30) * 1e-4)
+    lon = 8.42 + np.minimum(t, 30) * 1e-4
+    for i in range(KITTI_POSES):
+        row = np.zeros(30)
+        row[0], row[1], row[2], row[5] = lat[i], lon[i], 112.9, 0.1 * i
+        np.savetxt(os.path.join(oxts_dir, f"{i:010d}.txt"), row[None], fmt="%.12g")
+
+@pytest.fixture(scope="session", autouse=True)
+def datasets():
+    build_chest_xray(os.environ["CHEST_XRAY_DIR"])
+    build_tiny_imagenet(os.environ["TINY_IMAGENET_ZIP"])
+    build_kitti(os.environ["KITTI_DIR"])
+    return ROOT
+
+@pytest.fixture(scope="session")
+def client(datasets):
+    from fastapi.testclient import TestClient
+    from app.db.base import Base, engine
+    from app.main import app
+    from app.models import dataset  # noqa: F401 - registers the tables on Base
+
+    Base.metadata.create_all(engine)
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,60 @@
+import httpx
+import pytest
+from benchmarks.run import compare, drive, summarize
+from benchmarks.workloads import DEFAULT_MIX, build_schedule, parse_mix
+
+def report(p50, p95, rps, total_rps=None):
+    stats = {"p50_ms": p50, "p95_ms": p95, "throughput_rps": rps}
+    return {"routes": {"GET /a": stats}, "total": {"throughput_rps": rps if total_rps is None else total_rps}}
+
+def test_compare_flags_latency_and_throughput_regressions():
+    baseline = report(10.0, 20.0, 100.0)
+    assert compare(report(10.5, 21.0, 95.0), baseline, 0.25) == []
+    assert compare(report(14.0, 20.0, 100.0), baseline, 0.25) == ["GET /a: p50_ms 10.00 -> 14.00"]
+    assert compare(report(10.0, 20.0, 60.0), baseline, 0.25) == [
+        "GET /a: throughput_rps 100.0 -> 60.0",
+        "total: throughput_rps 100.0 -> 60.0",
+    ]
+
+def test_compare_ignores_noise_and_unknown_routes():
+    # a 0.2 ms route doubling is below the noise floor
+    assert compare(report(0.4, 0.8, 100.0), report(0.2, 0.4, 100.0), 0.25) == []
+    current = {"routes": {}, "total": {"throughput_rps": 100.0}}
+    assert compare(current, report(10.0, 20.0, 100.0), 0.25) == []
+
+def test_parse_mix():
+    assert parse_mix(None) == DEFAULT_MIX
+    assert parse_mix("list:2,analyze") == {"list": 2, "analyze": 1}
+    with pytest.raises(ValueError, match="Unknown workload"):
+        parse_mix("list:2,delete:1")
+
+def test_schedules_are_reproducible():
+    mix = {"list": 2, "image": 1, "upload": 1}
+    first = build_schedule(mix, 40, 7, ["u1", "u2"])
+    second = build_schedule(mix, 40, 7, ["u1", "u2"])
+    assert first == second
+    assert first != build_schedule(mix, 40, 8, ["u1", "u2"])
+    assert {call.route.split(" ", 1)[0] for call in first} == {"GET", "POST"}
+    assert not any("analyze" in call.url for call in first)
+    # every upload carries its own payload, so the content-hash caches never short-circuit it
+    payloads = [call.files[0][1][1] for call in first if call.files]
+    assert len(payloads) == len(set(payloads)) > 0
+
+def test_samples_are_summarized_per_route(client):
+    from app.main import app
+
+    calls = build_schedule({"list": 1}, 12, 3, [])
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as bench:
+            return await drive(bench, calls, 4)
+
+    samples = client.portal.call(run)
+    summary = summarize(samples, 1.0)
+    assert summary["total"]["requests"] == 12
+    assert summary["total"]["errors"] == 0
+    assert set(summary["routes"]) == {call.route for call in calls}
+    assert sum(route["requests"] for route in summary["routes"].values()) == 12
+    for route in summary["routes"].values():
+        assert route["p50_ms"] <= route["p95_ms"] <= route["p99_ms"] <= route["max_ms"]
@@ -0,0 +1,48 @@
+import io
+import numpy as np
+from PIL import Image
+from app.services.bev_render import BACKGROUND, COLORMAP, HEIGHT_RANGE, grid_cells, render_bev
+from tests.conftest import KITTI_SEQUENCE
+
+LIDAR_URL = f"/api/v1/images/kitti/{KITTI_SEQUENCE}/lidar_000000"
+
+def scan(*rows):
+    return np.asarray(rows, dtype=np.float32)
+
+def test_forward_is_up_and_left_is_left():
+    points = scan([1.0, 0.0, 0, 0], [0.0, 0.3, 0, 0], [0.0, -0.3, 0, 0], [50.0, 0.0, 0, 0])
+    cells, inside = grid_cells(points, width=10, height=30, resolution=0.1)
+    assert inside.tolist() == [True, True, True, False]
+    assert [divmod(int(cell), 10) for cell in cells] == [(5, 5), (15, 2), (15, 8)]
+
+def test_channels_describe_each_cell():
+    points = scan([0.05, 0.05, -2.5, 0.2], [0.05, 0.05, 1.5, 0.6], [0.95, 0.05, -0.5, 1.0])
+    height = render_bev(points, 4, 4, 0.5, "height")
+    # the tallest return decides the cell colour
+    assert height[1, 1].tolist() == COLORMAP[255].tolist()
+    assert height[0, 1].tolist() == COLORMAP[int(2.0 / (HEIGHT_RANGE[1] - HEIGHT_RANGE[0]) * 255)].tolist()
+    assert height[3, 3].tolist() == list(BACKGROUND)
+
+    rgb = render_bev(points, 4, 4, 0.5, "rgb")
+    red, green, blue = rgb[1, 1].tolist()
+    assert red == 255
+    assert green == int(0.4 * 255)
+    assert blue > rgb[0, 1, 2] > 0
+    assert rgb[3, 3].tolist() == [0, 0, 0]
+
+def test_lidar_frames_render_as_rasters(client):
+    response = client.get(LIDAR_URL)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["X-BEV-Channel"] == "height"
+    assert Image.open(io.BytesIO(response.content)).size == (600, 400)
+
+    small = client.get(LIDAR_URL, params={"w": 200, "h": 100, "format": "webp", "channel": "rgb", "resolution": 0.4})
+    assert small.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(small.content)).size == (200, 100)
+    assert small.headers["X-BEV-Resolution"] == "0.4"
+    assert small.headers["ETag"] != response.headers["ETag"]
+
+def test_unknown_channel_is_rejected(client):
+    assert client.get(LIDAR_URL, params={"channel": "colour"}).status_code == 400
+    assert client.get(LIDAR_URL, params={"resolution": 0}).status_code == 422
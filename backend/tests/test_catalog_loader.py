@@ -0,0 +1,99 @@
+import os
+from PIL import Image as PILImage
+from app.db.base import SessionLocal
+from app.models.dataset import Image
+from app.services import catalog_loader
+from app.services.catalog import dataset_uuid
+from app.services.catalog_loader import load_catalog
+from app.services.facets import invalidate_image_table_facets
+from app.services.image_statistics import SOURCES, update_dataset_statistics
+from tests.conftest import TINY_CLASSES, TINY_IMAGES_PER_CLASS
+
+def test_reruns_skip_catalogued_images(client):
+    assert load_catalog("chest-xray", batch_size=3) == {"dataset": "chest-xray", "inserted": 8, "skipped": 0}
+    assert load_catalog("chest-xray", batch_size=3) == {"dataset": "chest-xray", "inserted": 0, "skipped": 8}
+
+def test_rows_skipped_by_the_unique_index_are_not_counted_as_inserted(client, monkeypatch):
+    load_catalog("chest-xray")
+    dataset_id = dataset_uuid("chest-xray")
+    with SessionLocal() as db:
+        db.query(Image).filter(Image.dataset_id == dataset_id).delete()
+        db.commit()
+    rows = catalog_loader.chest_xray_rows
+
+    def twice():
+        # stands in for a concurrent load committing the same files after the existing paths were read
+        for row in rows():
+            yield row
+            yield dict(row)
+
+    monkeypatch.setitem(catalog_loader.LOADERS, "chest-xray", twice)
+    try:
+        assert load_catalog("chest-xray", batch_size=5) == {"dataset": "chest-xray", "inserted": 8, "skipped": 8}
+    finally:
+        invalidate_image_table_facets(dataset_id)
+
+def test_images_route_pages_and_facets_the_table(client):
+    load_catalog("chest-xray")
+    url = "/api/v1/datasets/chest-xray/images"
+    body = client.get(url, params={"limit": 5}).json()
+    assert body["total"] == 8
+    assert body["facets"]["category"] == {"Normal": 4, "Pneumonia": 4}
+    assert body["facets"]["mime_type"] == {"image/jpeg": 8}
+
+    rest = client.get(url, params={"cursor": body["next_cursor"]}).json()
+    ids = [image["id"] for image in body["images"] + rest["images"]]
+    assert len(set(ids)) == 8
+    assert rest["next_cursor"] is None
+
+    filtered = client.get(url, params={"split": "test", "min_width": 500}).json()
+    assert sorted(image["filename"] for image in filtered["images"]) == ["img5.jpeg", "img7.jpeg"]
+    assert all(image["metadata"]["split"] == "test" for image in filtered["images"])
+    assert client.get("/api/v1/datasets/mnist/images").status_code == 404
+
+def test_deleted_rows_drop_out_once_the_facets_are_invalidated(client):
+    load_catalog("chest-xray")
+    url = "/api/v1/datasets/chest-xray/images"
+    assert client.get(url).json()["total"] == 8
+    with SessionLocal() as db:
+        db.query(Image).filter(Image.dataset_id == dataset_uuid("chest-xray"), Image.filename == "img1.jpeg").delete()
+        db.commit()
+    try:
+        invalidate_image_table_facets(dataset_uuid("chest-xray"))
+        body = client.get(url).json()
+        assert body["total"] == 7
+        assert "img1.jpeg" not in {image["filename"] for image in body["images"]}
+    finally:
+        load_catalog("chest-xray")
+        invalidate_image_table_facets(dataset_uuid("chest-xray"))
+
+def test_new_rows_show_up_without_a_restart(client):
+    url = "/api/v1/datasets/tiny-imagenet/images"
+    load_catalog("tiny-imagenet")
+    assert client.get(url).json()["total"] == len(TINY_CLASSES) * (TINY_IMAGES_PER_CLASS + 1)
+    assert client.get("/api/v1/datasets/kitti/images").json()["total"] == 0
+    load_catalog("kitti")
+    kitti = client.get("/api/v1/datasets/kitti/images").json()
+    assert kitti["total"] == 2
+    assert kitti["facets"]["category"] == {"image_02": 2}
+    assert {image["width"] for image in kitti["images"]} == {124}
+    val = client.get(url, params={"split": "val"}).json()
+    assert sorted(image["metadata"]["category"] for image in val["images"]) == sorted(TINY_CLASSES)
+
+def test_catalogued_images_are_merged_into_the_statistics(client, tmp_path, monkeypatch):
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / f"{i:010d}.png"))
+        PILImage.new("RGB", (30 + i, 20), (i, 2 * i, 3 * i)).save(paths[-1])
+    rows = lambda: (
+        {"filename": os.path.basename(path), "file_path": path, "file_size": os.path.getsize(path),
+         "mime_type": "image/png", "width": 30 + i, "height": 20, "metadata": {"category": "image_03"}}
+        for i, path in enumerate(paths)
+    )
+    monkeypatch.setitem(catalog_loader.LOADERS, "kitti", rows)
+    monkeypatch.setitem(SOURCES, "kitti", lambda: [(path, path) for path in paths])
+
+    assert load_catalog("kitti")["inserted"] == 3
+    # the load already scanned what it registered
+    assert update_dataset_statistics("kitti", workers=1) == {"dataset": "kitti", "scanned": 0, "images": 3}
+    assert load_catalog("kitti")["inserted"] == 0
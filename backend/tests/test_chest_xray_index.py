@@ -0,0 +1,73 @@
+import os
+import threading
+import numpy as np
+from app.services.chest_xray_index import ChestXrayIndex, build_chest_xray_index, get_chest_xray_index
+from tests.conftest import CHEST_XRAY_IMAGES
+
+def test_index_columns_match_the_tree(tmp_path):
+    build_chest_xray_index(os.environ["CHEST_XRAY_DIR"], str(tmp_path / "chest_xray"))
+    index = ChestXrayIndex.load(str(tmp_path / "chest_xray"))
+
+    assert index.total == len(CHEST_XRAY_IMAGES)
+    # rows are ordered by split, then label, then file name
+    assert [index.names[row] for row in range(index.total)] == [
+        f"{split}/{label}/img{i}.jpeg" for i, (split, label, _, _) in enumerate(CHEST_XRAY_IMAGES)
+    ]
+    assert index.width.tolist() == [width for _, _, width, _ in CHEST_XRAY_IMAGES]
+    assert index.height.tolist() == [height for _, _, _, height in CHEST_XRAY_IMAGES]
+    assert isinstance(index.size, np.memmap)
+
+def test_statistics_and_categories_derive_from_the_counts():
+    index = get_chest_xray_index()
+    statistics = index.statistics()
+
+    assert statistics["total_images"] == 8
+    assert statistics["normal_cases"] == 4
+    assert statistics["pneumonia_cases"] == 4
+    assert statistics["splits"]["train"] == {"total": 5, "normal": 3, "pneumonia": 2}
+    assert statistics["splits"]["val"] == {"total": 0, "normal": 0, "pneumonia": 0}
+    assert statistics["min_width"] == 300 and statistics["max_width"] == 1024
+    assert [c["percentage"] for c in index.categories()] == [50.0, 50.0]
+
+def test_image_ids_round_trip_to_rows():
+    index = get_chest_xray_index()
+
+    assert index.row_for_id(index.image_id(3)) == 3
+    assert index.row_for_id("chest_xray_0") is None
+    assert index.row_for_id("chest_xray_9") is None
+    assert index.row_for_id("tiny_1") is None
+    assert [s["id"] for s in index.page(6, 10)] == ["chest_xray_7", "chest_xray_8"]
+
+def test_endpoints_serve_the_index(client):
+    samples = client.get("/api/v1/datasets/chest-xray/samples", params={"limit": 3}).json()
+    assert samples["total"] == 8
+    assert [s["filename"] for s in samples["samples"]] == ["img0.jpeg", "img1.jpeg", "img2.jpeg"]
+
+    statistics = client.get("/api/v1/datasets/chest-xray/statistics").json()
+    assert statistics["total_images"] == 8
+
+    image = client.get("/api/v1/images/chest-xray/chest_xray_1")
+    assert image.status_code == 200
+    assert image.headers["content-type"] == "image/jpeg"
+    assert client.get("/api/v1/images/chest-xray/chest_xray_99").status_code == 404
+
+def test_first_request_builds_the_index_off_the_event_loop(client, monkeypatch, tmp_path):
+    from app.services import chest_xray_index
+
+    threads = []
+
+    def build(root, path):
+        threads.append(threading.get_ident())
+        build_chest_xray_index(root, path)
+
+    monkeypatch.setattr(chest_xray_index, "chest_xray_index_path", lambda: str(tmp_path / "chest_xray"))
+    monkeypatch.setattr(chest_xray_index, "build_chest_xray_index", build)
+    loop_thread = client.portal.call(threading.get_ident)
+
+    response = client.get("/api/v1/datasets/chest-xray/categories")
+    assert response.status_code == 200
+    assert sum(c["count"] for c in response.json()["categories"]) == len(CHEST_XRAY_IMAGES)
+    assert len(threads) == 1 and threads[0] != loop_thread
+    # later requests map the published version without building again
+    client.get("/api/v1/datasets/chest-xray/categories")
+    assert len(threads) == 1
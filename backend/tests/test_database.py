@@ -0,0 +1,32 @@
+import pytest
+from app.core.config import settings
+from app.db.base import MeteredPool, _async_engine_options, async_database_url, async_engine
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./ml.db", "sqlite+aiosqlite:///./ml.db"),
+    ("postgresql://user:s3cret@db:5432/ml", "postgresql+asyncpg://user:s3cret@db:5432/ml"),
+    ("postgresql+psycopg2://user@db/ml", "postgresql+asyncpg://user@db/ml"),
+    ("postgresql+asyncpg://user@db/ml", "postgresql+asyncpg://user@db/ml"),
+    ("mysql+pymysql://user@db/ml", "mysql+pymysql://user@db/ml"),
+])
+def test_sync_urls_map_to_async_drivers(url, expected):
+    assert async_database_url(url) == expected
+
+def test_engine_options_follow_the_settings():
+    options = _async_engine_options("postgresql+asyncpg://user@db/ml")
+    assert options["poolclass"] is MeteredPool
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["connect_args"] == {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    assert "connect_args" not in _async_engine_options("sqlite+aiosqlite:///./ml.db")
+    assert async_engine.url.drivername == "sqlite+aiosqlite"
+
+def test_pool_checkouts_are_reported(client):
+    before = client.get("/health/db").json()
+    for _ in range(3):
+        assert client.get("/api/v1/datasets/chest-xray/images").status_code == 200
+    after = client.get("/health/db").json()
+    assert after["checkouts"] >= before["checkouts"] + 3
+    # every session went back to the pool when its request finished
+    assert after["checked_out"] == 0
+    assert after["waiting"] == 0
+    assert after["timeouts"] == before["timeouts"]
@@ -0,0 +1,7 @@
+def test_dataset_list_is_served(client):
+    response = client.get("/api/v1/datasets/")
+    assert response.status_code == 200
+    datasets = {dataset["id"]: dataset for dataset in response.json()["datasets"]}
+    assert list(datasets) == ["chest-xray", "tiny-imagenet", "kitti"]
+    assert datasets["chest-xray"]["categories"] == ["Normal", "Pneumonia"]
+    assert datasets["kitti"]["data_types"] == ["Camera", "LIDAR", "GPS"]
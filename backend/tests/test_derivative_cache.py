@@ -0,0 +1,89 @@
+from app.services.derivative_cache import CacheEntry, DerivativeCache, derivative_key
+
+def entry(size: int, fill: bytes = b"x") -> CacheEntry:
+    return CacheEntry(fill * size, "image/png", {"X-Test": "1"})
+
+def test_keys_ignore_parameter_order_but_not_values():
+    key = derivative_key("abc", {"width": 100, "fmt": "webp"})
+    assert key == derivative_key("abc", {"fmt": "webp", "width": 100})
+    assert key != derivative_key("abc", {"fmt": "webp", "width": 101})
+    assert key != derivative_key("abd", {"fmt": "webp", "width": 100})
+
+def test_hot_tier_evicts_least_recently_used_and_falls_back_to_disk(tmp_path):
+    cache = DerivativeCache(str(tmp_path), max_bytes=1 << 20, hot_max_bytes=250)
+    cache.put("aa01", entry(100))
+    cache.put("aa02", entry(100))
+    assert cache.get("aa01") is not None
+    cache.put("aa03", entry(100))
+
+    stats = cache.stats()
+    assert stats["hot_evictions"] == 1
+    assert stats["hot_entries"] == 2
+    # aa02 was the least recently used, so it now comes from disk
+    assert cache.get("aa02") == entry(100)
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("ffff") is None
+    assert cache.stats()["misses"] == 1
+
+def test_disk_tier_is_bounded_and_survives_a_restart(tmp_path):
+    cache = DerivativeCache(str(tmp_path), max_bytes=700, hot_max_bytes=0)
+    for i in range(5):
+        cache.put(f"bb{i:02d}", entry(200, bytes([65 + i])))
+
+    assert cache.stats()["disk_bytes"] <= 700
+    assert cache.get("bb00") is None
+    assert cache.get("bb04") == entry(200, b"E")
+
+    reopened = DerivativeCache(str(tmp_path), max_bytes=700, hot_max_bytes=0)
+    assert reopened.stats()["disk_entries"] == cache.stats()["disk_entries"]
+    assert reopened.get("bb04") == entry(200, b"E")
+
+def test_matching_if_none_match_returns_304_without_a_body(client):
+    url = "/api/v1/images/chest-xray/chest_xray_2"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"]
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        cached = client.get(url, headers={"If-None-Match": header})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers["ETag"] == etag
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+def test_etag_changes_with_the_transform(client):
+    url = "/api/v1/images/chest-xray/chest_xray_2"
+    original = client.get(url).headers["ETag"]
+    resized = client.get(url, params={"w": 64}).headers["ETag"]
+    assert original != resized
+    assert client.get(url, params={"w": 64}, headers={"If-None-Match": original}).status_code == 200
+
+def test_repeated_renders_are_served_from_the_cache(client):
+    url = "/api/v1/images/chest-xray/chest_xray_3"
+    before = client.get("/api/v1/images/cache/stats").json()
+    assert client.get(url, params={"w": 50}).content == client.get(url, params={"w": 50}).content
+    after = client.get("/api/v1/images/cache/stats").json()
+    assert after["stores"] == before["stores"] + 1
+    assert after["hot_hits"] == before["hot_hits"] + 1
+
+def test_workers_sharing_a_directory_share_one_budget(tmp_path):
+    first = DerivativeCache(str(tmp_path), max_bytes=700, hot_max_bytes=0, scan_interval=0)
+    second = DerivativeCache(str(tmp_path), max_bytes=700, hot_max_bytes=0, scan_interval=0)
+    for i in range(3):
+        first.put(f"cc{i:02d}", entry(200))
+        second.put(f"dd{i:02d}", entry(200))
+
+    on_disk = sum(f.stat().st_size for f in tmp_path.glob("*/*"))
+    assert on_disk <= 700
+    # an entry written by one worker is a disk hit for the other
+    assert first.get("dd02") == entry(200)
+
+def test_originals_are_not_copied_into_the_cache(client):
+    url = "/api/v1/images/chest-xray/chest_xray_4"
+    before = client.get("/api/v1/images/cache/stats").json()
+    response = client.get(url)
+    assert response.status_code == 200
+    assert client.get(url, headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+    after = client.get("/api/v1/images/cache/stats").json()
+    assert after["stores"] == before["stores"]
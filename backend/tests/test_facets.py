@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from app.services.facets import FacetIndex, UnknownFacet
+
+def sample_index():
+    index = FacetIndex(("color", "shape"), ("size",))
+    index.append(
+        {"color": ["red", "blue", "red", None], "shape": ["round", "round", "square", "square"]},
+        {"size": [1.0, 5.0, 10.0, None]}
+    )
+    # a later batch may introduce values the earlier rows never had
+    index.append({"color": ["green", "red"], "shape": ["round", "round"]}, {"size": [7.0, 3.0]})
+    return index
+
+def test_appended_batches_extend_codes_and_bitmaps():
+    index = sample_index()
+    assert index.size == 6
+    assert index.vocab["color"] == ["red", "blue", "unknown", "green"]
+    assert [bitmap.tolist() for bitmap in index.bitmaps["color"]][3] == [False] * 4 + [True, False]
+    assert all(len(bitmap) == 6 for bitmaps in index.bitmaps.values() for bitmap in bitmaps)
+
+def test_each_facet_is_counted_without_its_own_filter():
+    rows, facets = sample_index().query({"color": ["red"], "shape": ["round"]}, {})
+    assert rows.tolist() == [0, 5]
+    # colour counts apply the shape filter only, and shape counts the colour filter only
+    assert facets["color"] == {"red": 2, "blue": 1, "unknown": 0, "green": 1}
+    assert facets["shape"] == {"round": 2, "square": 1}
+
+def test_ranges_apply_to_every_count_and_skip_missing_values():
+    rows, facets = sample_index().query({"color": ["red", "green"]}, {"size": (3.0, None)})
+    assert rows.tolist() == [2, 4, 5]
+    assert facets["color"] == {"red": 2, "blue": 1, "unknown": 0, "green": 1}
+    rows, _ = sample_index().query({"color": ["purple"]}, {})
+    assert len(rows) == 0
+    rows, _ = sample_index().query({}, {"size": (None, None)})
+    assert np.array_equal(rows, np.arange(6))
+
+def test_filters_on_columns_the_index_lacks_are_rejected():
+    with pytest.raises(UnknownFacet, match="material"):
+        sample_index().query({"material": ["wood"]}, {})
+    with pytest.raises(UnknownFacet, match="weight"):
+        sample_index().query({}, {"weight": (1.0, 2.0)})
+
+def test_sample_listing_returns_facet_counts(client):
+    body = client.get("/api/v1/datasets/chest-xray/samples", params={"category": "Pneumonia"}).json()
+    assert body["total"] == 4
+    assert {sample["category"] for sample in body["samples"]} == {"Pneumonia"}
+    assert body["facets"]["category"] == {"Normal": 4, "Pneumonia": 4}
+    assert body["facets"]["split"]["train"] == 2 and body["facets"]["split"]["test"] == 2
+
+    wide = client.get(
+        "/api/v1/datasets/chest-xray/samples", params={"min_width": 500, "split": ["train", "val"]}
+    ).json()
+    assert [sample["filename"] for sample in wide["samples"]] == ["img2.jpeg", "img4.jpeg"]
+    assert wide["facets"]["split"]["test"] == 2
+
+def test_sample_listing_rejects_a_facet_the_index_lacks(client):
+    response = client.get("/api/v1/datasets/chest-xray/samples", params={"mime_type": "image/png"})
+    assert response.status_code == 400
+    assert "mime_type" in response.json()["detail"]
@@ -0,0 +1,128 @@
+import fcntl
+import os
+import threading
+import time
+import pytest
+from app.core.config import settings
+from app.services.frame_container import (
+    ContainerError, FrameContainer, container_path, frame_containers, read_container_index
+)
+from tests.conftest import image_bytes
+
+def frame_files(count, seed):
+    return [
+        ("files", (f"frame{seed}_{i}.png", image_bytes((16 + i, 12), color=(seed, i, 0), fmt="PNG"), "image/png"))
+        for i in range(count)
+    ]
+
+def payloads(files):
+    return [content for _, (_, content, _) in files]
+
+def test_frames_are_appended_without_rewriting_earlier_bytes(client):
+    first, second = frame_files(3, 1), frame_files(2, 2)
+    created = client.post("/api/v1/upload/traffic/sequence", files=first, data={"frame_interval": "0.5"}).json()
+    sequence_id = created["sequence_id"]
+    path = container_path(sequence_id)
+    with open(path, "rb") as f:
+        original = f.read()
+
+    appended = client.post(f"/api/v1/upload/traffic/sequence/{sequence_id}", files=second, data={"timestamps": "9,9.25"})
+    assert appended.json()["frame_count"] == 5
+    with open(path, "rb") as f:
+        assert f.read().startswith(original)
+
+    container = FrameContainer(path)
+    try:
+        assert container.index["timestamp"].tolist() == [0.0, 0.5, 1.0, 9.0, 9.25]
+        # frames 2 and 3 come from different writes, with the first index in between
+        assert container.read_range(1, 4) == b"".join(payloads(first)[1:] + payloads(second)[:1])
+        assert [container.read_frame(i) for i in range(5)] == payloads(first) + payloads(second)
+    finally:
+        container.close()
+
+def test_range_and_frame_routes(client):
+    files = frame_files(4, 3)
+    sequence_id = client.post("/api/v1/upload/traffic/sequence", files=files).json()["sequence_id"]
+
+    response = client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}/frames", params={"start": 1, "stop": 3})
+    assert response.content == b"".join(payloads(files)[1:3])
+    assert response.headers["X-Frame-Lengths"] == ",".join(str(len(p)) for p in payloads(files)[1:3])
+    assert response.headers["X-Frame-Total"] == "4"
+    assert client.get(
+        f"/api/v1/upload/traffic/sequence/{sequence_id}/frames", params={"start": 4}
+    ).status_code == 416
+
+    frame = client.get(f"/api/v1/images/traffic-sequence/{sequence_id}/2")
+    assert frame.content == payloads(files)[2]
+    assert frame.headers["content-type"] == "image/png"
+    assert client.get(f"/api/v1/images/traffic-sequence/{sequence_id}/4").status_code == 404
+
+def test_failed_append_leaves_the_container_unchanged(client, monkeypatch):
+    sequence_id = client.post("/api/v1/upload/traffic/sequence", files=frame_files(2, 4)).json()["sequence_id"]
+    path = container_path(sequence_id)
+    with open(path, "rb") as f:
+        original = f.read()
+
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 1000)
+    files = frame_files(1, 5) + [("files", ("large.png", os.urandom(2000), "image/png"))]
+    assert client.post(f"/api/v1/upload/traffic/sequence/{sequence_id}", files=files).status_code == 413
+    bad_timestamps = {"timestamps": "1,2"}
+    assert client.post(
+        f"/api/v1/upload/traffic/sequence/{sequence_id}", files=frame_files(1, 6), data=bad_timestamps
+    ).status_code == 400
+    with open(path, "rb") as f:
+        assert f.read() == original
+    assert client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}").json()["frame_count"] == 2
+
+def test_truncated_container_is_rejected(tmp_path):
+    path = tmp_path / "broken.frames"
+    path.write_bytes(b"MLFRAMES" + bytes(40))
+    with open(path, "rb") as f, pytest.raises(ContainerError):
+        read_container_index(f)
+
+def test_reads_during_an_append_keep_the_last_valid_index(client):
+    files = frame_files(2, 7)
+    sequence_id = client.post("/api/v1/upload/traffic/sequence", files=files).json()["sequence_id"]
+    assert client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}").json()["frame_count"] == 2
+    path = container_path(sequence_id)
+    end = os.path.getsize(path)
+    # frames of an append that has not written its index and trailer yet
+    with open(path, "ab") as f:
+        f.write(os.urandom(500))
+    try:
+        assert client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}").json()["frame_count"] == 2
+        assert client.get(f"/api/v1/images/traffic-sequence/{sequence_id}/1").content == payloads(files)[1]
+        frames = client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}/frames")
+        assert frames.content == b"".join(payloads(files))
+
+        # a worker that never loaded this sequence has nothing valid to serve yet
+        frame_containers._open.pop(sequence_id)
+        response = client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert client.get(f"/api/v1/images/traffic-sequence/{sequence_id}/0").status_code == 503
+    finally:
+        os.truncate(path, end)
+    assert client.get(f"/api/v1/upload/traffic/sequence/{sequence_id}").json()["frame_count"] == 2
+
+def test_appends_wait_for_the_container_file_lock(client):
+    sequence_id = client.post("/api/v1/upload/traffic/sequence", files=frame_files(1, 8)).json()["sequence_id"]
+    path = container_path(sequence_id)
+    lock_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.lock")
+    result = {}
+
+    def append():
+        result["response"] = client.post(f"/api/v1/upload/traffic/sequence/{sequence_id}", files=frame_files(2, 9))
+
+    # another worker process holds the lock through its own file description
+    with open(lock_path, "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        size = os.path.getsize(path)
+        thread = threading.Thread(target=append)
+        thread.start()
+        time.sleep(0.3)
+        assert thread.is_alive()
+        assert os.path.getsize(path) == size
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    thread.join(timeout=10)
+    assert result["response"].json()["frame_count"] == 3
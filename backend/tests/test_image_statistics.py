@@ -0,0 +1,112 @@
+import os
+import numpy as np
+from PIL import Image
+from app.core.config import settings
+from app.services.chest_xray_index import get_chest_xray_index
+from app.services.image_statistics import SOURCES, ImageStats, invalidate_statistics, update_dataset_statistics
+from tests.conftest import image_bytes
+from tests.test_jobs import wait_for
+
+def random_image(seed, size, mode="RGB"):
+    rng = np.random.default_rng(seed)
+    shape = (size[1], size[0], 3) if mode == "RGB" else (size[1], size[0])
+    return Image.fromarray(rng.integers(0, 256, shape, dtype=np.uint8), mode)
+
+def pixels(img):
+    return np.asarray(img.convert("RGB"), dtype=np.float64).reshape(-1, 3)
+
+IMAGES = [random_image(i, (20 + 7 * i, 11 + 3 * i), "L" if i == 2 else "RGB") for i in range(6)]
+
+def test_merged_partials_match_a_one_shot_mean_and_std():
+    merged = ImageStats()
+    for part in (IMAGES[:1], IMAGES[1:4], IMAGES[4:]):
+        stats = ImageStats()
+        for img in part:
+            stats.add_image(img, 100)
+        merged.merge(ImageStats.from_dict(stats.to_dict()))
+
+    everything = np.concatenate([pixels(img) for img in IMAGES])
+    summary = merged.summary()
+    np.testing.assert_allclose(summary["mean"], everything.mean(axis=0) / 255.0, atol=1e-6)
+    np.testing.assert_allclose(summary["std"], everything.std(axis=0) / 255.0, atol=1e-6)
+    assert (summary["images"], summary["pixels"], summary["total_bytes"]) == (6, len(everything), 600)
+    assert summary["color_modes"] == {"RGB": 5, "L": 1}
+    assert sum(summary["intensity_histogram"]) == len(everything)
+    assert summary["width_distribution"]["<=64"] == 6
+
+def test_merging_an_empty_partial_changes_nothing():
+    stats = ImageStats()
+    stats.add_image(IMAGES[0], 1)
+    before = stats.summary()
+    stats.merge(ImageStats())
+    after = stats.summary()
+    assert (after["mean"], after["std"], after["images"]) == (before["mean"], before["std"], before["images"])
+
+def test_updates_only_scan_new_images(client, tmp_path, monkeypatch):
+    paths = []
+    for i, img in enumerate(IMAGES):
+        paths.append(str(tmp_path / f"img{i}.png"))
+        img.save(paths[-1])
+    items = paths[:4]
+    monkeypatch.setitem(SOURCES, "kitti", lambda: [(path, path) for path in items])
+
+    assert update_dataset_statistics("kitti", workers=1)["scanned"] == 4
+    assert update_dataset_statistics("kitti", workers=1)["scanned"] == 0
+    items = paths[:5]
+    assert update_dataset_statistics("kitti", workers=1) == {"dataset": "kitti", "scanned": 1, "images": 5}
+    # a removed file cannot be subtracted, so the scan starts over
+    items = paths[1:5]
+    assert update_dataset_statistics("kitti", workers=1) == {"dataset": "kitti", "scanned": 4, "images": 4}
+    assert update_dataset_statistics("kitti", workers=1, full=True)["scanned"] == 4
+
+def test_statistics_endpoint_reports_the_scan(client):
+    update_dataset_statistics("chest-xray", workers=1)
+    statistics = client.get("/api/v1/datasets/chest-xray/statistics").json()["image_statistics"]
+    assert statistics["images"] == 8
+    assert statistics["color_modes"] == {"L": 8}
+    # greyscale images carry the same value in every channel
+    assert len(set(statistics["mean"])) == 1
+
+def test_statistics_endpoint_reads_the_column_once_per_interval(client, monkeypatch):
+    update_dataset_statistics("tiny-imagenet", workers=1)
+    url = "/api/v1/datasets/tiny-imagenet/statistics"
+    first = client.get(url).json()["image_statistics"]
+    checkouts = client.get("/health/db").json()["checkouts"]
+    for _ in range(3):
+        assert client.get(url).json()["image_statistics"] == first
+    assert client.get("/health/db").json()["checkouts"] == checkouts
+
+    # with no reuse window every request goes back to the database
+    monkeypatch.setattr(settings, "STATISTICS_CACHE_SECONDS", 0)
+    invalidate_statistics("tiny-imagenet")
+    client.get(url)
+    client.get(url)
+    assert client.get("/health/db").json()["checkouts"] == checkouts + 2
+
+def test_a_file_replaced_under_the_same_name_is_rescanned(client):
+    update_dataset_statistics("chest-xray", workers=1)
+    assert update_dataset_statistics("chest-xray", workers=1)["scanned"] == 0
+    path = get_chest_xray_index().path(0)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    try:
+        assert update_dataset_statistics("chest-xray", workers=1)["scanned"] == 8
+    finally:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+def test_completed_xray_uploads_are_merged_without_a_scan(client):
+    update_dataset_statistics("chest-xray", workers=1)
+    url = "/api/v1/datasets/chest-xray/statistics"
+    before = client.get(url).json()["image_statistics"]
+    files = [("files", ("merged.png", image_bytes((33, 21), color=(9, 90, 200), fmt="PNG"), "image/png"))]
+    response = client.post("/api/v1/upload/xray", files=files).json()
+    wait_for(client, response["job_id"])
+
+    after = client.get(url).json()["image_statistics"]
+    assert after["images"] == before["images"] + 1
+    assert after["color_modes"] == {**before["color_modes"], "RGB": 1}
+    # the upload is already in the processed keys, so a full update has nothing left to read
+    assert update_dataset_statistics("chest-xray", workers=1) == {
+        "dataset": "chest-xray", "scanned": 0, "images": before["images"] + 1
+    }
+    assert client.delete(f"/api/v1/upload/xray/{response['uploads'][0]['upload_id']}").status_code == 200
@@ -0,0 +1,87 @@
+import os
+import numpy as np
+import pytest
+from app.services.index_store import (
+    CURRENT_FILE, VERSIONS_DIR, PackedStrings, index_stamp, pack_strings, prune_versions, read_index, read_meta,
+    staged_directory, write_index, write_meta
+)
+
+def versions(path):
+    return sorted(os.listdir(os.path.join(path, VERSIONS_DIR)))
+
+def current(path):
+    with open(os.path.join(path, CURRENT_FILE)) as f:
+        return f.read()
+
+def test_each_write_publishes_a_new_version_through_current(tmp_path):
+    path = str(tmp_path / "index")
+    first = write_index(path, {"values": np.arange(3)}, {"count": 3})
+    stamp = index_stamp(path)
+    second = write_index(path, {"values": np.arange(5)}, {"count": 5})
+
+    assert second > first
+    assert current(path) == second
+    assert index_stamp(path) != stamp
+    columns, meta = read_index(path)
+    assert columns["values"].tolist() == list(range(5))
+    assert meta == {"count": 5, "index_version": second}
+    assert read_meta(path)["count"] == 5
+
+def test_old_versions_are_pruned_but_stay_readable_while_mapped(tmp_path):
+    path = str(tmp_path / "index")
+    first = write_index(path, {"values": np.full(4, 1)}, {})
+    mapped, _ = read_index(path)
+    second = write_index(path, {"values": np.full(4, 2)}, {})
+    assert versions(path) == [first, second]
+
+    third = write_index(path, {"values": np.full(4, 3)}, {})
+    # the previous version is kept for readers that saw CURRENT just before the swap
+    assert versions(path) == [second, third]
+    # a worker that mapped the pruned version keeps reading its own pages
+    assert mapped["values"].tolist() == [1, 1, 1, 1]
+    assert sorted(os.listdir(path)) == [CURRENT_FILE, VERSIONS_DIR]
+
+def test_prune_never_removes_the_current_version(tmp_path):
+    path = str(tmp_path / "index")
+    names = [write_index(path, {"values": np.arange(i + 1)}, {}) for i in range(2)]
+    # point CURRENT back at the older version, as a rollback would
+    with open(os.path.join(path, CURRENT_FILE), "w") as f:
+        f.write(names[0])
+    prune_versions(path, keep=1)
+    assert versions(path) == names
+    prune_versions(path, keep=0)
+    assert versions(path) == [names[0]]
+    assert read_index(path)[0]["values"].tolist() == [0]
+
+def test_legacy_layout_is_read_then_replaced(tmp_path):
+    path = tmp_path / "index"
+    path.mkdir()
+    np.save(path / "values.npy", np.arange(2))
+    write_meta(str(path), {"count": 2})
+    assert read_index(str(path))[0]["values"].tolist() == [0, 1]
+    assert index_stamp(str(path)) is not None
+
+    write_index(str(path), {"values": np.arange(6)}, {"count": 6})
+    assert sorted(os.listdir(path)) == [CURRENT_FILE, VERSIONS_DIR]
+    assert read_meta(str(path))["count"] == 6
+
+def test_missing_index_and_failed_builds(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_index(str(tmp_path / "missing"))
+    assert index_stamp(str(tmp_path / "missing")) is None
+
+    target = tmp_path / "staged"
+    with pytest.raises(RuntimeError):
+        with staged_directory(str(target)) as tmp:
+            open(os.path.join(tmp, "partial"), "w").close()
+            raise RuntimeError("build failed")
+    assert os.listdir(tmp_path) == []
+
+def test_packed_strings():
+    strings = PackedStrings(*pack_strings(["a", "", "héllo", "z"]))
+    assert len(strings) == 4
+    assert [strings[i] for i in range(4)] == ["a", "", "héllo", "z"]
+    assert strings[-1] == "z"
+    assert strings.slice(2, 10) == ["héllo", "z"]
+    with pytest.raises(IndexError):
+        strings[4]
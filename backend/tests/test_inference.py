@@ -0,0 +1,76 @@
+import asyncio
+import numpy as np
+from app.services.inference import InferenceEngine, ReferencePneumoniaModel, preprocess_xray
+from tests.conftest import image_bytes
+
+def scans(count):
+    return [image_bytes((80 + 8 * i, 60), color=(20 * i, 20 * i, 20 * i)) for i in range(count)]
+
+def test_concurrent_requests_fold_into_one_batch():
+    model = ReferencePneumoniaModel()
+    engine = InferenceEngine(model, max_batch=8, max_wait_ms=50, cache_size=16)
+    sources = scans(5)
+
+    async def run():
+        try:
+            return await asyncio.gather(*(engine.analyze(source, f"scan{i}") for i, source in enumerate(sources)))
+        finally:
+            await engine.batcher.shutdown()
+
+    results = asyncio.run(run())
+    assert engine.stats()["batches"] == 1
+    assert engine.stats()["items"] == 5
+    # batching must not change any individual prediction
+    for source, result in zip(sources, results):
+        normal, pneumonia = model.forward(preprocess_xray(source)[None, :])[0]
+        assert result["pneumonia_probability"] == round(float(pneumonia), 4)
+        assert result["normal_probability"] == round(float(normal), 4)
+        assert result["cached"] is False
+
+def test_batches_are_capped_at_max_batch():
+    engine = InferenceEngine(ReferencePneumoniaModel(), max_batch=2, max_wait_ms=50, cache_size=16)
+
+    async def run():
+        try:
+            await asyncio.gather(*(engine.analyze(source, f"scan{i}") for i, source in enumerate(scans(5))))
+        finally:
+            await engine.batcher.shutdown()
+
+    asyncio.run(run())
+    assert (engine.stats()["batches"], engine.stats()["items"]) == (3, 5)
+
+def test_repeated_content_is_served_from_the_cache():
+    engine = InferenceEngine(ReferencePneumoniaModel(), max_batch=8, max_wait_ms=1, cache_size=1)
+    first, second = scans(2)
+
+    async def run():
+        try:
+            # the concurrent duplicate waits for the in-flight result instead of running again
+            a, b = await asyncio.gather(engine.analyze(first, "a"), engine.analyze(first, "a"))
+            c = await engine.analyze(first, "a")
+            await engine.analyze(second, "b")
+            d = await engine.analyze(first, "a")
+            return a, b, c, d
+        finally:
+            await engine.batcher.shutdown()
+
+    a, b, c, d = asyncio.run(run())
+    assert (a["cached"], b["cached"], c["cached"], d["cached"]) == (False, True, True, False)
+    assert a["pneumonia_probability"] == b["pneumonia_probability"] == d["pneumonia_probability"]
+    stats = engine.stats()
+    assert (stats["items"], stats["cache_hits"], stats["cache_entries"]) == (3, 1, 1)
+
+def test_analyze_endpoint_returns_one_result_per_file(client):
+    files = [("files", (f"scan{i}.jpeg", source, "image/jpeg")) for i, source in enumerate(scans(3))]
+    response = client.post("/api/v1/upload/xray/analyze", files=files)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["filename"] for result in results] == ["scan0.jpeg", "scan1.jpeg", "scan2.jpeg"]
+    for result in results:
+        analysis = result["analysis"]
+        assert np.isclose(analysis["pneumonia_probability"] + analysis["normal_probability"], 1.0, atol=1e-3)
+        assert analysis["model_prediction"] in ("Normal", "Pneumonia")
+
+    stored = client.get(f"/api/v1/upload/xray/{results[0]['upload_id']}/analysis").json()["analysis"]
+    assert stored["pneumonia_probability"] == results[0]["analysis"]["pneumonia_probability"]
+    assert stored["cached"] is True
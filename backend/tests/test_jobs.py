@@ -0,0 +1,87 @@
+import json
+import time
+import uuid
+from app.services.jobs import format_event
+from tests.conftest import image_bytes
+
+def wait_for(client, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/v1/upload/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_format_event_is_one_sse_frame():
+    assert format_event("progress", {"done": 1}) == 'event: progress\ndata: {"done": 1}\n\n'
+
+def test_upload_returns_before_processing_and_the_job_completes(client):
+    files = [("files", (f"scan{i}.png", image_bytes((40 + i, 30), fmt="PNG"), "image/png")) for i in range(3)]
+    response = client.post("/api/v1/upload/medical", files=files).json()
+    assert {upload["processing_status"] for upload in response["uploads"]} == {"pending"}
+
+    job = wait_for(client, response["job_id"])
+    assert (job["status"], job["total"], job["completed"], job["failed"]) == ("completed", 3, 3, 0)
+    assert set(job["uploads"].values()) == {"completed"}
+
+    upload = client.get(f"/api/v1/upload/medical/{response['uploads'][1]['upload_id']}").json()
+    assert upload["processing_status"] == "completed"
+    assert upload["analysis_results"]["dimensions"] == {"width": 41, "height": 30}
+    assert upload["analysis_results"]["anonymized"] is True
+
+def test_event_stream_ends_with_complete(client):
+    files = [("files", ("scan.png", image_bytes((24, 24), color=(7, 7, 7), fmt="PNG"), "image/png"))]
+    job_id = client.post("/api/v1/upload/traffic", files=files).json()["job_id"]
+    wait_for(client, job_id)
+
+    response = client.get(f"/api/v1/upload/jobs/{job_id}/events")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert [event for event, _ in events] == ["progress", "complete"]
+    assert events[-1][1]["status"] == "completed"
+    assert client.get("/api/v1/upload/jobs/missing/events").status_code == 404
+
+def test_failed_files_are_reported_per_upload(client):
+    files = [("files", ("broken.png", b"not an image", "image/png"))]
+    response = client.post("/api/v1/upload/medical", files=files).json()
+    job = wait_for(client, response["job_id"])
+    assert (job["status"], job["failed"]) == ("failed", 1)
+    upload = client.get(f"/api/v1/upload/medical/{response['uploads'][0]['upload_id']}").json()
+    assert upload["processing_status"] == "failed"
+    assert "error" in upload["analysis_results"]
+
+def test_uploads_left_unfinished_are_requeued(client, tmp_path):
+    from app.db.base import SessionLocal
+    from app.models.dataset import Upload
+    from app.services.jobs import JobManager, get_job_manager
+
+    path = tmp_path / "left.png"
+    path.write_bytes(image_bytes((20, 10), fmt="PNG"))
+    # rows a stopped process had accepted but never finished
+    stalled = {status: uuid.uuid4() for status in ("pending", "processing")}
+    with SessionLocal() as db:
+        db.add_all(
+            Upload(id=upload_id, category="traffic", stored_filename=f"left-{status}", file_path=str(path),
+                   processing_status=status)
+            for status, upload_id in stalled.items()
+        )
+        db.commit()
+
+    jobs = client.portal.call(get_job_manager().recover)
+    job = next(job for job in jobs if stalled["pending"] in {upload_id for upload_id, _, _ in job.uploads})
+    assert {str(upload_id) for upload_id in stalled.values()} <= set(job.results)
+    wait_for(client, job.id)
+    for upload_id in stalled.values():
+        upload = client.get(f"/api/v1/upload/traffic/{upload_id}").json()
+        assert upload["processing_status"] == "completed"
+        assert upload["analysis_results"]["dimensions"] == {"width": 20, "height": 10}
+    # a worker started next to the one holding the recovery lock leaves the rows alone
+    assert client.portal.call(JobManager(1).recover) == []
@@ -0,0 +1,58 @@
+import os
+import shutil
+import numpy as np
+from app.services.kitti_timeline import SensorStream, load_sequence_timeline, load_timestamps
+from tests.conftest import KITTI_FRAMES, KITTI_POSES, KITTI_SEQUENCE, write_kitti_stamps
+
+def test_nearest_handles_out_of_order_stamps():
+    stream = SensorStream(np.array([0, 10, 30, 20, 40]))
+    frames, deltas = stream.nearest(np.array([21, 29, 5, -5, 99]))
+    # frame numbers refer to the original, unsorted order
+    assert frames.tolist() == [3, 2, 0, 0, 4]
+    assert deltas.tolist() == [-1, 1, -5, 5, -59]
+    assert sorted(stream.window(10, 30).tolist()) == [1, 2, 3]
+
+def test_stamps_keep_nanosecond_precision(tmp_path):
+    path = tmp_path / "timestamps.txt"
+    path.write_text("2011-09-26 13:02:25.964389445\n2011-09-26 13:02:26.064389446\n")
+    stamps = load_timestamps(str(path))
+    assert int(stamps[1] - stamps[0]) == 100_000_001
+
+def test_sequence_alignment(datasets):
+    timeline = load_sequence_timeline(os.path.join(datasets, "kitti", KITTI_SEQUENCE))
+    assert set(timeline.sensors) == {"image_02", "velodyne_points", "oxts"}
+    assert timeline.summary()["oxts"]["frame_count"] == KITTI_POSES
+
+    aligned = timeline.align("image_02", np.arange(KITTI_FRAMES))
+    lidar, lidar_delta = aligned["velodyne_points"]
+    # camera frames 4 and 5 pick the swapped Velodyne sweeps
+    assert lidar.tolist() == [0, 1, 2, 3, 5, 4, 6, 7, 8, 9]
+    np.testing.assert_allclose(lidar_delta / 1e6, 30.0, atol=1e-3)
+
+    tight = timeline.align("image_02", np.arange(3), max_delta_ns=10_000_000)
+    assert tight["velodyne_points"][0].tolist() == [-1, -1, -1]
+    assert tight["oxts"][0].tolist() == [0, 1, 2]
+
+def test_edited_stamps_are_picked_up(datasets, tmp_path):
+    sequence = tmp_path / "sequence_edit"
+    source = os.path.join(datasets, "kitti", KITTI_SEQUENCE, "image_02")
+    shutil.copytree(source, sequence / "image_02", ignore=shutil.ignore_patterns("data"))
+    assert len(load_sequence_timeline(str(sequence)).stream("image_02")) == KITTI_FRAMES
+
+    write_kitti_stamps(str(sequence / "image_02" / "timestamps.txt"), np.arange(KITTI_FRAMES + 5) * 0.1)
+    assert len(load_sequence_timeline(str(sequence)).stream("image_02")) == KITTI_FRAMES + 5
+    assert load_sequence_timeline(str(tmp_path / "missing")) is None
+
+def test_alignment_endpoint(client):
+    url = f"/api/v1/datasets/kitti/align/{KITTI_SEQUENCE}"
+    body = client.get(url, params={"max_delta_ms": 20, "t0": 0.35, "t1": 0.55}).json()
+    frames = body["frames"]
+    assert [frame["frame_number"] for frame in frames] == [4, 5]
+    assert frames[0]["aligned"]["velodyne_points"] is None
+    assert frames[0]["aligned"]["oxts"]["frame_number"] == 4
+    assert frames[0]["aligned"]["oxts"]["delta_ms"] == 6.0
+
+    loose = client.get(url, params={"limit": 10}).json()["frames"]
+    assert loose[4]["aligned"]["velodyne_points"]["frame_number"] == 5
+    assert client.get(url, params={"reference": "image_03"}).status_code == 400
+    assert client.get("/api/v1/datasets/kitti/align/missing").status_code == 404
@@ -0,0 +1,65 @@
+import os
+import numpy as np
+from app.services.kitti_trajectory import TOLERANCES, Trajectory, load_sequence_trajectory, simplification_importance
+from tests.conftest import KITTI_POSES, KITTI_SEQUENCE
+
+def douglas_peucker(points, tolerance, first=0, last=None):
+    # textbook recursive version, used as the reference for the single-pass importance
+    last = len(points) - 1 if last is None else last
+    if last - first < 2:
+        return [first, last]
+    a, b = points[first], points[last]
+    direction = b - a
+    inner = points[first + 1:last]
+    distances = np.abs(direction[0] * (inner[:, 1] - a[1]) - direction[1] * (inner[:, 0] - a[0])) / np.hypot(*direction)
+    i = int(np.argmax(distances))
+    if distances[i] <= tolerance:
+        return [first, last]
+    split = first + 1 + i
+    return douglas_peucker(points, tolerance, first, split)[:-1] + douglas_peucker(points, tolerance, split, last)
+
+def test_importance_matches_recursive_douglas_peucker():
+    points = np.cumsum(np.random.default_rng(1).normal(size=(300, 2)), axis=0)
+    importance = simplification_importance(points)
+    for tolerance in (0.1, 0.5, 1.0, 3.0, 10.0):
+        assert np.flatnonzero(importance > tolerance).tolist() == douglas_peucker(points, tolerance)
+
+def test_straight_line_collapses_to_its_end_points():
+    points = np.column_stack((np.arange(50.0), np.zeros(50)))
+    importance = simplification_importance(points)
+    assert np.flatnonzero(importance > 0).tolist() == [0, 49]
+
+def test_levels_are_nested_and_shrink():
+    frames = np.arange(200)
+    walk = np.cumsum(np.random.default_rng(2).normal(scale=1e-5, size=(200, 2)), axis=0)
+    poses = np.zeros((200, 30))
+    poses[:, 0], poses[:, 1] = 49.0 + walk[:, 0], 8.4 + walk[:, 1]
+    trajectory = Trajectory(frames, poses)
+
+    assert len(trajectory.levels) == len(TOLERANCES)
+    assert len(trajectory.levels[0]) == 200
+    for finer, coarser in zip(trajectory.levels, trajectory.levels[1:]):
+        assert set(coarser.tolist()) <= set(finer.tolist())
+        assert len(coarser) <= len(finer)
+    assert trajectory.level_for(max_points=len(trajectory.levels[3])) <= 3
+    assert trajectory.level_for(zoom=24) < trajectory.level_for(zoom=10)
+
+def test_sequence_trajectory_keeps_the_turn(datasets):
+    trajectory = load_sequence_trajectory(os.path.join(datasets, "kitti", KITTI_SEQUENCE))
+    assert len(trajectory) == KITTI_POSES
+    np.testing.assert_allclose(trajectory.xy[0], [0.0, 0.0])
+    assert trajectory.xy[29, 0] > 200 and abs(trajectory.xy[29, 1]) < 1e-6
+    # the drive is two straight legs, so every simplified level is start, corner and end
+    assert trajectory.levels[-1].tolist() == [0, 30, KITTI_POSES - 1]
+    assert load_sequence_trajectory(os.path.join(datasets, "missing")) is None
+
+def test_trajectory_endpoint(client):
+    url = f"/api/v1/datasets/kitti/trajectory/{KITTI_SEQUENCE}"
+    full = client.get(url).json()
+    assert (full["level"], full["point_count"], full["source_count"]) == (0, KITTI_POSES, KITTI_POSES)
+
+    simplified = client.get(url, params={"max_points": 10}).json()
+    assert simplified["level"] == 1
+    assert simplified["frames"] == [0, 30, KITTI_POSES - 1]
+    assert len(simplified["lat"]) == len(simplified["x"]) == 3
+    assert client.get("/api/v1/datasets/kitti/trajectory/missing").status_code == 404
@@ -0,0 +1,54 @@
+from app.services.metrics import Registry, format_labels, format_value
+
+def test_histograms_render_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("job_seconds", "Job time", ("kind",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.labels("resize").observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP job_seconds Job time", "# TYPE job_seconds histogram"]
+    assert lines[2:] == [
+        'job_seconds_bucket{kind="resize",le="0.1"} 2',
+        'job_seconds_bucket{kind="resize",le="1"} 3',
+        'job_seconds_bucket{kind="resize",le="+Inf"} 4',
+        'job_seconds_sum{kind="resize"} 3.65',
+        'job_seconds_count{kind="resize"} 4',
+    ]
+
+def test_counters_gauges_and_sources():
+    registry = Registry()
+    requests = registry.counter("requests_total", "Requests", ("status",))
+    requests.labels("500").inc()
+    requests.labels("200").inc(2)
+    # children are looked up by value, so the same labels reuse one counter
+    assert requests.labels("200") is requests.labels("200")
+    registry.gauge("in_flight", "In flight").labels().inc()
+    registry.source("cache", "Derivative cache", lambda: {"hits": 3, "ratio": 0.5, "path": "/tmp"})
+
+    text = registry.render()
+    assert 'requests_total{status="200"} 2\nrequests_total{status="500"} 1\n' in text
+    assert "in_flight 1\n" in text
+    assert "# TYPE cache_hits gauge\ncache_hits 3\n" in text
+    assert "cache_ratio 0.5\n" in text
+    assert "cache_path" not in text
+
+def test_label_values_are_escaped():
+    assert format_labels([("path", 'a"b\\c\nd')]) == '{path="a\\"b\\\\c\\nd"}'
+    assert format_labels([]) == ""
+    assert (format_value(2.0), format_value(0.25), format_value(float("inf"))) == ("2", "0.25", "+Inf")
+
+def test_metrics_endpoint_labels_requests_by_template(client):
+    for image_id in ("chest_xray_1", "chest_xray_2"):
+        client.get(f"/api/v1/images/chest-xray/{image_id}")
+    client.get("/no/such/path")
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+    text = response.text
+    assert 'http_requests_total{method="GET",route="/api/v1/images/chest-xray/{image_id}",status="200"}' in text
+    assert "chest_xray_1" not in text
+    assert 'route="<unmatched>",status="404"' in text
+    # the scrape itself is the request in flight
+    assert "\nhttp_requests_in_flight 1\n" in text
+    assert "db_pool_checkouts " in text
@@ -0,0 +1,67 @@
+import json
+import numpy as np
+import pytest
+from app.services.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_window
+
+def test_cursors_round_trip_within_their_listing():
+    token = encode_cursor("chest-xray/samples", 41)
+    assert decode_cursor(token, "chest-xray/samples") == 41
+    with pytest.raises(InvalidCursor, match="different listing"):
+        decode_cursor(token, "kitti/frames/sequence_00")
+
+@pytest.mark.parametrize("tamper", [
+    lambda token: token[:-2] + ("A" if token[-2] != "A" else "B") + token[-1],
+    lambda token: token[:5],
+    lambda token: "not a cursor!",
+    lambda token: "",
+])
+def test_tampered_cursors_are_rejected(tamper):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(tamper(encode_cursor("scope", 7)), "scope")
+
+def test_pages_resume_after_the_last_key_served():
+    keys = np.array([10, 20, 30, 40, 50])
+    first = keyset_window(keys, "s", None, 0, 2)
+    assert (first.start, first.stop) == (0, 2)
+    # rows added ahead of the cursor do not shift the next page
+    grown = np.array([5, 10, 15, 20, 30, 40, 50])
+    second = keyset_window(grown, "s", first.next_cursor, 0, 2)
+    assert grown[second.start:second.stop].tolist() == [30, 40]
+    last = keyset_window(grown, "s", second.next_cursor, 0, 2)
+    assert grown[last.start:last.stop].tolist() == [50]
+    assert last.next_cursor is None
+    assert keyset_window(keys, "s", None, 99, 2)[:2] == (5, 5)
+
+def test_walking_a_listing_by_cursor_visits_every_row_once(client):
+    url = "/api/v1/datasets/chest-xray/samples"
+    everything = [sample["id"] for sample in client.get(url, params={"limit": 100}).json()["samples"]]
+    seen, cursor = [], None
+    while True:
+        body = client.get(url, params={"limit": 3, **({"cursor": cursor} if cursor else {})}).json()
+        seen.extend(sample["id"] for sample in body["samples"])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == everything
+    assert len(seen) == 8
+
+def test_listings_reject_foreign_or_tampered_cursors(client):
+    cursor = client.get("/api/v1/datasets/kitti/frames/drive_0001", params={"limit": 5}).json()["next_cursor"]
+    response = client.get("/api/v1/datasets/chest-xray/samples", params={"cursor": cursor})
+    assert response.status_code == 400
+    assert client.get("/api/v1/datasets/kitti/frames/drive_0001", params={"cursor": cursor + "x"}).status_code == 400
+
+def test_ndjson_streams_one_row_per_line(client):
+    response = client.get("/api/v1/datasets/kitti/frames/drive_0001", params={"format": "ndjson", "limit": 700})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["X-Total-Count"] == "465"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["frame_number"] for row in rows] == list(range(465))
+    assert "X-Next-Cursor" not in response.headers
+
+    partial = client.get("/api/v1/datasets/kitti/frames/drive_0001", params={"format": "ndjson", "limit": 10})
+    assert len(partial.text.splitlines()) == 10
+    rest = client.get(
+        "/api/v1/datasets/kitti/frames/drive_0001", params={"limit": 2, "cursor": partial.headers["X-Next-Cursor"]}
+    ).json()
+    assert [frame["frame_number"] for frame in rest["frames"]] == [10, 11]
@@ -0,0 +1,75 @@
+import os
+import numpy as np
+import pytest
+from app.services.point_cloud import crop_range, encode_points, load_velodyne_scan, random_downsample, voxel_downsample
+from tests.conftest import KITTI_SEQUENCE
+
+POINTS_URL = f"/api/v1/images/kitti/{KITTI_SEQUENCE}/lidar_000000/points"
+
+@pytest.mark.parametrize("params", [
+    {"min_range": 10, "max_range": 10},
+    {"min_range": 20, "max_range": 5},
+    {"min_range": -1},
+    {"max_range": 0},
+])
+def test_points_reject_empty_or_inverted_ranges(client, params):
+    assert client.get(POINTS_URL, params=params).status_code == 400
+
+def test_points_accept_an_ordered_range(client):
+    response = client.get(POINTS_URL, params={"min_range": 5, "max_range": 10, "encoding": "float32"})
+    assert response.status_code == 200
+    assert 0 < int(response.headers["X-Point-Count"]) < int(response.headers["X-Point-Source-Count"])
+
+def points(*rows):
+    return np.asarray(rows, dtype=np.float32)
+
+def test_crop_range_keeps_the_ring_between_the_bounds():
+    scan = points([1, 0, 0, 0.1], [0, 3, 0, 0.2], [6, 8, 0, 0.3], [0, 0, 20, 0.4])
+    assert crop_range(scan, max_range=10, min_range=2).tolist() == scan[[1, 2]].tolist()
+    assert crop_range(scan) is scan
+
+def test_voxel_downsample_merges_points_into_centroids():
+    scan = points([0.1, 0.1, 0.1, 0.2], [0.3, 0.3, 0.3, 0.4], [5.1, 0.1, 0.1, 1.0])
+    merged = voxel_downsample(scan, voxel_size=1.0)
+    assert len(merged) == 2
+    np.testing.assert_allclose(sorted(merged.tolist()), [[0.2, 0.2, 0.2, 0.3], [5.1, 0.1, 0.1, 1.0]], rtol=1e-6)
+
+def test_voxel_downsample_handles_voxels_too_small_for_a_linear_key():
+    scan = points([-80, -80, -3, 0.1], [80, 80, 3, 0.2], [80, 80, 3, 0.4], [0, 0, 0, 0.3])
+    merged = voxel_downsample(scan, voxel_size=1e-5)
+    np.testing.assert_allclose(sorted(merged.tolist()), [[-80, -80, -3, 0.1], [0, 0, 0, 0.3], [80, 80, 3, 0.3]], rtol=1e-6)
+
+def test_random_downsample_is_deterministic_and_ordered():
+    scan = np.arange(400, dtype=np.float32).reshape(100, 4)
+    first, second = random_downsample(scan, 10, seed=3), random_downsample(scan, 10, seed=3)
+    assert np.array_equal(first, second)
+    assert np.all(np.diff(first[:, 0]) > 0)
+    assert random_downsample(scan, 500) is scan
+
+def test_int16_encoding_round_trips_within_one_step():
+    scan = points([12.5, -3.25, 0.5, 0.75], [-40.0, 7.0, -1.7, 0.0])
+    payload, headers = encode_points(scan, "int16")
+    decoded = np.frombuffer(payload, dtype="<i2").reshape(-1, 4).astype(np.float64)
+    scale = float(headers["X-Point-Scale"])
+    np.testing.assert_allclose(decoded[:, :3] * scale, scan[:, :3], atol=scale)
+    np.testing.assert_allclose(decoded[:, 3] * float(headers["X-Intensity-Scale"]), scan[:, 3], atol=1e-4)
+    assert headers["X-Point-Count"] == "2"
+
+def test_scan_is_memory_mapped(datasets):
+    path = os.path.join(datasets, "kitti", KITTI_SEQUENCE, "velodyne_points", "data", "0000000000.bin")
+    scan = load_velodyne_scan(path)
+    assert isinstance(scan, np.memmap)
+    assert scan.shape == (5000, 4)
+
+def test_points_endpoint_downsamples_server_side(client):
+    response = client.get(POINTS_URL, params={"voxel_size": 2.0, "max_points": 300, "encoding": "float32"})
+    assert response.status_code == 200
+    count = int(response.headers["X-Point-Count"])
+    assert count == 300
+    assert len(response.content) == count * 4 * 4
+    assert response.headers["X-Point-Source-Count"] == "5000"
+
+def test_points_endpoint_accepts_tiny_voxels(client):
+    response = client.get(POINTS_URL, params={"voxel_size": 1e-5, "encoding": "float32"})
+    assert response.status_code == 200
+    assert 0 < int(response.headers["X-Point-Count"]) <= 5000
@@ -0,0 +1,53 @@
+import io
+import numpy as np
+from PIL import Image
+from app.services.sprite_sheet import SPRITE_TILE, class_rows, pack_sprite, sprite_digest
+from app.services.tiny_imagenet_archive import get_tiny_imagenet_archive
+from tests.conftest import TINY_CLASSES, TINY_IMAGES_PER_CLASS
+
+SPRITE_URL = f"/api/v1/images/tiny-imagenet/{TINY_CLASSES[1]}/sprite"
+PARAMS = {"offset": 1, "count": 4, "columns": 3, "format": "png"}
+
+def test_rows_are_clamped_to_the_class():
+    archive = get_tiny_imagenet_archive()
+    rows, total = class_rows(archive, TINY_CLASSES[0], 4, 10)
+    assert total == TINY_IMAGES_PER_CLASS
+    assert [archive.keys[row] for row in rows] == [f"{TINY_CLASSES[0]}/{TINY_CLASSES[0]}_{i}.JPEG" for i in (4, 5)]
+    assert class_rows(archive, TINY_CLASSES[0], 10, 10)[0] == []
+    assert sprite_digest(archive, rows) != sprite_digest(archive, rows[:1])
+
+def test_sheet_places_images_row_major():
+    archive = get_tiny_imagenet_archive()
+    rows, _ = class_rows(archive, TINY_CLASSES[1], 1, 4)
+    content, media_type = pack_sprite(archive, rows, 3, "png")
+    sheet = np.asarray(Image.open(io.BytesIO(content)), dtype=np.int16)
+    assert media_type == "image/png"
+    assert sheet.shape == (2 * SPRITE_TILE, 3 * SPRITE_TILE, 3)
+    for i in range(4):
+        y, x = (i // 3) * SPRITE_TILE + SPRITE_TILE // 2, (i % 3) * SPRITE_TILE + SPRITE_TILE // 2
+        assert np.abs(sheet[y, x] - (120, (i + 1) * 40, 0)).max() <= 4
+    # the unused slot stays black
+    assert sheet[-1, -1].tolist() == [0, 0, 0]
+
+def test_map_describes_the_sheet(client):
+    body = client.get(f"{SPRITE_URL}/map", params=PARAMS).json()
+    assert (body["columns"], body["rows"], body["total_per_class"]) == (3, 2, TINY_IMAGES_PER_CLASS)
+    assert [(image["id"], image["x"], image["y"]) for image in body["images"]] == [
+        (f"{TINY_CLASSES[1]}_1", 0, 0), (f"{TINY_CLASSES[1]}_2", 64, 0),
+        (f"{TINY_CLASSES[1]}_3", 128, 0), (f"{TINY_CLASSES[1]}_4", 0, 64),
+    ]
+    assert client.get(body["sprite_url"]).content == client.get(SPRITE_URL, params=PARAMS).content
+
+def test_sprite_route(client):
+    response = client.get(SPRITE_URL, params=PARAMS)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["X-Sprite-Columns"] == "3"
+    assert response.headers["X-Sprite-Count"] == "4"
+    assert Image.open(io.BytesIO(response.content)).size == (192, 128)
+
+    narrow = client.get(SPRITE_URL, params={**PARAMS, "columns": 2})
+    assert narrow.headers["ETag"] != response.headers["ETag"]
+    assert Image.open(io.BytesIO(narrow.content)).size == (128, 128)
+    assert client.get(SPRITE_URL, params={"offset": TINY_IMAGES_PER_CLASS}).status_code == 404
+    assert client.get(SPRITE_URL, params={"format": "gif"}).status_code == 400
@@ -0,0 +1,78 @@
+import json
+import os
+from benchmarks.startup import DEFAULT_BUDGET, FIRST_REQUEST_SCRIPT, IMPORT_SCRIPT, parse_importtime, python
+from app.services import warmup
+from app.services.warmup import StartupProfile, load_indexes
+
+DEFERRED_MODULES = (
+    "PIL", "numpy", "jose",
+    "app.api.api_v1.endpoints.datasets", "app.api.api_v1.endpoints.uploads", "app.api.api_v1.endpoints.images",
+)
+
+LOADED_SCRIPT = """
+import json, sys
+import app.main
+{after}
+print(json.dumps(sorted(name for name in {modules!r} if name in sys.modules)))
+"""
+
+def loaded_modules(after: str = "") -> list:
+    script = LOADED_SCRIPT.format(after=after, modules=DEFERRED_MODULES)
+    return json.loads(python(script).stdout.strip().splitlines()[-1])
+
+def test_import_stays_within_the_budget():
+    # the best of a few cold imports, as benchmarks.startup reports it
+    seconds = min(float(python(IMPORT_SCRIPT).stdout.strip().splitlines()[-1]) for _ in range(3))
+    assert seconds < float(os.environ.get("STARTUP_BUDGET", DEFAULT_BUDGET))
+
+def test_heavy_modules_are_not_imported_at_startup():
+    assert loaded_modules() == []
+
+def test_first_request_loads_only_its_router():
+    first = json.loads(python(FIRST_REQUEST_SCRIPT).stdout.strip().splitlines()[-1])
+    assert first["status"] == 200
+
+    request = """
+import asyncio, httpx
+from app.main import app
+
+async def get():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://startup") as client:
+        assert (await client.get("/api/v1/datasets/kitti/sequences")).status_code == 200
+
+asyncio.run(get())
+"""
+    endpoints = [name for name in loaded_modules(request) if name.startswith("app.")]
+    assert endpoints == ["app.api.api_v1.endpoints.datasets"]
+
+def test_importtime_output_keeps_only_app_imports():
+    stderr = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 | encodings
+import time:       300 |        300 |     app.core.config
+import time:        50 |         50 |     fastapi
+import time:       400 |        750 |   app.db.base
+import time:       200 |       1200 | app.main
+import time:        90 |         90 | json
+"""
+    modules = parse_importtime(stderr)
+    assert [(m["module"], m["depth"]) for m in modules] == [
+        ("app.core.config", 2), ("fastapi", 2), ("app.db.base", 1), ("app.main", 0)
+    ]
+    assert modules[-1]["cumulative_ms"] == 1.2
+
+def test_index_warm_up_records_times_and_failures(monkeypatch):
+    def broken():
+        raise FileNotFoundError("no archive")
+
+    monkeypatch.setattr(warmup, "INDEX_LOADERS", {**warmup.INDEX_LOADERS, "tiny-imagenet": broken})
+    profile = StartupProfile()
+    times = load_indexes(profile)
+    assert set(times) == {"chest-xray", "chest-xray-facets", "tiny-imagenet", "kitti"}
+    assert profile.errors == {"tiny-imagenet": "no archive"}
+    assert profile.as_dict()["state"] == "idle"
+
+def test_startup_report(client):
+    report = client.get("/health/startup").json()
+    assert set(report) == {"state", "routers_seconds", "indexes_seconds", "errors", "warmup_seconds"}
+    assert report["state"] == "idle"
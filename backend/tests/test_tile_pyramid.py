@@ -0,0 +1,71 @@
+import io
+import os
+import numpy as np
+from PIL import Image
+from app.services.tile_pyramid import TILE_OVERLAP, TILE_SIZE, TilePyramid
+from tests.conftest import gradient_image
+
+def pyramid(tmp_path, width=600, height=300, fmt="png"):
+    source = tmp_path / "source.png"
+    if not source.exists():
+        gradient_image(width, height).save(source)
+    return TilePyramid(str(source), "abc123", str(tmp_path / "tiles"), fmt)
+
+def tile_size(content):
+    return Image.open(io.BytesIO(content)).size
+
+def test_levels_halve_down_to_a_single_pixel(tmp_path):
+    tiles = pyramid(tmp_path)
+    assert tiles.max_level == 10
+    assert tiles.level_size(10) == (600, 300)
+    assert tiles.level_size(9) == (300, 150)
+    assert tiles.level_size(0) == (1, 1)
+    assert tiles.grid_size(10) == (3, 2)
+    assert tiles.has_tile(10, 2, 1) and not tiles.has_tile(10, 3, 0) and not tiles.has_tile(11, 0, 0)
+
+def test_each_level_is_a_box_reduction_of_the_one_above(tmp_path):
+    tiles = pyramid(tmp_path)
+    full = np.asarray(gradient_image(600, 300))
+    assert np.array_equal(tiles.level_array(10), full)
+    assert np.array_equal(tiles.level_array(9), np.asarray(Image.fromarray(full).reduce(2)))
+    assert tiles.level_array(0).shape == (1, 1)
+
+def test_tiles_overlap_their_neighbours_and_stop_at_the_edge(tmp_path):
+    tiles = pyramid(tmp_path)
+    assert tile_size(tiles.tile(10, 0, 0)) == (TILE_SIZE + TILE_OVERLAP, TILE_SIZE + TILE_OVERLAP)
+    assert tile_size(tiles.tile(10, 1, 0)) == (TILE_SIZE + 2 * TILE_OVERLAP, TILE_SIZE + TILE_OVERLAP)
+    # the last column and row only cover what is left of the image
+    assert tile_size(tiles.tile(10, 2, 1)) == (600 - 2 * TILE_SIZE + TILE_OVERLAP, 300 - TILE_SIZE + TILE_OVERLAP)
+
+    edge = np.asarray(Image.open(io.BytesIO(tiles.tile(10, 2, 1))))
+    assert np.array_equal(edge, np.asarray(gradient_image(600, 300))[TILE_SIZE - 1:, 2 * TILE_SIZE - 1:])
+
+def test_tiles_are_persisted_and_reused(tmp_path):
+    content = pyramid(tmp_path).tile(9, 0, 0)
+    assert os.path.exists(pyramid(tmp_path).tile_path(9, 0, 0))
+    # tiles are keyed by the source hash, so a new pyramid for that hash serves the stored bytes
+    Image.new("L", (600, 300), 0).save(tmp_path / "source.png")
+    assert pyramid(tmp_path).tile(9, 0, 0) == content
+
+def test_only_encoded_tiles_are_kept_on_disk(tmp_path):
+    tiles = pyramid(tmp_path)
+    tiles.tile(10, 0, 0)
+    stored = sorted(os.path.relpath(os.path.join(d, name), tiles.directory)
+                    for d, _, names in os.walk(tiles.directory) for name in names)
+    # the whole level is cut while it is in memory, and nothing but the tiles is written
+    assert stored == sorted(os.path.join("10", f"{c}_{r}.png") for c in range(3) for r in range(2))
+
+def test_tile_routes(client):
+    info = client.get("/api/v1/images/chest-xray/chest_xray_6/tiles").json()
+    assert (info["width"], info["height"], info["max_level"]) == (1024, 768, 10)
+    assert info["levels"][-1] == {"level": 10, "width": 1024, "height": 768, "columns": 4, "rows": 3}
+
+    tile = client.get("/api/v1/images/chest-xray/chest_xray_6/tiles/10/3/2")
+    assert tile.status_code == 200
+    assert tile.headers["content-type"] == "image/jpeg"
+    assert tile_size(tile.content) == (TILE_SIZE + TILE_OVERLAP, TILE_SIZE + TILE_OVERLAP)
+    assert client.get(
+        "/api/v1/images/chest-xray/chest_xray_6/tiles/10/3/2", headers={"If-None-Match": tile.headers["ETag"]}
+    ).status_code == 304
+    assert client.get("/api/v1/images/chest-xray/chest_xray_6/tiles/10/4/0").status_code == 404
+    assert client.get("/api/v1/images/chest-xray/chest_xray_99/tiles").status_code == 404
@@ -0,0 +1,57 @@
+import os
+import shutil
+import zipfile
+from app.services.index_store import read_meta
+from app.services.tiny_imagenet_archive import (
+    TinyImageNetArchive, build_archive_index, entry_key, get_tiny_imagenet_archive, index_is_current
+)
+from tests.conftest import TINY_CLASSES, TINY_IMAGES_PER_CLASS
+
+def test_entry_keys_flatten_the_archive_layout():
+    assert entry_key("tiny-imagenet-200/train/n01/images/n01_3.JPEG") == "n01/n01_3.JPEG"
+    assert entry_key("tiny-imagenet-200/val/images/val_7.JPEG") == "val/val_7.JPEG"
+    assert entry_key("tiny-imagenet-200/wnids.txt") == "wnids.txt"
+
+def test_reads_match_zipfile_for_stored_and_deflated_members():
+    archive = get_tiny_imagenet_archive()
+    with zipfile.ZipFile(os.environ["TINY_IMAGENET_ZIP"]) as reference:
+        for info in reference.infolist():
+            assert archive.read(entry_key(info.filename)) == reference.read(info)
+    assert archive.read_image(TINY_CLASSES[0], f"{TINY_CLASSES[0]}_0") is not None
+    assert archive.read_image(TINY_CLASSES[0], "missing") is None
+
+def test_classes_and_samples_come_from_key_ranges():
+    archive = get_tiny_imagenet_archive()
+
+    classes = archive.classes()
+    assert [c["id"] for c in classes] == list(TINY_CLASSES)
+    assert classes[0]["name"] == "goldfish"
+    assert all(c["sample_count"] == TINY_IMAGES_PER_CLASS for c in classes)
+    names, total = archive.class_samples(TINY_CLASSES[1], limit=2, offset=4)
+    assert total == TINY_IMAGES_PER_CLASS
+    assert names == [f"{TINY_CLASSES[1]}_4.JPEG", f"{TINY_CLASSES[1]}_5.JPEG"]
+
+def test_index_is_rebuilt_when_the_archive_changes(tmp_path):
+    archive_path = str(tmp_path / "tiny.zip")
+    index_path = str(tmp_path / "index")
+    shutil.copy(os.environ["TINY_IMAGENET_ZIP"], archive_path)
+    build_archive_index(archive_path, index_path)
+    assert index_is_current(index_path, archive_path)
+
+    with zipfile.ZipFile(archive_path, "a") as archive:
+        archive.writestr("tiny-imagenet-200/train/n09999999/images/n09999999_0.JPEG", b"new")
+    assert not index_is_current(index_path, archive_path)
+    build_archive_index(archive_path, index_path)
+    assert read_meta(index_path)["count"] == 2 * TINY_IMAGES_PER_CLASS + 6
+
+    archive = TinyImageNetArchive.load(archive_path, index_path)
+    try:
+        assert archive.read("n09999999/n09999999_0.JPEG") == b"new"
+    finally:
+        archive.close()
+
+def test_image_endpoint_serves_archive_members(client):
+    response = client.get(f"/api/v1/images/tiny-imagenet/{TINY_CLASSES[0]}/{TINY_CLASSES[0]}_1")
+    assert response.status_code == 200
+    assert response.content == get_tiny_imagenet_archive().read_image(TINY_CLASSES[0], f"{TINY_CLASSES[0]}_1")
+    assert client.get(f"/api/v1/images/tiny-imagenet/{TINY_CLASSES[0]}/nope").status_code == 404
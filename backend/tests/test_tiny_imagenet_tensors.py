@@ -0,0 +1,70 @@
+import io
+import os
+import numpy as np
+import pytest
+from app.services.index_store import VERSIONS_DIR, read_meta
+from app.services.tiny_imagenet_tensors import (
+    IMAGE_SHAPE, UNLABELED, export_tensor_store, get_tensor_store, tensor_store_path
+)
+from tests.conftest import TINY_CLASSES, TINY_IMAGES_PER_CLASS
+
+TRAIN = len(TINY_CLASSES) * TINY_IMAGES_PER_CLASS
+
+@pytest.fixture(scope="module")
+def store():
+    assert export_tensor_store(tensor_store_path(), workers=1) == TRAIN + len(TINY_CLASSES)
+    return get_tensor_store()
+
+def load_npy(response):
+    return np.load(io.BytesIO(response.content))
+
+def test_export_lays_out_splits_as_contiguous_blocks(store):
+    assert store.images.shape == (TRAIN + 2, *IMAGE_SHAPE)
+    assert isinstance(store.images, np.memmap)
+    assert store.classes == list(TINY_CLASSES)
+    assert store.split_range("train") == (0, TRAIN)
+    assert store.split_range("val") == (TRAIN, TRAIN + 2)
+    assert store.split_range("test") == (TRAIN + 2, TRAIN + 2)
+    assert store.labels.tolist() == [0] * TINY_IMAGES_PER_CLASS + [1] * TINY_IMAGES_PER_CLASS + [0, 1]
+    assert UNLABELED not in store.labels.tolist()
+    assert store.keys[TINY_IMAGES_PER_CLASS + 2] == f"{TINY_CLASSES[1]}/{TINY_CLASSES[1]}_2.JPEG"
+
+def test_exported_pixels_match_the_archive(store):
+    # class 1, image 2 was written as a flat (120, 80, 0) JPEG
+    pixels = store.images[TINY_IMAGES_PER_CLASS + 2].astype(np.int16)
+    assert np.abs(pixels - (120, 80, 0)).max() <= 4
+
+def test_batch_route_streams_npy(client, store):
+    labels = client.get("/api/v1/datasets/tiny-imagenet/batch", params={"split": "val", "field": "labels"})
+    assert load_npy(labels).tolist() == [0, 1]
+
+    response = client.get("/api/v1/datasets/tiny-imagenet/batch", params={"indices": "7,0"})
+    images = load_npy(response)
+    assert response.headers["X-Batch-Shape"] == f"2,{IMAGE_SHAPE[0]},{IMAGE_SHAPE[1]},{IMAGE_SHAPE[2]}"
+    assert int(response.headers["Content-Length"]) == len(response.content)
+    assert np.array_equal(images, store.images[[7, 0]])
+
+    ranged = load_npy(client.get("/api/v1/datasets/tiny-imagenet/batch", params={"start": 3, "stop": 5}))
+    assert np.array_equal(ranged, store.images[3:5])
+
+def test_batch_route_validates_its_arguments(client, store):
+    url = "/api/v1/datasets/tiny-imagenet/batch"
+    assert client.get(url, params={"split": "val", "indices": "2"}).status_code == 416
+    assert client.get(url, params={"indices": "1,x"}).status_code == 400
+    assert client.get(url, params={"split": "holdout"}).status_code == 400
+    assert client.get(url, params={"field": "pixels"}).status_code == 400
+
+def test_re_exports_are_published_as_versions(store):
+    path = tensor_store_path()
+    first = read_meta(path)["index_version"]
+    assert export_tensor_store(path, workers=1) == len(store)
+    second = read_meta(path)["index_version"]
+    assert second > first
+    # the new version is mapped on the next lookup, and the old one stays mapped where it is in use
+    fresh = get_tensor_store()
+    assert fresh is not store
+    assert np.array_equal(fresh.images, store.images)
+    assert sorted(os.listdir(os.path.join(path, VERSIONS_DIR))) == [first, second]
+
+    export_tensor_store(path, workers=1)
+    assert first not in os.listdir(os.path.join(path, VERSIONS_DIR))
@@ -0,0 +1,64 @@
+import asyncio
+import io
+import os
+import pytest
+from PIL import Image
+from app.services.transcoder import TranscodeEngine, TranscoderBusy, target_size, transcode_image
+from tests.conftest import image_bytes
+
+def open_files() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to count file descriptors")
+def test_source_file_is_closed_even_when_the_transcode_fails(datasets):
+    path = os.path.join(datasets, "chest_xray", "train", "NORMAL", "img0.jpeg")
+    before = open_files()
+    failures = []
+    for _ in range(5):
+        # the exception keeps the frame, and the image in it, alive
+        with pytest.raises(KeyError) as failure:
+            transcode_image(path, fmt="bmp")
+        failures.append(failure)
+    assert open_files() == before
+
+def decoded(content: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(content))
+    img.load()
+    return img
+
+def test_target_size_fits_inside_the_box_without_upscaling():
+    assert target_size(800, 600, 400, None) == (400, 300)
+    assert target_size(800, 600, 400, 100) == (133, 100)
+    assert target_size(800, 600, 1600, None) == (800, 600)
+    assert target_size(4000, 10, 100, None) == (100, 1)
+
+def test_jpeg_is_resized_and_keeps_its_format():
+    content, media_type = transcode_image(image_bytes((640, 480)), width=160)
+    assert media_type == "image/jpeg"
+    assert decoded(content).size == (160, 120)
+
+def test_format_conversion_flattens_transparency_for_jpeg():
+    content, media_type = transcode_image(image_bytes((32, 32), fmt="PNG", mode="RGBA"), fmt="jpeg")
+    img = decoded(content)
+    assert media_type == "image/jpeg"
+    assert (img.format, img.mode) == ("JPEG", "RGB")
+    content, media_type = transcode_image(image_bytes((32, 32)), fmt="webp", quality=50)
+    assert (media_type, decoded(content).format) == ("image/webp", "WEBP")
+
+def test_engine_rejects_work_beyond_the_pending_limit():
+    engine = TranscodeEngine(workers=0, max_pending=0)
+    with pytest.raises(TranscoderBusy):
+        asyncio.run(engine.transcode(image_bytes(), width=8))
+    assert engine.rejected == 1
+
+    engine = TranscodeEngine(workers=0, max_pending=4)
+    content, _ = asyncio.run(engine.transcode(image_bytes((64, 64)), width=8))
+    assert decoded(content).size == (8, 8)
+    assert engine.pending == 0
+
+def test_image_routes_resize_and_convert(client):
+    response = client.get("/api/v1/images/chest-xray/chest_xray_5", params={"w": 256, "format": "webp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert decoded(response.content).size == (256, 192)
+    assert client.get("/api/v1/images/chest-xray/chest_xray_5", params={"format": "tiff"}).status_code == 400
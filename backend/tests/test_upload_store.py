@@ -0,0 +1,108 @@
+import io
+import os
+import uuid
+from fastapi import UploadFile
+from app.core.config import settings
+from app.db.base import AsyncSessionLocal
+from app.models.dataset import Upload
+from app.services.upload_store import blob_path, discard_blobs, release_blobs, save_uploads, store_upload
+from tests.conftest import image_bytes
+
+def stored_blobs():
+    root = os.path.join(settings.UPLOAD_DIR, "blobs")
+    return {os.path.join(d, name) for d, _, names in os.walk(root) for name in names}
+
+def test_rejected_batch_leaves_no_blobs_behind(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 1000)
+    before = stored_blobs()
+    files = [
+        ("files", ("small.png", os.urandom(500), "image/png")),
+        ("files", ("large.png", os.urandom(2000), "image/png")),
+    ]
+    response = client.post("/api/v1/upload/xray", files=files)
+    assert response.status_code == 413
+    assert "large.png" in response.json()["detail"]
+    assert stored_blobs() == before
+
+def test_rejected_file_leaves_no_temporary_file(client, monkeypatch):
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 1000)
+    files = [("files", ("large.png", os.urandom(5000), "image/png"))]
+    assert client.post("/api/v1/upload/xray", files=files).status_code == 413
+    assert os.listdir(os.path.join(settings.UPLOAD_DIR, "tmp")) == []
+
+def test_identical_content_shares_one_blob(client):
+    content = os.urandom(800)
+    first = client.post("/api/v1/upload/xray", files=[("files", ("a.png", content, "image/png"))]).json()["uploads"][0]
+    second = client.post("/api/v1/upload/xray", files=[("files", ("b.png", content, "image/png"))]).json()["uploads"][0]
+
+    assert first["sha256"] == second["sha256"]
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+    path = blob_path(first["sha256"])
+    assert path.endswith(os.path.join("blobs", first["sha256"][:2], first["sha256"]))
+    with open(path, "rb") as f:
+        assert f.read() == content
+
+    # the blob outlives the first delete because the second upload still points at it
+    assert client.delete(f"/api/v1/upload/xray/{first['upload_id']}").status_code == 200
+    assert os.path.exists(path)
+    assert client.delete(f"/api/v1/upload/xray/{second['upload_id']}").status_code == 200
+    assert not os.path.exists(path)
+    assert client.get(f"/api/v1/upload/xray/{second['upload_id']}").status_code == 404
+
+def test_rejected_analysis_leaves_no_blobs_behind(client, monkeypatch):
+    before = stored_blobs()
+    files = [
+        ("files", ("good.png", image_bytes((32, 32), color=(9, 9, 9), fmt="PNG"), "image/png")),
+        ("files", ("broken.png", os.urandom(300), "image/png")),
+    ]
+    assert client.post("/api/v1/upload/xray/analyze", files=files).status_code == 400
+    assert stored_blobs() == before
+
+    monkeypatch.setattr(settings, "MAX_FILE_SIZE", 1000)
+    files = [
+        ("files", ("small.png", os.urandom(500), "image/png")),
+        ("files", ("large.png", os.urandom(2000), "image/png")),
+    ]
+    assert client.post("/api/v1/upload/xray/analyze", files=files).status_code == 413
+    assert stored_blobs() == before
+
+def store(client, content, filename):
+    return client.portal.call(store_upload, UploadFile(io.BytesIO(content), filename=filename))
+
+def test_a_delete_keeps_a_blob_another_request_is_about_to_save(client):
+    content = os.urandom(900)
+    first = client.post("/api/v1/upload/xray", files=[("files", ("a.png", content, "image/png"))]).json()["uploads"][0]
+    # a second request has stored the same content but not committed its row yet
+    pending = store(client, content, "b.png")
+    assert pending.deduplicated
+
+    assert client.delete(f"/api/v1/upload/xray/{first['upload_id']}").status_code == 200
+    assert os.path.exists(pending.path)
+
+    upload = Upload(id=uuid.uuid4(), category="xray", stored_filename=pending.sha256, file_path=pending.path,
+                    file_size=pending.size, processing_status="completed")
+
+    async def save():
+        async with AsyncSessionLocal() as db:
+            await save_uploads(db, [upload])
+        release_blobs([pending])
+
+    client.portal.call(save)
+    assert client.delete(f"/api/v1/upload/xray/{upload.id}").status_code == 200
+    assert not os.path.exists(pending.path)
+
+def test_a_failed_request_keeps_a_blob_another_request_reused(client):
+    content = os.urandom(700)
+    created = store(client, content, "a.png")
+    reused = store(client, content, "b.png")
+    assert (created.deduplicated, reused.deduplicated) == (False, True)
+
+    async def discard(blobs):
+        async with AsyncSessionLocal() as db:
+            await discard_blobs(db, blobs)
+
+    client.portal.call(discard, [created])
+    assert os.path.exists(created.path)
+    # the last holder gives it up and nothing was saved, so the blob goes even though it reused it
+    client.portal.call(discard, [reused])
+    assert not os.path.exists(created.path)
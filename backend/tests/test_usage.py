@@ -0,0 +1,113 @@
+import uuid
+from datetime import timedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.api.api_v1.api import include_api, lazy_endpoints
+from app.core.security import create_access_token
+from app.db.base import SessionLocal
+from app.models.dataset import APIUsage
+from app.services import usage
+from app.services.metrics import MetricsMiddleware, http_requests
+from app.services.usage import ANONYMOUS_USER, UNMATCHED_ENDPOINT, UsageMeter, UsageMeteringMiddleware, request_user
+from app.services.warmup import StartupProfile, warm_up
+
+CATEGORIES = "/api/v1/datasets/chest-xray/categories"
+
+class Recorder:
+    def __init__(self):
+        self.endpoints = []
+
+    def record(self, endpoint, user_id):
+        self.endpoints.append(endpoint)
+
+def lazy_app():
+    app = FastAPI()
+    app.add_middleware(UsageMeteringMiddleware)
+    app.add_middleware(MetricsMiddleware)
+    include_api(app, "/api/v1", lazy=True)
+    return app
+
+def requests_counted(path):
+    child = http_requests._children.get(("GET", path, "200"))
+    return child.value if child is not None else 0
+
+def test_lazy_routes_are_metered_by_their_template(monkeypatch):
+    recorder = Recorder()
+    monkeypatch.setattr(usage, "get_usage_meter", lambda: recorder)
+    app = lazy_app()
+    counted = requests_counted(CATEGORIES)
+
+    with TestClient(app) as client:
+        # the first request goes through the placeholder, which loads the module and dispatches again
+        assert client.get(CATEGORIES).status_code == 200
+        client.portal.call(warm_up, app, StartupProfile())
+        assert lazy_endpoints(app) == []
+        assert client.get(CATEGORIES).status_code == 200
+        assert client.get("/api/v1/images/chest-xray/chest_xray_1").status_code == 200
+        assert client.get("/api/v1/datasets/nothing/here/at/all").status_code == 404
+
+    assert recorder.endpoints == [
+        f"GET {CATEGORIES}",
+        f"GET {CATEGORIES}",
+        "GET /api/v1/images/chest-xray/{image_id}",
+        UNMATCHED_ENDPOINT,
+    ]
+    assert requests_counted(CATEGORIES) == counted + 2
+
+def stored_counts(prefix):
+    with SessionLocal() as db:
+        query = select(APIUsage.endpoint, APIUsage.user_id, APIUsage.request_count)
+        rows = db.execute(query.where(APIUsage.endpoint.like(f"{prefix}%"))).all()
+    return {(endpoint, user_id): count for endpoint, user_id, count in rows}
+
+def test_flushes_accumulate_into_one_row_per_key(client):
+    meter = UsageMeter(flush_interval=3600, flush_max_keys=1000)
+    user = uuid.uuid4()
+
+    async def record_and_flush(endpoints):
+        for endpoint, user_id in endpoints:
+            meter.record(endpoint, user_id)
+        return await meter.flush()
+
+    first = [("GET /flush/a", user)] * 3 + [("GET /flush/b", ANONYMOUS_USER)]
+    assert client.portal.call(record_and_flush, first) == 2
+    second = [("GET /flush/a", user)] * 2 + [("GET /flush/a", ANONYMOUS_USER)]
+    assert client.portal.call(record_and_flush, second) == 2
+    client.portal.call(meter.shutdown)
+
+    assert stored_counts("GET /flush/") == {
+        ("GET /flush/a", user): 5,
+        ("GET /flush/a", ANONYMOUS_USER): 1,
+        ("GET /flush/b", ANONYMOUS_USER): 1,
+    }
+    assert meter.stats() == {"pending_keys": 0, "pending_requests": 0, "flushed_rows": 4, "flush_errors": 0}
+
+def test_failed_flush_keeps_the_counts(client, monkeypatch):
+    meter = UsageMeter(flush_interval=3600, flush_max_keys=1000)
+
+    async def failing_upsert(rows):
+        raise OSError("database unavailable")
+
+    async def record_and_flush():
+        meter.record("GET /retry", ANONYMOUS_USER)
+        meter.record("GET /retry", ANONYMOUS_USER)
+        return await meter.flush()
+
+    monkeypatch.setattr(usage, "upsert_usage", failing_upsert)
+    assert client.portal.call(record_and_flush) == 0
+    assert (meter.pending, meter.flush_errors) == (2, 1)
+    monkeypatch.undo()
+    assert client.portal.call(meter.shutdown) is None
+    assert stored_counts("GET /retry") == {("GET /retry", ANONYMOUS_USER): 2}
+
+def test_requests_are_attributed_to_valid_tokens_only():
+    user = uuid.uuid4()
+    token = create_access_token(user)
+    assert request_user([(b"authorization", f"Bearer {token}".encode())]) == user
+    assert request_user([(b"authorization", f"bearer {token}".encode())]) == user
+    assert request_user([(b"authorization", f"Basic {token}".encode())]) == ANONYMOUS_USER
+    assert request_user([(b"authorization", b"Bearer not-a-token")]) == ANONYMOUS_USER
+    expired = create_access_token(user, expires_delta=timedelta(minutes=-5))
+    assert request_user([(b"authorization", f"Bearer {expired}".encode())]) == ANONYMOUS_USER
+    assert request_user([]) == ANONYMOUS_USER